@@ -0,0 +1,416 @@
+"""
+read-only JSON API on the flask server of the app, backed by the preprocessed data
+ /api/prices?tickers=K55234DF2657,KR5235AK9808&fee=1&normalize=1
+ /api/cagr?category=asset&group=All&group=%23Top10&compare=1
+ /api/scatter?category=asset&group=주식
+ /api/rolling?tickers=K55234DF2657&fee=1&metric=return_36&metric=drawdown
+ /api/similar?tickers=K55101BT4394
+ /api/validation?check=outlier&check=ticker
+ /api/backtest?category=asset&group=%23Top10&rebalance=annual&samples=5000
+tickers are selected by the comma-separated tickers or by category and groups
+ of the group dropdown: group names, All, and #Top<n> or #Bottom<n> by rank
+ or #Random<n>@<seed> drawn as the client does with the seed, ranked by the posterior
+ mean or by a metric of rank_utils after colon, ex) #Top10:sortino
+unique: keep the best ranked fund of each cluster of near-duplicates in the selection
+fee: index or name of the fee column. all fees if not given
+metric: metrics of rolling analytics in roll_utils. all metrics if not given
+check: checks of the validation report of check_utils. all checks if not given
+weights: comma-separated weights of the tickers of backtest. equal weights if not given
+rebalance: monthly, quarterly (default) or annual rebalancing of backtest
+samples: random weightings of the tickers backtested at once, of which CAGR and max
+ drawdown are returned with the best weights by CAGR over max drawdown
+responses carry ETag of the snapshot and the version of the data and Last-Modified of
+ the snapshot date for clients to revalidate and are cached in LRU by the query
+"""
+import functools
+import hashlib
+import json
+import re
+from datetime import datetime, timezone
+import numpy as np
+from flask import Blueprint, Response, request
+from werkzeug.datastructures import MultiDict
+from data_utils import decode_array
+import backtest_utils
+
+base_prc = 1000
+max_samples = 10000
+
+
+def get_price_matrix(data_prc):
+    """
+    return dict of fee to ticker x date array of prices from the columnar payload
+    """
+    start = np.asarray(data_prc['start'])
+    offset = np.asarray(data_prc['offset'])
+    n, m = len(data_prc['tickers']), len(data_prc['dates'])
+    rows = np.repeat(np.arange(n), np.diff(offset))
+    cols = np.arange(offset[-1]) - np.repeat(offset[:-1] - start, np.diff(offset))
+    mat = dict()
+    for fee, text in data_prc['values'].items():
+        mat[fee] = np.full((n, m), np.nan)
+        mat[fee][rows, cols] = decode_array(text)
+    return mat
+
+
+def get_common_start(mats):
+    """
+    return index of the first date where every row of mats has prices or -1
+    """
+    valid = np.logical_and.reduce([~np.isnan(x).any(axis=0) for x in mats])
+    return int(valid.argmax()) if valid.any() else -1
+
+
+def mulberry32(seed):
+    """
+    return generator of uniform numbers in [0, 1) of the seed, the same as
+     mulberry32 of assets/utils.js
+    """
+    a = seed & 0xFFFFFFFF
+    imul = lambda x, y: (x * y) & 0xFFFFFFFF
+
+    def random():
+        nonlocal a
+        a = (a + 0x6D2B79F5) & 0xFFFFFFFF
+        t = imul(a ^ (a >> 15), 1 | a)
+        t = ((t + imul(t ^ (t >> 7), 61 | t)) & 0xFFFFFFFF) ^ t
+        return (t ^ (t >> 14)) / 4294967296
+    return random
+
+
+def sample(items, num, random):
+    """
+    return num items drawn without replacement by partial Fisher-Yates shuffle,
+     the same as sampleIds of assets/utils.js
+    """
+    items = list(items)
+    num = min(num, len(items))
+    for k in range(num):
+        j = k + int(random() * (len(items) - k))
+        items[k], items[j] = items[j], items[k]
+    return items[:num]
+
+
+def to_list(arr, decimals=2):
+    """
+    return nested list of arr rounded with None for NaN
+    """
+    arr = np.round(arr, decimals).astype(object)
+    arr[np.isnan(arr.astype(float))] = None
+    return arr.tolist()
+
+
+def create_api(data, name='api', maxsize=256, store=None, snapshot=None):
+    """
+    return blueprint of the API on data of preprocess_data
+    maxsize: number of serialized responses cached
+    snapshot: date of the snapshot (yymmdd) of the input files, the last date of prices if None
+    store: memory-mapped store of mmap_utils of the same prices, of which matrices are
+     used instead of decoding the payload if the tickers and dates are the same.
+     required for the payload streamed by stream_utils without values
+    """
+    data_prc, data_cat, data_rank, data_est = (data[x] for x in ('price', 'category', 'rank', 'scatter'))
+    dates = np.asarray(data_prc['dates'])
+    fees = list(data_prc['cagr'])
+    index = {x: i for i, x in enumerate(data_prc['tickers'])}
+    if (store is not None and store['tickers'].to_list() == data_prc['tickers']
+            and store['dates'].strftime('%Y-%m-%d').to_list() == data_prc['dates']
+            and set(store['columns']) == set(fees)):
+        mat = store['values']
+    elif 'values' in data_prc:
+        mat = get_price_matrix(data_prc)
+    else:
+        raise ValueError('No store of the prices of the payload without values')
+    # float64 rows of the matrix of the fee, copied from the memory map
+    get_rows = lambda fee, rows: np.asarray(mat[fee][rows], dtype=float)
+    months = np.array([int(x[:4]) * 12 + int(x[5:7]) for x in dates])
+    cagr = {x: decode_array(v).astype(float) for x, v in data_prc['cagr'].items()}
+    # rolling analytics in the layout of the price payload
+    data_roll = data['rolling']
+    mat_roll = {x: get_price_matrix({**data_prc, 'values': v}) for x, v in data_roll['values'].items()}
+    sum_roll = {x: {k: decode_array(v).astype(float) for k, v in d.items()} 
+                for x, d in data_roll['summary'].items()}
+    metrics = list(next(iter(mat_roll.values()), []))
+    # near-duplicate clusters and neighbors in the ticker index
+    data_sim = data['similar']
+    tickers_index = data['index']['tickers']
+    # ids of the client, which are ranks for the ranked tickers
+    ids_index = {x: i for i, x in enumerate(tickers_index)}
+    # rank of the ids of the ranked tickers of each metric
+    data_ranking = data['ranking']
+    dtype_ranking = '<u2' if data_ranking['dtype'] == 'uint16' else '<u4'
+    ranks = {x: {i: k for k, i in enumerate(decode_array(v, dtype_ranking).tolist())}
+             for x, v in data_ranking['order'].items()}
+    cluster = dict(zip(tickers_index, decode_array(data_sim['cluster'], '<i4').tolist()))
+    neighbors = decode_array(data_sim['neighbors'], '<i4').reshape(-1, data_sim['k'])
+    corr = decode_array(data_sim['corr']).astype(float).reshape(-1, data_sim['k'])
+    members = dict()
+    for x, c in cluster.items():
+        if c != -1:
+            members.setdefault(c, []).append(x)
+
+    # Last-Modified of the snapshot date and ETag of the snapshot and the version of all
+    # the data served, which changes with the data even if the snapshot is not renamed
+    if snapshot is None:
+        snapshot = datetime.strptime(dates[-1], '%Y-%m-%d').strftime('%y%m%d') if len(dates) else '000101'
+    last_modified = datetime.strptime(snapshot, '%y%m%d').replace(tzinfo=timezone.utc)
+    version = hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()[:10]
+    version = f'{snapshot}-{version}'
+
+    def get_tickers(args):
+        """
+        return tickers selected by args
+        """
+        if 'tickers' in args:
+            if not args['tickers']:
+                raise ValueError('No tickers')
+            return [x for x in dict.fromkeys(args['tickers'].split(',')) if x in index]
+        category = args.get('category')
+        if category not in data_cat:
+            raise ValueError(f'Invalid category: {category}')
+        groups = args.getlist('group')
+        options = [x for x in groups if x.startswith('#')]
+        groups = [x for x in groups if not x.startswith('#')]
+        if len(groups) == 0 or 'All' in groups:
+            groups = list(data_cat[category])
+        # selections of the client such as nPrevious are not groups of the server
+        unknown = [x for x in groups if x not in data_cat[category]]
+        if unknown:
+            raise ValueError(f'Unknown group: {unknown[0]}')
+        # in the order of the ids of the client, the rank of the mean, as bitsToIds
+        tickers = sorted({x for g in groups for x in data_cat[category][g]},
+                         key=lambda x: ids_index.get(x, len(ids_index)))
+        if get_flag(args, 'unique'):
+            tickers = get_unique(tickers)
+        if len(options) == 1:
+            # Random only with seed to be reproducible
+            match = re.fullmatch(r'#(?:(Top|Bottom)(\d+)|(Random)(\d+)@(\d+))(?::(\w+))?',
+                                 options[0])
+            if match is None or (match[6] or 'mean') not in ranks:
+                raise ValueError(f'Invalid option: {options[0]}')
+            rank = ranks[match[6] or 'mean']
+            ids = sorted((ids_index[x] for x in tickers if ids_index.get(x) in rank),
+                         key=rank.get)
+            if match[1] == 'Top':
+                ids = ids[:int(match[2])]
+            elif match[1] == 'Bottom':
+                ids = ids[::-1][:int(match[2])]
+            else:
+                ids = sample(ids, int(match[4]), mulberry32(int(match[5])))
+            tickers = [tickers_index[i] for i in ids]
+        return tickers
+
+    def get_unique(tickers):
+        """
+        return tickers of which the best ranked one of each cluster is kept
+        """
+        seen = set()
+        keep = set()
+        for x in sorted(tickers, key=lambda x: data_rank.get(x, np.inf)):
+            c = cluster.get(x, -1)
+            if c == -1 or c not in seen:
+                seen.add(c)
+                keep.add(x)
+        return [x for x in tickers if x in keep]
+
+    def get_fees(args):
+        fee = args.get('fee')
+        if fee is None:
+            return fees
+        if fee.isdigit() and int(fee) < len(fees):
+            return [fees[int(fee)]]
+        if fee in fees:
+            return [fee]
+        raise ValueError(f'Invalid fee: {fee}')
+
+    def get_metrics(args):
+        result = args.getlist('metric') or metrics
+        invalid = [x for x in result if x not in metrics]
+        if invalid:
+            raise ValueError(f'Invalid metric: {invalid[0]}')
+        return list(dict.fromkeys(result))
+
+    def get_flag(args, key):
+        return args.get(key, '0').lower() in ('1', 'true')
+
+    def get_window(mats, j=-1):
+        """
+        return start and end of dates with values of any row of mats, from j if not -1
+        """
+        valid = np.logical_or.reduce([(~np.isnan(x)).any(axis=0) for x in mats])
+        if not valid.any():
+            return 0, 0
+        start = j if j != -1 else int(valid.argmax())
+        return start, len(dates) - int(valid[::-1].argmax())
+
+    def get_prices(args):
+        tickers, fees_sel = get_tickers(args), get_fees(args)
+        rows = [index[x] for x in tickers]
+        mats = {x: get_rows(x, rows) for x in fees}
+        j = get_common_start(mats.values()) if get_flag(args, 'normalize') and rows else -1
+        # window of dates with prices of any ticker
+        start, end = get_window(mats.values(), j)
+        values = {x: mats[x][:, start:end] for x in fees_sel}
+        if j != -1:
+            values = {x: v / v[:, :1] * base_prc for x, v in values.items()}
+        return {
+            'dates': dates[start:end].tolist(),
+            'tickers': tickers,
+            'normalized': j != -1,
+            'values': {x: to_list(v) for x, v in values.items()}
+        }
+
+    def get_cagr(args):
+        tickers, fees_sel = get_tickers(args), get_fees(args)
+        rows = [index[x] for x in tickers]
+        j = get_common_start([get_rows(x, rows) for x in fees]) if get_flag(args, 'compare') and rows else -1
+        if j == -1:
+            result = {x: to_list(cagr[x][rows]) for x in fees_sel}
+            return {'start': None, 'end': None, 'tickers': tickers, 'cagr': result}
+        # CAGR from the common start to the last price of each ticker
+        result = dict()
+        end = j
+        for fee in fees_sel:
+            m = get_rows(fee, rows)
+            last = m.shape[1] - 1 - (~np.isnan(m))[:, ::-1].argmax(axis=1)
+            years = (months[last] - months[j]) / 12
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ret = (m[np.arange(len(rows)), last] / m[:, j]) ** (1 / years) - 1
+            result[fee] = to_list(np.where(years > 0, ret * 100, np.nan))
+            end = max(end, last.max())
+        return {'start': dates[j], 'end': dates[end], 'tickers': tickers, 'cagr': result}
+
+    def get_scatter(args):
+        tickers = get_tickers(args) if 'tickers' in args or args.get('category') else list(index)
+        tickers = [x for x in tickers if x in data_est['mean']]
+        category = args.get('category')
+        cols = ['mean', 'sd', 'hdi_3%', 'hdi_97%', 'sharpe'] + ([category] if category in data_est else [])
+        return {'tickers': tickers, **{x: [data_est[x][t] for t in tickers] for x in cols}}
+
+    def get_rolling(args):
+        tickers, fees_sel, metrics_sel = get_tickers(args), get_fees(args), get_metrics(args)
+        rows = [index[x] for x in tickers]
+        mats = {x: {k: mat_roll[x][k][rows] for k in metrics_sel} for x in fees_sel}
+        start, end = get_window([v for d in mats.values() for v in d.values()])
+        return {
+            'dates': dates[start:end].tolist(),
+            'tickers': tickers,
+            'windows': data_roll['windows'],
+            'values': {x: {k: to_list(v[:, start:end]) for k, v in d.items()} for x, d in mats.items()},
+            'summary': {x: {k: to_list(v[rows]) for k, v in sum_roll[x].items()} for x in fees_sel}
+        }
+
+    def get_similar(args):
+        tickers = get_tickers(args)
+        ids = {x: i for i, x in enumerate(tickers_index)}
+        result = dict()
+        for x in tickers:
+            i = ids.get(x)
+            if i is None:
+                continue
+            valid = neighbors[i] >= 0
+            result[x] = {
+                'cluster': members.get(cluster[x], []),
+                'neighbors': [tickers_index[j] for j in neighbors[i][valid]],
+                'corr': to_list(corr[i][valid], 4)
+            }
+        return result
+
+    def get_validation(args):
+        report = data['validation']
+        checks = args.getlist('check') or list(report['checks'])
+        unknown = [x for x in checks if x not in report['checks']]
+        if unknown:
+            raise ValueError(f'Unknown check: {unknown}')
+        return {**report, 'checks': {x: report['checks'][x] for x in checks}}
+
+    def get_weights(args, n):
+        text = args.get('weights')
+        if not text:
+            return np.full(n, 1 / max(n, 1))
+        try:
+            weights = np.array([float(x) for x in text.split(',')])
+        except ValueError:
+            raise ValueError(f'Invalid weights: {text}')
+        if (len(weights) != n or not np.isfinite(weights).all() or (weights < 0).any()
+                or weights.sum() <= 0):
+            raise ValueError(f'Invalid weights for {n} tickers: {text}')
+        return weights / weights.sum()
+
+    def get_backtest(args):
+        tickers, fees_sel = get_tickers(args), get_fees(args)
+        rows = [index[x] for x in tickers]
+        weights = get_weights(args, len(rows))
+        rebalance = args.get('rebalance', 'quarterly')
+        if rebalance not in backtest_utils.rebalances:
+            raise ValueError(f'Invalid rebalance: {rebalance}')
+        samples = int(args.get('samples', 0)) if args.get('samples', '0').isdigit() else -1
+        if not 0 <= samples <= max_samples:
+            raise ValueError(f"Invalid samples: {args.get('samples')}")
+        mats = {x: get_rows(x, rows) for x in fees_sel}
+        result = {'tickers': tickers, 'weights': to_list(weights, 4), 'rebalance': rebalance}
+        for key in ('equity', 'drawdown', 'cagr', 'mdd'):
+            result[key] = dict()
+        if samples:
+            result['candidates'], result['best'] = dict(), dict()
+            candidates = backtest_utils.get_random_weights(len(rows), samples, int(args.get('seed', 0)))
+        # backtest on the whole date axis so that the rebalancing dates are the same as
+        # the client, and the result is trimmed to the dates of any equity
+        res_fee = {x: backtest_utils.run(m, dates, weights, rebalance) for x, m in mats.items()}
+        start, end = get_window([x['equity'] for x in res_fee.values()])
+        result['dates'] = dates[start:end].tolist()
+        for fee, m in mats.items():
+            res = res_fee[fee]
+            for key in ('equity', 'drawdown'):
+                result[key][fee] = to_list(res[key][0, start:end])
+            for key in ('cagr', 'mdd'):
+                result[key][fee] = to_list(res[key])[0]
+            if samples:
+                res = backtest_utils.run(m, dates, candidates, rebalance)
+                result['candidates'][fee] = {x: to_list(res[x]) for x in ('cagr', 'mdd')}
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    ratio = np.nan_to_num(res['cagr'] / -res['mdd'], nan=-np.inf)
+                i = int(np.argmax(ratio))
+                result['best'][fee] = {'weights': to_list(candidates[i], 4),
+                                       **{x: to_list(res[x][i:i+1])[0] for x in ('cagr', 'mdd')}}
+        return result
+
+    handlers = {'prices': get_prices, 'cagr': get_cagr, 'scatter': get_scatter, 
+                'rolling': get_rolling, 'similar': get_similar, 'validation': get_validation,
+                'backtest': get_backtest}
+
+    @functools.lru_cache(maxsize=maxsize)
+    def render(endpoint, query):
+        result = handlers[endpoint](MultiDict(query))
+        return json.dumps(result, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    api = Blueprint(name, __name__, url_prefix='/api')
+
+    @api.route('/<endpoint>')
+    def get(endpoint):
+        if endpoint not in handlers:
+            return Response(json.dumps({'error': f'Unknown endpoint: {endpoint}'}), 404,
+                            mimetype='application/json')
+        query = tuple(sorted(request.args.items(multi=True)))
+        etag = hashlib.sha256(f'{version}{endpoint}{query}'.encode()).hexdigest()[:16]
+        response = Response(mimetype='application/json')
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.public = True
+        response.cache_control.no_cache = True # revalidate with etag
+        if request.if_none_match.contains(etag) or (
+                not request.if_none_match and request.if_modified_since
+                and request.if_modified_since >= last_modified):
+            response.status_code = 304
+            return response
+        try:
+            response.set_data(render(endpoint, query))
+        except ValueError as e:
+            return Response(json.dumps({'error': str(e)}), 400, mimetype='application/json')
+        return response
+
+    api.cache_info = render.cache_info
+    api.handlers = handlers
+    api.tickers = data_prc['tickers']
+    api.snapshot = version
+    return api
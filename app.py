@@ -1,9 +1,14 @@
-from dash import Dash, html, dcc, Output, Input, State
-import pandas as pd
+from dash import Dash, html, dcc, Output, Input, State, no_update
 import dash_bootstrap_components as dbc
 import dash_daq as daq
 import json
+import os
 from ddf_utils import break_line, extract_topics
+from data_utils import (get_data, get_snapshot, load_data, load_cache, write_asset,
+                        write_price_assets, clean_assets)
+from mmap_utils import write_matrix, open_matrix, get_source_key, is_current
+from api_utils import create_api
+from figure_utils import create_figures
 from contents_info import info
 
 external_stylesheets = [dbc.themes.CERULEAN, 
@@ -31,63 +36,69 @@ category = {
     'region': '지역'
 }
 
-# data to import
-dt = '250331'
+# data to import of the latest snapshot of the estimation
+path = '.'
+dt = get_snapshot(path)
 file_prc = f'funds_monthly_{dt}.csv'
 file_cat = 'funds_categories.csv'
 file_est = f'funds_bayesian_ret3y_{dt}.csv'
-path = '.'
-
-# Load data
-## price
-df_prc = pd.read_csv(
-    f'{path}/{file_prc}',
-    parse_dates=['date'],
-    dtype={'ticker': str},
-    index_col=['ticker', 'date']
-)
-df_prc.columns = [cols_prc[x] for x in df_prc.columns]
-
-## cateory
-df_cat = pd.read_csv(f'{path}/{file_cat}', index_col=['ticker'])
-
-## beysian stats
-df_est = pd.read_csv(f'{path}/{file_est}', index_col=['ticker'])
-
-# Preprocess data to JSON-serializable
-## category
-data_cat = dict()
-for col in df_cat.columns:
-    data_cat[col] = df_cat[col].reset_index().groupby(col)['ticker'].apply(list).to_dict()
-
-## name for plots
-data_name = df_cat['name'].to_dict()
-
-## price
-data_prc = {}
-for col in df_prc.columns:
-    df = df_prc[col].unstack('ticker').sort_index().dropna(how='all')
-    df = df.reindex(df.index.strftime(date_format))
-    data_prc[col] = {x: df[x].dropna().to_dict() for x in df.columns}
-    #data_prc[col] = df.to_dict(orient='dict')
-
-## Scatter of estimations
-xlabel, ylabel = 'mean', 'sd'
-df_s = df_est.apply(lambda x: x[xlabel]/ x[ylabel], axis=1).rank().rename('sharpe')
-data_est = df_est.join(df_s).join(df_cat)
-# convert mean/sd into respective ranks
-data_est[xlabel] = data_est[xlabel].rank(ascending=False, pct=True).mul(100)
-data_est[ylabel] = data_est[ylabel].rank(pct=True).mul(100)
-cols = ['mean', 'sd', 'hdi_3%', 'hdi_97%', 'sharpe'] + df_cat.columns.to_list()
-data_est = data_est[cols].to_dict()
-
-## rank
-data_rank = df_est['mean'].rank(ascending=False).to_dict()
+# plots rendered by the server instead of the browser, ex) FUND_RENDER=server python app.py
+render_server = os.environ.get('FUND_RENDER', 'client') == 'server'
+# price files of the size (bytes) or larger are streamed by stream_utils into the price assets
+# and the store instead of loading the payload, ex) FUND_STREAM_SIZE=0 python app.py
+stream_size = int(os.environ.get('FUND_STREAM_SIZE', 2**30))
+# monthly store updated by store_utils.ingest replaces file_prc if exists
+path_store = 'data/prices'
+if os.path.isdir(f'{path}/{path_store}'):
+    file_prc = path_store
+
+# Load data and preprocess to JSON-serializable, cached until any of files changes
+files = [f'{path}/{x}' for x in (file_prc, file_cat, file_est)]
+path_stream = None
+if not os.path.isdir(files[0]) and os.path.getsize(files[0]) >= stream_size:
+    path_stream = f'{path}/.cache/stream_{dt}'
+data = load_cache(get_data, files, path=f'{path}/.cache', name=f'data_{dt}',
+                  cols_prc=cols_prc, date_format=date_format, path_stream=path_stream)
+data_cat = data['category']
+data_index = data['index']
+data_name = data['name']
+data_search = data['search']
+data_prc = data['price']
+data_prc_delta = data['price_delta']
+data_est = data['scatter']
+
+# ticker x date matrices of prices opened by the API instead of decoding the payload
+# when the server renders the plots, rebuilt only if the price file changes,
+# or streamed with the payload without values
+store = None
+if path_stream is not None:
+    store = open_matrix(f'{path_stream}/matrix')
+elif render_server:
+    path_matrix = f'{path}/.cache/matrix_{dt}'
+    source = get_source_key(files[0], cols_prc=cols_prc)
+    if not is_current(path_matrix, source):
+        df_prc = load_data(*files, cols_prc=cols_prc)[0]
+        write_matrix(df_prc, path_matrix, date_format=date_format, source=source)
+    store = open_matrix(path_matrix)
+
+# issues of the input data found by check_utils, served in full by /api/validation
+issues = {k: v for k, v in data['validation']['summary'].items() if v > 0}
+if issues:
+    print(f'WARNING: Data validation found {issues}')
 
 # define dropdown options and default value
-category_options = [{'label':category[x], 'value':x} for x in df_cat.columns]
+category_options = [{'label':category[x], 'value':x} for x in data_cat.keys()]
 category_default = 'asset'
 group_default = ['All', '#Top10']
+# metrics of rank_utils for the rank options such as #Top10
+rank_options = [
+    {'label': '추정 평균', 'value': 'mean', 'title': '3년 수익률 추정 평균'},
+    {'label': '초과 확률', 'value': 'prob', 'title': '3년 수익률 추정이 0%를 넘을 확률'},
+    {'label': '수익률', 'value': 'cagr', 'title': '설정일 이후 연평균 수익률 (수수료 적용)'},
+    {'label': '소르티노', 'value': 'sortino', 'title': '하락 변동성 대비 수익률 (수수료 적용)'},
+    {'label': '최대 낙폭', 'value': 'mdd', 'title': '설정일 이후 최대 낙폭 (수수료 적용)'}
+]
+rank_default = 'mean'
 
 # additional group option for every cat
 label = '이거어때?'
@@ -98,34 +109,63 @@ tickers = ['K55364CF7048', 'KR5235AK9808']
 data_title = {}
 
 
-# convert data to json
-data_cat_json = json.dumps(data_cat)
-data_name_json = json.dumps(data_name)
-data_prc_json = json.dumps(data_prc)
-data_est_json = json.dumps(data_est)
-data_rank_json = json.dumps(data_rank)
-data_title_json = json.dumps(data_title)
-
 app = Dash(__name__, title="달달펀드",
            external_stylesheets=external_stylesheets)
 
+# read-only JSON API of the data on the server
+api = create_api(data, store=store, snapshot=dt)
+app.server.register_blueprint(api)
+
+# figures rendered by the server for low-powered clients and embedding,
+# cached when first requested and warmed for the default selection in server mode
+figures = create_figures(api, data_name)
+app.server.register_blueprint(figures)
+
+# save data to static files fetched by the client when required
+data_assets = {
+    'dataIndex': ('index', data_index),
+    'dataName': ('name', data_name),
+    'dataSearch': ('search', data_search),
+    'dataScatter': ('scatter', data_est),
+    'dataRanking': ('ranking', data['ranking']),
+}
+path_assets = os.path.join(app.config.assets_folder, 'data')
+files_assets = {k: write_asset(v, n, path_assets) for k, (n, v) in data_assets.items()}
+data_assets = {k: app.get_asset_url(f'data/{v}') for k, v in files_assets.items()}
+
+## price of base and deltas of recent months cached in the browser
+files_prc = write_price_assets(data_prc_delta, path_assets)
+files_assets['dataPrice'] = files_prc['base']['file']
+data_assets['dataPrice'] = {
+    'base': {'url': app.get_asset_url(f"data/{files_prc['base']['file']}"), 'id': files_prc['base']['id']},
+    'deltas': []
+}
+for delta in files_prc['deltas']:
+    files_assets[delta['date']] = delta['file']
+    data_assets['dataPrice']['deltas'].append(
+        {'url': app.get_asset_url(f"data/{delta['file']}"), 'id': delta['id'], 'date': delta['date']}
+    )
+clean_assets(files_assets.values(), path_assets)
+
+# convert data to json
+data_assets_json = json.dumps(data_assets)
+data_title_json = json.dumps(data_title)
+render_server_json = json.dumps(render_server)
+
 app.index_string = f"""
 <!DOCTYPE html>
 <html>
     <head>
         {{%metas%}}
         <title>{{%title%}}</title>
-        <link rel="icon" type="image/x-icon" href="/assets/favicon.ico">
+        <link rel="icon" type="image/x-icon" href="{app.get_asset_url('favicon.ico')}">
         {{%css%}}
     </head>
     <body>
         <script>
-            var dataCategory = {data_cat_json};
-            var dataName = {data_name_json};
-            var dataPrice = {data_prc_json};
-            var dataScatter = {data_est_json};
-            var dataRank = {data_rank_json}
+            var dataAssets = {data_assets_json};
             var dataTitle = {data_title_json};
+            var renderServer = {render_server_json};
         </script>
         {{%app_entry%}}
         {{%config%}}
@@ -172,11 +212,29 @@ tab_notice = html.Div(
     , style={'margin-top': '20px'}
 )
 
+# backtest
+rebalance_options = [
+    {'label': '월간', 'value': 'monthly'},
+    {'label': '분기', 'value': 'quarterly'},
+    {'label': '연간', 'value': 'annual'}
+]
+tab_backtest = html.Div([
+    dbc.RadioItems(
+        id='rebalance-radio',
+        options=rebalance_options,
+        value='quarterly',
+        inline=True,
+        style={'margin-top': '10px', 'fontSize': 14}
+    ),
+    dcc.Graph(id='backtest-plot')
+])
+
 # tabs
 tabs_contents = [
     dbc.Tab(dcc.Graph(id='price-plot'), label='가격'),
     dbc.Tab(dcc.Graph(id='cagr-plot'), label='수익률', tab_id='tab_cagr'),
     dbc.Tab(dcc.Graph(id='scatter-plot'), label='순위', tab_id='tab_scatter'),
+    dbc.Tab(tab_backtest, label='백테스트', tab_id='tab_backtest'),
     dbc.Tab(tab_notice, label='알림', tab_id='tab_notice',
             label_class_name="tab-label new-badge-label"),
     dbc.Tab(tab_info, label='정보', tab_id='tab_info')
@@ -199,6 +257,7 @@ app.layout = dbc.Container([
             dcc.Input(
                 id='name-input', 
                 type='text',
+                debounce=0.3, # search after typing pauses
                 disabled=True,
                 size='12',
                 className='custom-input'
@@ -211,12 +270,21 @@ app.layout = dbc.Container([
                 value=group_default,
                 multi=True,
             ), style={
-                'min-width':'55%', 
-                'max-width':'55%',
+                'min-width':'45%', 
+                'max-width':'45%',
                 #'overflow': 'hidden',      # ✅ hide overflow
                 'textOverflow': 'ellipsis',# ✅ trim long text
             }
         ),
+        html.Div(
+            dcc.Dropdown(
+                id='rank-dropdown',
+                options=rank_options,
+                value=rank_default,
+                clearable=False,
+                searchable=False,
+            ), style={'min-width':'10%'}
+        ),
         daq.BooleanSwitch(
             id='compare-boolean-switch',
             on=False
@@ -251,6 +319,11 @@ app.layout = dbc.Container([
         hidden='hidden', 
         #cols=50, rows=10
     ),
+    dbc.Tooltip(
+        '순위 기준',
+        target='rank-dropdown',
+        placement='bottom'
+    ),
     dbc.Tooltip(
         '상대 비교',
         target='compare-boolean-switch',
@@ -272,6 +345,7 @@ app.layout = dbc.Container([
     dcc.Store(id='options-data'),
     dcc.Store(id='price-data'),
     dcc.Store(id='scatter-data'),
+    dcc.Store(id='backtest-data'),
     dcc.Location(id="url", refresh=False),  # To initialize the page
 #], fluid=True)  # Full-width container
 ])
@@ -279,17 +353,17 @@ app.layout = dbc.Container([
 # update group options depending on category
 app.clientside_callback(
     """
-    function(category, groups_opt, tickers) {
-        let obj = dataCategory[category];
-        let groups = Object.keys(obj);
+    async function(category, groups_opt, tickers) {
+        await loadData('dataIndex');
+        let groups = Object.keys(dataIndex.groups[category]);
         let maxLength = 20; // Set max label length
 
         // Prepend "All" to the list
         let options = [
             { label: "All", value: "All", title: "전체 펀드" },
-            { label: "#Top10", value: "#Top10", title: "3년 수익률 추정 평균 기준"},
-            { label: "#Bottom10", value: "#Bottom10", title: "3년 수익률 추정 평균 기준"},
-            { label: "#Random10", value: "#Random10", title: "3년 수익률 추정 평균 기준"},
+            { label: "#Top10", value: "#Top10", title: "순위 기준으로 선택"},
+            { label: "#Bottom10", value: "#Bottom10", title: "순위 기준으로 선택"},
+            { label: "#Random10", value: "#Random10", title: "순위 기준으로 선택"},
         ];
         
         if (tickers) {
@@ -400,10 +474,11 @@ app.clientside_callback(
                 groups_m = [...groups_m.filter(group => previous.includes(group)), value];
 
                 // set options for nameValues from full fund name options
-                newNames = allnames.filter(obj => nameValues.includes(obj.value));
+                const nameSet = new Set(nameValues);
+                newNames = allnames.filter(obj => nameSet.has(obj.value));
                 
                 // set new options
-                newOptions = allnames.filter(obj => !nameValues.includes(obj.value));
+                newOptions = allnames.filter(obj => !nameSet.has(obj.value));
                 newOptions = [...newOptions, {'label':value, 'value':value}];
             }
         }
@@ -442,30 +517,17 @@ app.clientside_callback(
 # multiple selection for name category
 app.clientside_callback(
     """
-    function(pattern, category, groups, options) {
+    async function(pattern, category, groups, options) {
         // Return current groups if pattern is empty or category isn't 'name'
         if (!pattern || category !== "name") {
             return [groups, []];
         }
-        
-        // Get all the fund names
-        const obj = dataCategory[category];
-        let names = Object.keys(obj);
-
-        try {
-            // Escape special characters and convert * to .*
-            const escaped = pattern
-                .replace(/[.+?^${}()|[\\]\\\\]/g, '\\\\$&')
-                .replace(/\\*/g, '.*');
-            const regex = new RegExp('.*' + escaped + '.*', 'i');
-
-            // Filter and return options of matching values
-            let filtered = names.filter(opt => regex.test(opt));
-            return [filtered, options.filter(obj => filtered.includes(obj.value))];
-        } catch (e) {
-            console.error("Regex error:", e);
-            return [groups, []];
-        }
+        await loadData('dataSearch');
+
+        // Ranked fund names matching the pattern by the n-gram index of names
+        const filtered = searchNames(pattern);
+        const optionMap = new Map(options.map(obj => [obj.value, obj]));
+        return [filtered, filtered.filter(name => optionMap.has(name)).map(name => optionMap.get(name))];
     }
     """,
     Output('group-dropdown', 'value', allow_duplicate=True),
@@ -480,62 +542,69 @@ app.clientside_callback(
 # update tickers based on selected groups and category
 app.clientside_callback(
     """
-    function(groups, category, previous, names) {
-        let tickers = [];
-        const localCategory = dataCategory[category];
+    async function(groups, metric, category, previous, names) {
+        await loadData('dataIndex');
+        const index = getIndex();
+        const localCategory = index.groups[category];
         if (!groups || !category || !localCategory) return [];
 
         let localgroups = [...groups];
 
         // retrieve fund names to get tickers
-        const index = localgroups.findIndex(item => /^\\d+ funds selected$/.test(item));
-        if (index !== -1) {
+        const nameIndex = localgroups.findIndex(item => /^\\d+ funds selected$/.test(item));
+        if (nameIndex !== -1) {
             // splice() modifies the original array and returns the removed elements, not the updated array
-            localgroups.splice(index, 1, ...names.map(item => item.value));
+            localgroups.splice(nameIndex, 1, ...names.map(item => item.value));
         }
 
-        // If "All" is selected, return all tickers in the category
+        // union of bitsets of the selected groups, or all tickers in the category
+        let bits = newBits(index.tickers.length);
         if (localgroups.includes("All")) {
-            tickers = Object.values(localCategory).flat();
+            orBits(bits, index.all[category]);
         } else {
-            // Add tickers from selected groups
             for (const group of localgroups) {
                 if (localCategory[group]) {
-                    tickers.push(...localCategory[group]);
+                    orBits(bits, localCategory[group]);
                 }
             }
         }
     
         // Fallback to previous tickers if none found
-        if (tickers.length > 0) {
+        previous = previous || [];
+        if (bits.some(word => word !== 0)) {
             // Modify tickers based on previous if specified
-            if (previous && previous.length > 0) {
+            if (previous.length > 0) {
                 if (localgroups.includes("uPrevious")) {
-                    tickers.push(...previous);
+                    orBits(bits, tickersToBits(previous));
                 }
                 if (localgroups.includes("nPrevious")) {
-                    tickers = tickers.filter(ticker => previous.includes(ticker));
+                    andBits(bits, tickersToBits(previous));
                 }
             }
         } else {
-            tickers = previous.length > 0 ? previous : [];
+            bits = tickersToBits(previous);
         }
 
-        // Optional filtering by ranking
-        if (tickers) {
-            const groups_opt = localgroups?.filter(group => group.startsWith('#')) || [];
-            if (groups_opt.length === 1) {
-                const match = groups_opt[0].slice(1).match(/^([a-zA-Z]+)(\\d+)$/);
-                if (match) {
-                    tickers = selectTickers(match[1], tickers, dataRank, match[2]);
-                }
+        // Optional filtering by ranking, ex) #Top10 or #Random10@7 seeded by 7
+        let option = null, num = 0, seed = null;
+        const groups_opt = localgroups.filter(group => group.startsWith('#'));
+        if (groups_opt.length === 1) {
+            const match = groups_opt[0].slice(1).match(/^([a-zA-Z]+)(\\d+)(?:@(\\d+))?$/);
+            if (match) {
+                [option, num, seed] = [match[1], match[2], match[3] ?? null];
             }
         }
-        return tickers;
+        // rankings of other metrics than the mean are fetched when first selected
+        metric = metric || 'mean';
+        if (option && metric !== 'mean') {
+            await loadData('dataRanking');
+        }
+        return selectBits(option, bits, num, seed, metric);
     }
     """,
     Output('ticker-data', 'data'),
     Input('group-dropdown', 'value'),
+    Input('rank-dropdown', 'value'),
     State('category-dropdown', 'value'),
     State('previous-data', 'data'),
     State('filter-data', 'data')
@@ -544,12 +613,14 @@ app.clientside_callback(
 # save name and ticker of funds for copying
 app.clientside_callback(
     """
-    function(tickers) {
+    async function(tickers) {
         if (!Array.isArray(tickers)) {
             return '';
         }
+        await loadData('dataName');
+        const selected = new Set(tickers);
         let result = Object.entries(dataName)
-                     .filter(([k, v]) => tickers.includes(k)) // check if k is in tickers
+                     .filter(([k, v]) => selected.has(k)) // check if k is in tickers
                      .map(([k, v]) => `${k}: ${v}`);
         return result.join('\\n');
     }
@@ -561,21 +632,16 @@ app.clientside_callback(
 # update price data based on selected tickers
 app.clientside_callback(
     """
-    function(tickers) {
+    async function(tickers) {
+        if (renderServer) {
+            return window.dash_clientside.no_update; // plots from the server
+        }
         if (!Array.isArray(tickers)) {
             return {};
         }
-        
-        let data_prc_tkr = {};
-        for (let fee in dataPrice) {
-            data_prc_tkr[fee] = {};
-            for (let tkr in dataPrice[fee]) {
-                if (tickers.includes(tkr)) {
-                    data_prc_tkr[fee][tkr] = dataPrice[fee][tkr];
-                }
-            }
-        }
-        return data_prc_tkr;
+        // prices are fetched by the worker on first plot
+        await loadData('dataName');
+        return compute('slicePrice', tickers);
     }
     """,
     Output('price-data', 'data'),
@@ -585,32 +651,85 @@ app.clientside_callback(
 # plot price history
 app.clientside_callback(
     """
-    function(data, cost, compare) {
-        if (!data || Object.keys(data).length === 0) {
+    async function(data, cost, compare, relayout) {
+        if (renderServer) {
+            return window.dash_clientside.no_update;
+        }
+        if (!data || !data.values) {
             return { data: [], layout: {} };  // Empty plot
         }
         
-        let fees = Object.keys(data);
+        let fees = Object.keys(data.values);
         let fee = cost ? fees[1] : fees[0];
 
-        if (!data[fee]) {
+        if (!data.values[fee]) {
             return { data: [], layout: {} };
         }
 
-        let df = data[fee];
+        // points of each trace in the visible range, bounded so that the points of all
+        // traces are those of glTraces traces of the width of the window and the legend
+        // by legendTraces, not to slow down redraw as the selection grows.
+        // a zoom redraws only if the traces are downsampled before or after it
+        const glTraces = 10;
+        const legendTraces = 30;
+        const pixels = Math.max(window.innerWidth || 0, 300);
+        const points = Math.max(Math.floor(pixels * glTraces / Math.max(data.tickers.length, glTraces)), 3);
+        const range = getXRange(relayout);
+        const decimate = countDates(data.dates, range) > points;
+        const ctx = window.dash_clientside.callback_context;
+        const zoomed = ctx && ctx.triggered.length > 0
+            && ctx.triggered.every(x => x.prop_id === 'price-plot.relayoutData');
+        const last = window._pricePlot || {};
+        if (zoomed && (range === undefined || (!decimate && !last.decimate)
+                       || JSON.stringify(range) === JSON.stringify(last.range))) {
+            return window.dash_clientside.no_update;
+        }
+        window._pricePlot = {range: range, decimate: decimate};
+
+        // band of min/median/max of the tickers not selected
+        const band = compute('getRestBand', data.index, fee, compare);
         if (compare) {
-            df = normalizePrice(df, 1000);
+            data = await compute('normalizePrice', data, 1000);
         }
         let traces = [];
 
-        for (let tkr in df) {
+        // every selected ticker in rank order, drawn by WebGL if many
+        const type = data.tickers.length > glTraces ? 'scattergl' : 'scatter';
+        const toValue = val => val === null || Number.isNaN(val) ? null : Math.round(val);
+
+        data.tickers.forEach((tkr, i) => {
+            let series = data.values[fee][i];
+            let x = data.dates.slice(data.start[i], data.start[i] + series.length);
+            let y = Array.from(series, toValue);
+            const visible = range ? countDates(x, range) : x.length;
+            if (visible > points) {
+                const idx = lttb(y, Math.floor(points * x.length / visible));
+                x = idx.map(k => x[k]);
+                y = idx.map(k => y[k]);
+            }
             traces.push({
-                x: Object.keys(df[tkr]),  // Assuming keys are dates
-                y: Object.values(df[tkr]).map(val => Math.round(val)),  // Assuming values are prices
-                type: 'scatter',
+                x: x,
+                y: y,
+                type: type,
                 mode: 'lines',
-                name: dataName[tkr]
+                name: dataName[tkr],
+                showlegend: i < legendTraces
             });
+        });
+
+        const rest = await band;
+        if (rest.count > 0) {
+            const bandName = `그 외 ${rest.count}개 펀드`;
+            const line = { width: 0, color: 'rgba(128, 128, 128, 0.5)' };
+            traces.push(
+                { x: data.dates, y: rest.max.map(toValue), type: type, mode: 'lines', line: line,
+                  name: `${bandName} (최대)`, legendgroup: 'band', showlegend: false, hoverinfo: 'skip' },
+                { x: data.dates, y: rest.min.map(toValue), type: type, mode: 'lines', line: line,
+                  fill: 'tonexty', fillcolor: 'rgba(128, 128, 128, 0.2)',
+                  name: `${bandName} (최소)`, legendgroup: 'band', showlegend: false, hoverinfo: 'skip' },
+                { x: data.dates, y: rest.median.map(toValue), type: type, mode: 'lines', 
+                  line: { color: 'gray', dash: 'dot' }, name: `${bandName} (중앙값)`, legendgroup: 'band' }
+            );
         }
 
         // Title logic
@@ -623,7 +742,8 @@ app.clientside_callback(
 
         let layout = {
             title: { text: title},
-            hovermode: 'x',
+            // labels of the nearest line only if many so that hover does not slow down
+            hovermode: data.tickers.length > glTraces ? 'closest' : 'x',
             yaxis: { title: '가격' },
             xaxis: {
                 rangeselector: {
@@ -644,6 +764,9 @@ app.clientside_callback(
             },
             //height: 500,
         }
+        if (range) {
+            layout.xaxis.range = range; // keep the zoom
+        }
 
         // Adjust legend position for mobile devices
         layout = updateLayout(layout, x = 0, y = -0.5, width = 768)
@@ -658,31 +781,23 @@ app.clientside_callback(
     Input('price-data', 'data'),
     Input('cost-boolean-switch', 'on'),
     Input('compare-boolean-switch', 'on'),
+    Input('price-plot', 'relayoutData'),
 )
 
 
 # plot bar chart of cagr
 app.clientside_callback(
     """
-    function(data, compare) {
-        if (!data || Object.keys(data).length === 0) {
+    async function(data, compare) {
+        if (renderServer) {
+            return window.dash_clientside.no_update;
+        }
+        if (!data || !data.values || data.tickers.length === 0) {
             return { data: [], layout: {} };
         }
 
-        // calc CAGR
-        let data_cagr = {};
-        for (let fee in data) {
-            let df = data[fee];
-            if (compare) { // normalize depending on compare switch
-                df = normalizePrice(df, 1000);
-                let tickers = Object.keys(df);
-                var dates = Object.keys(df[tickers[0]]);
-            };
-            data_cagr[fee] = {};
-            for (let tkr in df) {
-                data_cagr[fee][tkr] = calculateCAGR(df[tkr]);
-            }
-        }
+        // precomputed CAGR since inception or CAGR from the common start
+        let { cagr: data_cagr, start, end } = await compute('getCAGR', data, compare);
 
         let categories = Object.keys(data_cagr);
         let tickers = Object.entries(data_cagr[categories[1]]) // use cagr after fees for sorting
@@ -700,10 +815,8 @@ app.clientside_callback(
         });
 
         let title;
-        if (compare) {
-            const dt0 = new Date(Math.min(...dates.map(d => new Date(d).getTime()))).toISOString().slice(0, 10);
-            const dt1 = new Date(Math.max(...dates.map(d => new Date(d).getTime()))).toISOString().slice(0, 10);
-            title = `펀드 연평균 수익률 (${dt0} ~ ${dt1})`;
+        if (compare && start) {
+            title = `펀드 연평균 수익률 (${start} ~ ${end})`;
         } else {
             title = '펀드 연평균 수익률 (펀드별 설정일 이후)';
         };
@@ -727,29 +840,170 @@ app.clientside_callback(
     Input('compare-boolean-switch', 'on')
 )
 
-# update scatter data based on selected tickers
+def get_rank_groups(groups, metric):
+    """
+    return groups with the metric appended to the rank options for the API, ex) #Top10:sortino
+    """
+    if not metric or metric == 'mean':
+        return groups
+    return [f'{x}:{metric}' if x.startswith('#') else x for x in groups or []]
+
+
+def get_server_figure(plot, category, groups, metric, tickers, *args, **kwargs):
+    """
+    return figure of the groups, or of the tickers selected by the client if the groups
+     have selections only in the browser such as nPrevious, 'N funds selected' or #Random10
+    """
+    try:
+        return figures.get_figure(plot, category, get_rank_groups(groups, metric),
+                                  *args, **kwargs)
+    except ValueError:
+        if tickers is None:
+            raise
+        return figures.get_figure(plot, category, groups, *args, tickers=tickers, **kwargs)
+
+
+# plots of the selection rendered by the server
+if render_server:
+    @app.callback(
+        Output('price-plot', 'figure', allow_duplicate=True),
+        Output('cagr-plot', 'figure', allow_duplicate=True),
+        Input('ticker-data', 'data'), # updated by the selection
+        Input('cost-boolean-switch', 'on'),
+        Input('compare-boolean-switch', 'on'),
+        State('group-dropdown', 'value'),
+        State('rank-dropdown', 'value'),
+        State('category-dropdown', 'value'),
+        prevent_initial_call='initial_duplicate'
+    )
+    def update_figures(tickers, cost, compare, groups, metric, category):
+        try:
+            return [json.loads(get_server_figure(x, category, groups, metric, tickers, cost, compare))
+                    for x in ('price', 'cagr')]
+        except ValueError: # no tickers selected
+            return no_update, no_update
+
+# backtest of the equal-weight portfolio of the selected tickers
 app.clientside_callback(
     """
-    function(tickers) {
-        if (!Array.isArray(tickers)) {
+    async function(data, rebalance, tab) {
+        if (renderServer) {
+            return window.dash_clientside.no_update; // plot from the server
+        }
+        if (!data || !data.values) {
             return {};
         }
+        // computed only when the backtest tab opens
+        if (tab !== "tab_backtest") {
+            return window.dash_clientside.no_update;
+        }
+        return compute('backtestPrice', data, rebalance);
+    }
+    """,
+    Output('backtest-data', 'data'),
+    Input('price-data', 'data'),
+    Input('rebalance-radio', 'value'),
+    Input('tabs', 'active_tab')
+)
 
-        const filteredData = {};
-        for (const key in dataScatter) {
-            filteredData[key] = {};
-            for (const ticker of tickers) {
-              if (dataScatter[key][ticker] !== undefined) {
-                filteredData[key][ticker] = dataScatter[key][ticker];
-              }
+# plot equity curve and drawdown of the backtest
+app.clientside_callback(
+    """
+    function(data, cost, rebalance) {
+        if (renderServer) {
+            return window.dash_clientside.no_update;
+        }
+        if (!data || !data.values || data.dates.length === 0) {
+            return { data: [], layout: {} };
+        }
+        const fees = Object.keys(data.values);
+        const fee = cost ? fees[1] : fees[0];
+        const toValue = (val, k) => val === null || Number.isNaN(val) ? null : Math.round(val * k) / k;
+        const cagr = data.cagr[fee], mdd = data.mdd[fee];
+
+        let traces = [
+            {
+                x: data.dates,
+                y: Array.from(data.values[fee], v => toValue(v, 1)),
+                type: 'scatter',
+                mode: 'lines',
+                name: cagr === null ? '포트폴리오' : `포트폴리오 (연평균 ${cagr.toFixed(1)}%)`
+            },
+            {
+                x: data.dates,
+                y: Array.from(data.drawdown[fee], v => toValue(v, 10)),
+                type: 'scatter',
+                mode: 'lines',
+                fill: 'tozeroy',
+                yaxis: 'y2',
+                line: { color: 'rgba(239, 85, 59, 0.8)', width: 1 },
+                name: mdd === null ? '낙폭' : `낙폭 (최대 ${mdd.toFixed(1)}%)`
             }
+        ];
+
+        const labels = { monthly: '월간', quarterly: '분기', annual: '연간' };
+        let title = `포트폴리오 백테스트 (동일 비중, ${labels[rebalance]} 리밸런싱`;
+        title = cost ? `${title}, 수수료 적용)` : `${title})`;
+
+        let layout = {
+            title: { text: title },
+            hovermode: 'x',
+            yaxis: { title: '가격', domain: [0.35, 1] },
+            yaxis2: { title: '낙폭 (%)', domain: [0, 0.25] },
+            xaxis: { type: 'date' }
+        };
+
+        // Adjust legend position for mobile devices
+        layout = updateLayout(layout, x = 0, y = -0.5, width = 768)
+
+        return { data: traces, layout: layout };
+    }
+    """,
+    Output('backtest-plot', 'figure'),
+    Input('backtest-data', 'data'),
+    Input('cost-boolean-switch', 'on'),
+    State('rebalance-radio', 'value')
+)
+
+# backtest of the selection computed by the server
+if render_server:
+    @app.callback(
+        Output('backtest-plot', 'figure', allow_duplicate=True),
+        Input('ticker-data', 'data'), # updated by the selection
+        Input('cost-boolean-switch', 'on'),
+        Input('rebalance-radio', 'value'),
+        Input('tabs', 'active_tab'),
+        State('group-dropdown', 'value'),
+        State('rank-dropdown', 'value'),
+        State('category-dropdown', 'value'),
+        prevent_initial_call='initial_duplicate'
+    )
+    def update_backtest(tickers, cost, rebalance, tab, groups, metric, category):
+        if tab != 'tab_backtest':
+            return no_update
+        try:
+            return json.loads(get_server_figure('backtest', category, groups, metric, tickers,
+                                                cost, rebalance=rebalance))
+        except ValueError: # no tickers selected
+            return no_update
+
+# update scatter data based on selected tickers
+app.clientside_callback(
+    """
+    async function(tickers, tab) {
+        if (!Array.isArray(tickers)) {
+            return {};
         }
-        
-        return filteredData;
+        // fetch stats only when the scatter tab opens
+        if (tab !== "tab_scatter") {
+            return window.dash_clientside.no_update;
+        }
+        return compute('filterScatter', tickers);
     }
     """,
     Output('scatter-data', 'data'),
-    Input('ticker-data', 'data')
+    Input('ticker-data', 'data'),
+    Input('tabs', 'active_tab')
 )
 
 # scatter plot of mean/sd of 3yr return estimations
@@ -763,6 +1017,10 @@ app.clientside_callback(
         // Custom color map
         const color_map = ['#636EFA', '#EF553B', '#00CC96', '#AB63FA', '#FFA15A', '#19D3F3', '#FF6692', '#B6E880', '#FF97FF', '#FECB52'];
 
+        if (!data || !data['mean']) {
+            return { data: [], layout: {} };
+        }
+
         // Get the keys (i.e., the unique identifiers) for the data
         const keys = Object.keys(data['mean']);
 
@@ -859,6 +1117,8 @@ app.clientside_callback(
             return [cost, compare, true, true];
         } else if (tab === "tab_cagr") {
             return [true, compare, true, false];
+        } else if (tab === "tab_backtest") {
+            return [cost, false, false, true];
         } else {
             return [cost, compare, false, false];
         }
@@ -957,4 +1217,6 @@ app.clientside_callback(
 
 # Run the app
 if __name__ == '__main__':
+    if render_server:
+        figures.warm(category_default, group_default)
     app.run_server(debug=False)
\ No newline at end of file
@@ -1,105 +1,807 @@
-window.calculateCAGR = function(data_tkr) {
-    if (!data_tkr || Object.keys(data_tkr).length < 2) return "Invalid data";
+// this file runs in the page and in the compute worker created from the same file
+if (typeof window === 'undefined') self.window = self;
+// url of this file to start the worker, available only while the page runs it
+window._utilsUrl = window.document && document.currentScript ? document.currentScript.src : null;
 
-    // Convert date keys to an array and sort them in ascending order
-    let dates = Object.keys(data_tkr)
-        .filter(date => {
-            const value = data_tkr[date];
-            return value != null && !Number.isNaN(value);
-        })
-        .sort();
-    
-    // First and last values
-    let initialValue = data_tkr[dates[0]];
-    let finalValue = data_tkr[dates[dates.length - 1]];
 
-    // Compute number of months between first and last date
-    let startDate = new Date(dates[0]);
-    let endDate = new Date(dates[dates.length - 1]);
-    let months = (endDate.getFullYear() - startDate.getFullYear()) * 12 + (endDate.getMonth() - startDate.getMonth());
+window.fetchJSON = function(url) {
+    return fetch(url).then(response => {
+        if (!response.ok) throw new Error(`Failed to load ${url}: ${response.status}`);
+        return response.json();
+    });
+};
+
 
-    // Convert months to years
-    let years = months / 12;
-    if (years <= 0) return "Time period too short";
+window.loadData = function(name) {
+    // Fetch a data asset listed in dataAssets once and keep it in the global
+    // variable of the same name (ex: dataPrice). return a promise to await
+    window._loadData = window._loadData || {};
+    if (!window._loadData[name]) {
+        const asset = dataAssets[name];
+        // prices of base and deltas if not url
+        const load = typeof asset === 'string' ? fetchJSON(asset) : loadPrice(asset);
+        window._loadData[name] = load
+            .then(data => { window[name] = data; return data; })
+            .catch(error => {
+                delete window._loadData[name]; // retry on next call
+                throw error;
+            });
+    }
+    return window._loadData[name];
+};
+
+
+window.idbRequest = function(mode, callback) {
+    // Run callback with the object store of IndexedDB and return a promise of its result
+    return new Promise((resolve, reject) => {
+        if (!window.indexedDB) return reject(new Error('IndexedDB not supported'));
+        const open = indexedDB.open('dalfund', 1);
+        open.onupgradeneeded = () => open.result.createObjectStore('data');
+        open.onerror = () => reject(open.error);
+        open.onsuccess = () => {
+            const db = open.result;
+            const tx = db.transaction('data', mode);
+            const request = callback(tx.objectStore('data'));
+            tx.oncomplete = () => { db.close(); resolve(request.result); };
+            tx.onerror = () => { db.close(); reject(tx.error); };
+        };
+    });
+};
 
-    // Calculate CAGR
-    let cagr = (finalValue / initialValue) ** (1 / years) - 1;
 
-    // Format as percentage
-    //return "CAGR: " + (cagr * 100).toFixed(2) + "%";
-    return (cagr * 100);
+window.loadPrice = async function(manifest) {
+    // Load prices from the base and deltas in manifest, starting from the data 
+    // cached in IndexedDB so that only the deltas after the cached date are fetched
+    const cached = await idbRequest('readonly', store => store.get('price')).catch(() => null);
+    let data = null;
+    let deltas = manifest.deltas;
+    if (cached && cached.id === manifest.base.id) {
+        data = cached;
+    } else if (cached) {
+        const k = deltas.findIndex(delta => delta.id === cached.id);
+        if (k !== -1) {
+            data = cached;
+            deltas = deltas.slice(k + 1);
+        }
+    }
+    // fetch all the files in parallel and merge them in order
+    const files = Promise.all(deltas.map(delta => fetchJSON(delta.url)));
+    if (data === null) {
+        data = decodePrice(await fetchJSON(manifest.base.url));
+        data.id = manifest.base.id;
+    }
+    for (const delta of await files) {
+        data = appendPrice(data, delta);
+    }
+    if (!cached || cached.id !== data.id) {
+        await idbRequest('readwrite', store => store.put(data, 'price')).catch(console.error);
+    }
+    return data;
 };
 
 
-window.normalizePrice = function(data_tickers, basePrc = 1000) {
-    // Extract tickers (fund names)
-    let tickers = Object.keys(data_tickers);
+window.decodeArray = function(text, type = Float32Array) {
+    // Decode base64 string of little-endian binary into a typed array
+    if (typeof text !== 'string') return text; // already decoded
+    const binary = atob(text);
+    const bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) {
+        bytes[i] = binary.charCodeAt(i);
+    }
+    return new type(bytes.buffer);
+};
+
+
+window.decodePrice = function(payload) {
+    // Convert the columnar price payload into typed arrays
+    let values = {}, cagr = {};
+    for (let fee in payload.values) {
+        values[fee] = decodeArray(payload.values[fee]);
+        cagr[fee] = decodeArray(payload.cagr[fee]);
+    }
+    return {
+        id: payload.id,
+        dates: payload.dates,
+        tickers: payload.tickers,
+        start: Int32Array.from(payload.start),
+        offset: Int32Array.from(payload.offset),
+        values: values,
+        cagr: cagr
+    };
+};
+
+
+window.appendPrice = function(data, delta) {
+    // Append the date of delta to the decoded price data with the tickers listed at the date
+    const j = data.dates.length;
+    const n0 = data.tickers.length;
+    const n = n0 + delta.tickers.length;
+    let start = new Int32Array(n);
+    let offset = new Int32Array(n + 1);
+    start.set(data.start);
+    start.fill(j, n0);
+    // extend each series to the new date
+    for (let i = 0; i < n; i++) {
+        offset[i + 1] = offset[i] + j + 1 - start[i];
+    }
+    let values = {}, cagr = {};
+    for (let fee in data.values) {
+        const newValues = decodeArray(delta.values[fee]);
+        values[fee] = new Float32Array(offset[n]).fill(NaN);
+        for (let i = 0; i < n; i++) {
+            if (i < n0) {
+                values[fee].set(data.values[fee].subarray(data.offset[i], data.offset[i + 1]), offset[i]);
+            }
+            values[fee][offset[i + 1] - 1] = newValues[i];
+        }
+        cagr[fee] = decodeArray(delta.cagr[fee]);
+    }
+    return {
+        id: delta.id,
+        dates: [...data.dates, delta.date],
+        tickers: [...data.tickers, ...delta.tickers],
+        start: start,
+        offset: offset,
+        values: values,
+        cagr: cagr
+    };
+};
+
 
-    // Collect all unique dates across all tickers
-    let allDates = new Set();
+window.preparePrice = function(data) {
+    // Add ticker index, month numbers and cumulative log returns (log prices)
+    // cached for normalization to the decoded price data
+    let logValues = {};
+    for (let fee in data.values) {
+        logValues[fee] = new Float64Array(data.values[fee].length);
+        for (let i = 0; i < data.values[fee].length; i++) {
+            logValues[fee][i] = Math.log(data.values[fee][i]);
+        }
+    }
+    return {
+        ...data,
+        // month number of each date to count months between dates
+        months: Int32Array.from(data.dates, d => d.slice(0, 4) * 12 + Number(d.slice(5, 7))),
+        index: Object.fromEntries(data.tickers.map((tkr, i) => [tkr, i])),
+        logValues: logValues
+    };
+};
+
+
+window.getPrice = function() {
+    // Prepare dataPrice once on first use
+    if (!window._dataPrice) {
+        window._dataPrice = preparePrice(decodePrice(dataPrice));
+    }
+    return window._dataPrice;
+};
+
+
+window.slicePrice = function(tickers) {
+    // Build the price data of tickers with the same columnar layout, 
+    // in plain arrays with null for missing months to save in dcc.Store
+    const prc = getPrice();
+    const toValue = v => Number.isNaN(v) ? null : v;
+    let result = {dates: prc.dates, tickers: [], index: [], start: [], values: {}, cagr: {}};
+    for (let fee in prc.values) {
+        result.values[fee] = [];
+        result.cagr[fee] = [];
+    }
     for (let tkr of tickers) {
-        Object.keys(data_tickers[tkr]).forEach(date => allDates.add(date));
+        const i = prc.index[tkr];
+        if (i === undefined) continue;
+        result.tickers.push(tkr);
+        result.index.push(i);
+        result.start.push(prc.start[i]);
+        for (let fee in prc.values) {
+            const arr = prc.values[fee].subarray(prc.offset[i], prc.offset[i + 1]);
+            result.values[fee].push(Array.from(arr, toValue));
+            result.cagr[fee].push(toValue(prc.cagr[fee][i]));
+        }
+    }
+    return result;
+};
+
+
+window.findCommonStart = function(data) {
+    // Return index of the first date where all tickers of data have valid values
+    const prc = getPrice();
+    const fees = Object.keys(prc.values);
+    if (data.index.length === 0) return -1;
+    const endIndex = Math.min(...data.index.map(i => prc.start[i] + prc.offset[i + 1] - prc.offset[i]));
+    for (let j = Math.max(...data.start); j < endIndex; j++) {
+        const valid = fees.every(fee => data.index.every(i => 
+            !Number.isNaN(prc.values[fee][prc.offset[i] + j - prc.start[i]])
+        ));
+        if (valid) return j;
     }
+    return -1;
+};
 
-    // Sort dates in ascending order
-    let dates = Array.from(allDates).sort();
 
-    // Find the first date where all tickers have valid values
-    let startIndex = dates.findIndex(date => 
-        tickers.every(tkr => 
-            data_tickers[tkr][date] !== null && 
-            data_tickers[tkr][date] !== undefined &&
-            !isNaN(data_tickers[tkr][date])
-        )
-    );
+window.normalizePrice = function(data, basePrc = 1000) {
+    // data: price data of the layout from slicePrice
+    const prc = getPrice();
+    const startIndex = findCommonStart(data);
+    if (startIndex === -1) return data; // No valid start date found
 
-    if (startIndex === -1) return data_tickers; // No valid start date found
+    // Normalize by subtracting the log price at the start from the cached log prices.
+    // each series is a Float64Array with NaN for missing months to transfer from the worker
+    let result = {...data, start: data.index.map(() => startIndex), values: {}};
+    for (let fee in data.values) {
+        result.values[fee] = data.index.map(i => {
+            const logs = prc.logValues[fee].subarray(prc.offset[i] + startIndex - prc.start[i], prc.offset[i + 1]);
+            const base = logs[0];
+            return Float64Array.from(logs, v => Math.exp(v - base) * basePrc);
+        });
+    }
+    return result;
+};
 
-    let startDate = dates[startIndex];
 
-    // Compute the normalized values with the same structure as the input
+window.getCAGR = function(data, compare) {
+    // Return CAGR (%) of each fee and ticker with the first and last date of the period.
+    // CAGR since inception is precomputed. CAGR from the common start for compare
+    // is given by the difference of the cached log prices
+    const prc = getPrice();
     let result = {};
-    for (let tkr of tickers) {
-        result[tkr] = {};
-        for (let i = startIndex; i < dates.length; i++) {
-            let date = dates[i];
-            if (data_tickers[tkr][startDate] !== null && data_tickers[tkr][startDate] !== undefined) {
-                result[tkr][date] = (data_tickers[tkr][date] / data_tickers[tkr][startDate]) * basePrc;
-            } else {
-                result[tkr][date] = null;
+    const startIndex = compare ? findCommonStart(data) : -1;
+    if (startIndex === -1) {
+        for (let fee in data.cagr) {
+            result[fee] = Object.fromEntries(data.tickers.map((tkr, k) => [tkr, data.cagr[fee][k]]));
+        }
+        return {cagr: result, start: null, end: null};
+    }
+
+    let endIndex = startIndex;
+    for (let fee in data.values) {
+        const logs = prc.logValues[fee];
+        result[fee] = {};
+        data.tickers.forEach((tkr, k) => {
+            const i = data.index[k];
+            let last = prc.offset[i + 1] - 1;
+            while (last > prc.offset[i] && Number.isNaN(logs[last])) last--;
+            const j = prc.start[i] + last - prc.offset[i]; // date index of the last price
+            const years = (prc.months[j] - prc.months[startIndex]) / 12;
+            const logRet = logs[last] - logs[prc.offset[i] + startIndex - prc.start[i]];
+            result[fee][tkr] = years > 0 ? (Math.exp(logRet / years) - 1) * 100 : null;
+            endIndex = Math.max(endIndex, j);
+        });
+    }
+    return {cagr: result, start: prc.dates[startIndex], end: prc.dates[endIndex]};
+};
+
+
+window.rebalanceMonths = {monthly: 1, quarterly: 3, annual: 12};
+
+
+window.getReturns = function(logs, start, nDates) {
+    // Return simple returns from the previous date on the date axis from the log prices
+    // of a ticker starting at the date index of start, with missing prices inside
+    // the history interpolated geometrically and NaN outside
+    let ret = new Float64Array(nDates).fill(NaN);
+    let last = -1;
+    for (let k = 0; k < logs.length; k++) {
+        if (Number.isNaN(logs[k])) continue;
+        if (last !== -1) {
+            const step = (logs[k] - logs[last]) / (k - last);
+            for (let m = last + 1; m <= k; m++) ret[start + m] = Math.expm1(step);
+        }
+        last = k;
+    }
+    return ret;
+};
+
+
+window.backtestPrice = function(data, rebalance = 'quarterly', basePrc = 1000) {
+    // Return equity curve, drawdown (%), CAGR (%) and max drawdown (%) of each fee
+    // of the equal-weight portfolio of the tickers of data, the same as run of
+    // backtest_utils: funds join at the first rebalancing after inception and
+    // funds of which prices end are held as cash until the next rebalancing
+    const prc = getPrice();
+    const freq = rebalanceMonths[rebalance];
+    const nDates = prc.dates.length;
+    const n = data.index.length;
+    let result = {dates: prc.dates, values: {}, drawdown: {}, cagr: {}, mdd: {}};
+    if (n === 0 || nDates < 2) return {...result, dates: []};
+    const period = j => Math.floor((prc.months[j] - 1) / freq);
+
+    let first = nDates, last = -1;
+    for (let fee in data.values) {
+        const rets = data.index.map(i => getReturns(
+            prc.logValues[fee].subarray(prc.offset[i], prc.offset[i + 1]), prc.start[i], nDates));
+        let equity = new Float64Array(nDates).fill(NaN);
+        let value = null, weights = new Float64Array(n), holdings = new Float64Array(n), cash = 0;
+        for (let j = 1; j < nDates; j++) {
+            if (period(j) !== period(j - 1)) {
+                // rebalance at the date before among the funds with returns
+                let count = 0;
+                for (let k = 0; k < n; k++) {
+                    weights[k] = Number.isNaN(rets[k][j]) ? 0 : 1;
+                    count += weights[k];
+                }
+                if (value === null && count > 0) {
+                    value = 1;
+                    equity[j - 1] = 1;
+                }
+                if (value === null) continue;
+                for (let k = 0; k < n; k++) holdings[k] = count > 0 ? value * weights[k] / count : 0;
+                cash = count > 0 ? 0 : value;
+            }
+            if (value === null) continue;
+            value = cash;
+            for (let k = 0; k < n; k++) {
+                const r = rets[k][j];
+                if (!Number.isNaN(r)) holdings[k] *= 1 + r;
+                value += holdings[k];
             }
+            equity[j] = value;
+        }
+
+        // drawdown from the peak and CAGR from the start to the end
+        let peak = -Infinity, mdd = 0, j0 = -1, j1 = -1;
+        let drawdown = new Float64Array(nDates).fill(NaN);
+        for (let j = 0; j < nDates; j++) {
+            if (Number.isNaN(equity[j])) continue;
+            if (j0 === -1) j0 = j;
+            j1 = j;
+            peak = Math.max(peak, equity[j]);
+            drawdown[j] = (equity[j] / peak - 1) * 100;
+            mdd = Math.min(mdd, drawdown[j]);
+            equity[j] *= basePrc;
+        }
+        const months = j0 === -1 ? 0 : prc.months[j1] - prc.months[j0];
+        result.values[fee] = equity;
+        result.drawdown[fee] = drawdown;
+        result.cagr[fee] = months > 0 ? (Math.pow(equity[j1] / equity[j0], 12 / months) - 1) * 100 : null;
+        result.mdd[fee] = j0 === -1 ? null : mdd;
+        if (j0 !== -1) {
+            first = Math.min(first, j0);
+            last = Math.max(last, j1);
         }
     }
+    // dates with values of any fee
+    if (last === -1) return {...result, dates: []};
+    for (let fee in result.values) {
+        result.values[fee] = result.values[fee].slice(first, last + 1);
+        result.drawdown[fee] = result.drawdown[fee].slice(first, last + 1);
+    }
+    result.dates = prc.dates.slice(first, last + 1);
+    return result;
+};
+
 
+window.getIndex = function() {
+    // Decode dataIndex once: ids of tickers in rank order and bitsets of groups
+    if (!window._dataIndex) {
+        const n = dataIndex.tickers.length;
+        let groups = {}, all = {};
+        for (const cat in dataIndex.groups) {
+            groups[cat] = {};
+            all[cat] = newBits(n);
+            for (const group in dataIndex.groups[cat]) {
+                groups[cat][group] = decodeArray(dataIndex.groups[cat][group], Uint32Array);
+                orBits(all[cat], groups[cat][group]);
+            }
+        }
+        window._dataIndex = {
+            tickers: dataIndex.tickers,
+            ranked: dataIndex.ranked,
+            id: Object.fromEntries(dataIndex.tickers.map((tkr, i) => [tkr, i])),
+            groups: groups,
+            all: all  // bitset of all tickers in each category
+        };
+    }
+    return window._dataIndex;
+};
+
+
+window.getRanking = function() {
+    // Decode dataRanking once: ids of the ranked tickers of each metric from the best
+    if (!window._dataRanking) {
+        const type = dataRanking.dtype === 'uint16' ? Uint16Array : Uint32Array;
+        window._dataRanking = Object.fromEntries(Object.entries(dataRanking.order)
+            .map(([metric, text]) => [metric, decodeArray(text, type)]));
+    }
+    return window._dataRanking;
+};
+
+
+window.newBits = function(n) {
+    return new Uint32Array((n + 31) >>> 5);
+};
+
+
+window.orBits = function(bits, other) {
+    // Union of bitsets in place
+    for (let k = 0; k < bits.length; k++) bits[k] |= other[k];
+    return bits;
+};
+
+
+window.andBits = function(bits, other) {
+    // Intersection of bitsets in place
+    for (let k = 0; k < bits.length; k++) bits[k] &= other[k];
+    return bits;
+};
+
+
+window.tickersToBits = function(tickers) {
+    // Bitset of tickers in the index, ignoring unknown tickers
+    const index = getIndex();
+    let bits = newBits(index.tickers.length);
+    for (const tkr of tickers) {
+        const i = index.id[tkr];
+        if (i !== undefined) bits[i >>> 5] |= 1 << (i & 31);
+    }
+    return bits;
+};
+
+
+window.bitsToIds = function(bits) {
+    // Return ids of the set bits in ascending order
+    let ids = [];
+    for (let k = 0; k < bits.length; k++) {
+        let word = bits[k];
+        while (word) {
+            const low = word & -word;
+            ids.push((k << 5) + 31 - Math.clz32(low));
+            word ^= low;
+        }
+    }
+    return ids;
+};
+
+
+window.firstIds = function(bits, num, end) {
+    // Return up to num ids of the set bits less than end in ascending order,
+    // scanning the words from the start only until num are found
+    let ids = [];
+    for (let k = 0; k < bits.length && ids.length < num; k++) {
+        let word = bits[k];
+        while (word && ids.length < num) {
+            const low = word & -word;
+            const i = (k << 5) + 31 - Math.clz32(low);
+            if (i >= end) return ids;
+            ids.push(i);
+            word ^= low;
+        }
+    }
+    return ids;
+};
+
+
+window.lastIds = function(bits, num, end) {
+    // Return up to num ids of the set bits less than end in descending order,
+    // scanning the words backward from end only until num are found
+    let ids = [];
+    for (let k = (end - 1) >>> 5; k >= 0 && end > 0 && ids.length < num; k--) {
+        let word = bits[k];
+        if (k === (end - 1) >>> 5 && (end & 31)) word &= (1 << (end & 31)) - 1; // ids < end
+        while (word && ids.length < num) {
+            const i = (k << 5) + 31 - Math.clz32(word); // highest bit
+            ids.push(i);
+            word ^= 1 << (i & 31);
+        }
+    }
+    return ids;
+};
+
+
+window.rankedIds = function(order, bits, num, reverse = false) {
+    // Return up to num ids of order in the bitset, scanning order from the start
+    // (or the end if reverse) only until num are found
+    let ids = [];
+    const n = order.length;
+    for (let k = 0; k < n && ids.length < num; k++) {
+        const i = order[reverse ? n - 1 - k : k];
+        if (bits[i >>> 5] & (1 << (i & 31))) ids.push(i);
+    }
+    return ids;
+};
+
+
+window.mulberry32 = function(seed) {
+    // Seeded generator of uniform numbers in [0, 1), the same as mulberry32 of api_utils
+    let a = seed >>> 0;
+    return function() {
+        a = (a + 0x6D2B79F5) >>> 0;
+        let t = Math.imul(a ^ (a >>> 15), 1 | a);
+        t = (t + Math.imul(t ^ (t >>> 7), 61 | t)) ^ t;
+        return ((t ^ (t >>> 14)) >>> 0) / 4294967296;
+    };
+};
+
+
+window.sampleIds = function(ids, num, random = Math.random) {
+    // Return num ids drawn without replacement by partial Fisher-Yates shuffle in place
+    num = Math.min(num, ids.length);
+    for (let k = 0; k < num; k++) {
+        const j = k + Math.floor(random() * (ids.length - k));
+        const t = ids[k]; ids[k] = ids[j]; ids[j] = t;
+    }
+    return ids.slice(0, num);
+};
+
+
+window.selectBits = function(option, bits, num = 10, seed = null, metric = 'mean') {
+    // Return tickers of bitset in rank order, or Top/Bottom/Random num of the ranked.
+    // ids are ranks so that ranked tickers are the ids less than index.ranked and
+    // Top/Bottom are the first/last set bits among them without listing all of the bitset.
+    // Random is reproducible with seed.
+    // Other metrics than the mean rank by the ids in order of dataRanking, to be loaded before
+    const index = getIndex();
+    num = Number(num);
+    let ids;
+    if (metric !== 'mean' && ["Top", "Bottom", "Random"].includes(option)) {
+        const order = getRanking()[metric];
+        if (option === "Random") {
+            ids = rankedIds(order, bits, Infinity);
+            ids = sampleIds(ids, num, seed === null ? Math.random : mulberry32(Number(seed)));
+        } else {
+            ids = rankedIds(order, bits, num, option === "Bottom");
+        }
+    } else if (option === "Top") {
+        ids = firstIds(bits, num, index.ranked);
+    } else if (option === "Bottom") {
+        ids = lastIds(bits, num, index.ranked); // Descending order (higher rank is worse)
+    } else if (option === "Random") {
+        ids = firstIds(bits, Infinity, index.ranked);
+        ids = sampleIds(ids, num, seed === null ? Math.random : mulberry32(Number(seed)));
+    } else {
+        ids = bitsToIds(bits);
+    }
+    return ids.map(i => index.tickers[i]);
+};
+
+
+// compatibility jamo typed alone to conjoining jamo of the decomposed syllables
+window.jamoCompat = Object.fromEntries([
+    ...Array.from('ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ', (c, i) => [c, String.fromCharCode(0x1100 + i)]),
+    ...Array.from({length: 21}, (_, i) => [String.fromCharCode(0x314F + i), String.fromCharCode(0x1161 + i)])
+]);
+// final consonants to initial consonants of the same sound
+window.jamoFinal = Object.fromEntries([
+    [0x11A8, 0x1100], [0x11A9, 0x1101], [0x11AB, 0x1102], [0x11AE, 0x1103], [0x11AF, 0x1105],
+    [0x11B7, 0x1106], [0x11B8, 0x1107], [0x11BA, 0x1109], [0x11BB, 0x110A], [0x11BC, 0x110B],
+    [0x11BD, 0x110C], [0x11BE, 0x110E], [0x11BF, 0x110F], [0x11C0, 0x1110], [0x11C1, 0x1111],
+    [0x11C2, 0x1112]
+].map(([a, b]) => [String.fromCharCode(a), String.fromCharCode(b)]));
+
+
+window.normalizeName = function(text) {
+    // Same as normalize_name of data_utils: lowercase with hangul decomposed into jamo
+    return Array.from(text.toLowerCase().normalize('NFD'), c => jamoCompat[c] || c).join('');
+};
+
+
+window.getSearch = function() {
+    // Normalize the names of dataSearch once
+    if (!window._dataSearch) {
+        window._dataSearch = {...dataSearch, texts: dataSearch.names.map(normalizeName)};
+    }
+    return window._dataSearch;
+};
+
+
+window.intersectSorted = function(a, b) {
+    let result = [];
+    for (let i = 0, j = 0; i < a.length && j < b.length;) {
+        if (a[i] < b[j]) i++;
+        else if (a[i] > b[j]) j++;
+        else { result.push(a[i]); i++; j++; }
+    }
     return result;
 };
 
 
-window.selectTickers = function(option, tickers, data_rank, num = 10) {
-    // Filter tickers that exist in data_rank
-    let validTickers = tickers.filter(ticker => data_rank.hasOwnProperty(ticker));
-    
-    if (option === "Top") {
-        return validTickers
-            .sort((a, b) => data_rank[a] - data_rank[b]) // Ascending order (lower rank is better)
-            .slice(0, num);
+window.findCandidates = function(parts) {
+    // Return ids of names containing every n-gram of parts by the inverted index
+    const search = getSearch();
+    let ids = null;
+    for (const part of parts) {
+        for (let k = 0; k + search.n <= part.length; k++) {
+            const postings = search.grams[part.slice(k, k + search.n)];
+            if (!postings) return [];
+            ids = ids === null ? postings : intersectSorted(ids, postings);
+            if (ids.length === 0) return [];
+        }
+    }
+    return ids === null ? search.names.map((_, i) => i) : ids;
+};
+
+
+window.searchNames = function(pattern) {
+    // Return names matching pattern with * for any characters, ranked by the match
+    // at the start, at the start of a word or elsewhere, then by position and length
+    const search = getSearch();
+    const query = normalizeName(pattern);
+    // the last consonant being typed may be the initial of the next syllable
+    let queries = [query];
+    const last = query.slice(-1);
+    if (jamoFinal[last]) queries.push(query.slice(0, -1) + jamoFinal[last]);
+
+    let scores = new Map();
+    for (const q of queries) {
+        const parts = q.split('*').filter(part => part.length > 0);
+        for (const i of findCandidates(parts)) {
+            const text = search.texts[i];
+            // parts in order
+            let pos = 0, first = 0;
+            for (let k = 0; k < parts.length && pos !== -1; k++) {
+                pos = text.indexOf(parts[k], pos);
+                if (k === 0) first = pos;
+                if (pos !== -1) pos += parts[k].length;
+            }
+            if (pos === -1) continue;
+            const where = first === 0 ? 0 : /[^\p{L}\p{N}]/u.test(text[first - 1]) ? 1 : 2;
+            const score = [where, first, text.length];
+            const prev = scores.get(i);
+            if (!prev || compareScores(score, prev) < 0) scores.set(i, score);
+        }
+    }
+    return [...scores.entries()]
+        .sort((a, b) => compareScores(a[1], b[1]) || a[0] - b[0])
+        .map(([i, _]) => search.names[i]);
+};
+
+
+window.compareScores = function(a, b) {
+    for (let k = 0; k < a.length; k++) {
+        if (a[k] !== b[k]) return a[k] - b[k];
     }
-    
-    if (option === "Bottom") {
-        return validTickers
-            .sort((a, b) => data_rank[b] - data_rank[a]) // Descending order (higher rank is worse)
-            .slice(0, num);
+    return 0;
+};
+
+
+window.lttb = function(y, threshold) {
+    // Return indices of y to keep by largest-triangle-three-buckets downsampling
+    // of the valid points into threshold points
+    const idx = [];
+    for (let k = 0; k < y.length; k++) {
+        if (y[k] !== null && !Number.isNaN(y[k])) idx.push(k);
     }
-    
-    if (option === "Random") {
-        return validTickers
-            .sort(() => Math.random() - 0.5) // Shuffle tickers randomly
-            .slice(0, num);
+    if (threshold >= idx.length || threshold < 3) return idx;
+    let result = [idx[0]];
+    const size = (idx.length - 2) / (threshold - 2);
+    let a = 0;
+    for (let b = 0; b < threshold - 2; b++) {
+        // average of the next bucket
+        const start = Math.floor((b + 1) * size) + 1;
+        const end = Math.min(Math.floor((b + 2) * size) + 1, idx.length);
+        let avgX = 0, avgY = 0;
+        for (let k = start; k < end; k++) {
+            avgX += idx[k];
+            avgY += y[idx[k]];
+        }
+        avgX /= end - start;
+        avgY /= end - start;
+        // point of the current bucket with the largest triangle
+        let maxArea = -1, next = a;
+        for (let k = Math.floor(b * size) + 1; k < start; k++) {
+            const area = Math.abs((idx[a] - avgX) * (y[idx[k]] - y[idx[a]]) - 
+                                  (idx[a] - idx[k]) * (avgY - y[idx[a]]));
+            if (area > maxArea) {
+                maxArea = area;
+                next = k;
+            }
+        }
+        result.push(idx[next]);
+        a = next;
     }
-    
-    //return []; // Return empty array if option is invalid
-    return tickers // return all tickers without filtering
-}
+    result.push(idx[idx.length - 1]);
+    return result;
+};
+
+
+window.quickSelect = function(arr, k, n) {
+    // Partially order arr[0:n] in place so that arr[k] is the k-th smallest and return it
+    let lo = 0, hi = n - 1;
+    while (lo < hi) {
+        const pivot = arr[(lo + hi) >> 1];
+        let i = lo, j = hi;
+        while (i <= j) {
+            while (arr[i] < pivot) i++;
+            while (arr[j] > pivot) j--;
+            if (i <= j) {
+                const t = arr[i]; arr[i] = arr[j]; arr[j] = t;
+                i++; j--;
+            }
+        }
+        if (k <= j) hi = j;
+        else if (k >= i) lo = i;
+        else break;
+    }
+    return arr[k];
+};
+
+
+window.getBand = function(series, starts, nDates) {
+    // Return min, median and max at each date of series starting at the date index
+    // of starts, with null at the dates without values
+    const n = series.length;
+    let mat = new Float64Array(nDates * n);
+    let counts = new Int32Array(nDates);
+    series.forEach((values, r) => {
+        for (let k = 0; k < values.length; k++) {
+            const v = values[k];
+            const j = starts[r] + k;
+            if (v !== null && !Number.isNaN(v)) mat[j * n + counts[j]++] = v;
+        }
+    });
+    let band = {min: [], median: [], max: []};
+    for (let j = 0; j < nDates; j++) {
+        const m = counts[j];
+        if (m === 0) {
+            band.min.push(null);
+            band.median.push(null);
+            band.max.push(null);
+            continue;
+        }
+        const col = mat.subarray(j * n, j * n + m);
+        let min = col[0], max = col[0];
+        for (let k = 1; k < m; k++) {
+            if (col[k] < min) min = col[k];
+            if (col[k] > max) max = col[k];
+        }
+        // median by selection instead of sorting
+        const k = (m - 1) >> 1;
+        let median = quickSelect(col, k, m);
+        if (m % 2 === 0) {
+            let upper = Infinity;
+            for (let i = k + 1; i < m; i++) if (col[i] < upper) upper = col[i];
+            median = (median + upper) / 2;
+        }
+        band.min.push(min);
+        band.median.push(median);
+        band.max.push(max);
+    }
+    return band;
+};
+
+
+window.getRestBand = function(index, fee, compare, basePrc = 1000) {
+    // Return band of min, median and max of the prices of the tickers not in index
+    // with the number of them. with compare, the prices are relative to the price at
+    // the common start of the tickers in index as normalizePrice
+    const prc = getPrice();
+    const selected = new Set(index);
+    const startIndex = compare ? findCommonStart({index: index, start: index.map(i => prc.start[i])}) : -1;
+    let series = [], starts = [];
+    for (let i = 0; i < prc.tickers.length; i++) {
+        if (selected.has(i)) continue;
+        let values = prc.values[fee].subarray(prc.offset[i], prc.offset[i + 1]);
+        let start = prc.start[i];
+        if (startIndex !== -1) {
+            const base = values[startIndex - start];
+            if (!(startIndex >= start && base > 0)) continue; // no price at the start
+            values = Float64Array.from(values.subarray(startIndex - start), v => v / base * basePrc);
+            start = startIndex;
+        }
+        series.push(values);
+        starts.push(start);
+    }
+    return {count: series.length, ...getBand(series, starts, prc.dates.length)};
+};
+
+
+window.getXRange = function(relayout) {
+    // Return range of x axis zoomed by the user from relayoutData, null if autoscaled
+    // and undefined if relayoutData does not change the x axis
+    if (!relayout || relayout['xaxis.autorange']) return null;
+    if (relayout['xaxis.range']) return relayout['xaxis.range'];
+    if (relayout['xaxis.range[0]']) return [relayout['xaxis.range[0]'], relayout['xaxis.range[1]']];
+    return undefined;
+};
+
+
+window.countDates = function(dates, range) {
+    // Return number of dates in range of getXRange, all dates if not zoomed
+    if (!range) return dates.length;
+    let n = 0;
+    for (const d of dates) if (d >= range[0] && d <= range[1]) n++;
+    return n;
+};
 
 
 window.updateLayout = function(layout, x = 0, y = -0.5, width = 768) {
@@ -126,4 +828,125 @@ window.updateLayout = function(layout, x = 0, y = -0.5, width = 768) {
         };
     }
     return layout;
-}
\ No newline at end of file
+}
+
+
+window.filterScatter = function(tickers) {
+    // Return the columns of dataScatter for tickers
+    const result = {};
+    for (const key in dataScatter) {
+        result[key] = {};
+        for (const ticker of tickers) {
+            if (dataScatter[key][ticker] !== undefined) {
+                result[key][ticker] = dataScatter[key][ticker];
+            }
+        }
+    }
+    return result;
+};
+
+
+window.computeTasks = {
+    // Heavy computations run in the worker with the data they require.
+    // run on the main thread instead if the worker is not available
+    slicePrice: async (tickers) => {
+        await loadData('dataPrice');
+        return slicePrice(tickers);
+    },
+    normalizePrice: async (data, basePrc) => {
+        await loadData('dataPrice');
+        return normalizePrice(data, basePrc);
+    },
+    getRestBand: async (index, fee, compare) => {
+        await loadData('dataPrice');
+        return getRestBand(index, fee, compare);
+    },
+    getCAGR: async (data, compare) => {
+        await loadData('dataPrice');
+        return getCAGR(data, compare);
+    },
+    backtestPrice: async (data, rebalance) => {
+        await loadData('dataPrice');
+        return backtestPrice(data, rebalance);
+    },
+    filterScatter: async (tickers) => {
+        await loadData('dataScatter');
+        return filterScatter(tickers);
+    }
+};
+
+
+window.getWorker = function() {
+    // Start the compute worker once. return null if not supported
+    if (window._worker === undefined) {
+        window._worker = null;
+        window._computeCalls = {};
+        if (window.Worker && window._utilsUrl) {
+            try {
+                const worker = new Worker(window._utilsUrl);
+                worker.onmessage = ({data}) => {
+                    const call = _computeCalls[data.id];
+                    delete _computeCalls[data.id];
+                    if (data.error) call.reject(new Error(data.error));
+                    else call.resolve(data.result);
+                };
+                worker.onerror = (event) => {
+                    // run the pending and later tasks on the main thread if the worker fails
+                    console.error(event.message);
+                    window._worker = null;
+                    for (const call of Object.values(_computeCalls)) {
+                        computeTasks[call.task](...call.args).then(call.resolve, call.reject);
+                    }
+                    window._computeCalls = {};
+                };
+                worker.postMessage({dataAssets: dataAssets});
+                window._worker = worker;
+            } catch (error) {
+                console.error(error);
+            }
+        }
+    }
+    return window._worker;
+};
+
+
+window.compute = function(task, ...args) {
+    // Run task of computeTasks in the worker and return a promise of the result
+    const worker = getWorker();
+    if (!worker) return computeTasks[task](...args);
+    return new Promise((resolve, reject) => {
+        const id = window._computeId = (window._computeId || 0) + 1;
+        _computeCalls[id] = {task: task, args: args, resolve: resolve, reject: reject};
+        worker.postMessage({id: id, task: task, args: args});
+    });
+};
+
+
+window.getTransfer = function(result) {
+    // Return buffers of the series in result owned by the typed arrays only,
+    // which are moved to the page without copying
+    const values = Object.values(result && result.values || {}).flat();
+    return values.filter(v => ArrayBuffer.isView(v) && v.byteLength === v.buffer.byteLength)
+                 .map(v => v.buffer);
+};
+
+
+if (typeof WorkerGlobalScope !== 'undefined' && self instanceof WorkerGlobalScope) {
+    // Compute worker: data is loaded on demand with the urls of the page
+    self.onmessage = async ({data}) => {
+        if (data.dataAssets) {
+            window.dataAssets = data.dataAssets;
+            return;
+        }
+        try {
+            const result = await computeTasks[data.task](...data.args);
+            self.postMessage({id: data.id, result: result}, getTransfer(result));
+        } catch (error) {
+            self.postMessage({id: data.id, error: String(error)});
+        }
+    };
+} else if (window.dataAssets) {
+    // Fetch ticker index and name data at startup
+    loadData('dataIndex').catch(console.error);
+    loadData('dataName').catch(console.error);
+}
@@ -0,0 +1,153 @@
+"""
+backtest of weighted portfolios of funds over the ticker x date matrix of monthly prices,
+ vectorized over a batch of weightings so that thousands of candidates run at once
+ rebalancing: the weights are reset at the end of each month, quarter or year.
+              dates are irregular (months may be skipped), so a period of rebalancing
+              covers the returns of which later dates are in the same period
+ inception: funds without price at a rebalancing are out of the portfolio until
+            the next one and their weights go to the others in proportion.
+            funds of which prices end within a period are held as cash
+ a portfolio starts at the first rebalancing with any fund of positive weight
+
+usage: python backtest_utils.py funds_monthly_<dt>.csv ticker[,ticker...] [rebalance] [samples]
+"""
+import sys
+import numpy as np
+import pandas as pd
+from roll_utils import interpolate
+
+rebalances = {'monthly': 1, 'quarterly': 3, 'annual': 12}
+base_prc = 1000
+
+
+def get_return_matrix(mat):
+    """
+    return ticker x date array of simple returns from the previous date with
+     missing prices inside the history of each ticker interpolated geometrically,
+     NaN before the first and after the last price
+    mat: ticker x date array of prices
+    """
+    log_prc = interpolate(mat)
+    ret = np.full(mat.shape, np.nan)
+    ret[:, 1:] = np.expm1(np.diff(log_prc, axis=1))
+    return ret
+
+
+def get_periods(dates, rebalance='quarterly'):
+    """
+    return start columns of periods of rebalancing of the dates, the first dates
+     of calendar months, quarters or years after the first date, so that the periods
+     do not depend on where the dates start
+    """
+    if rebalance not in rebalances:
+        raise ValueError(f'Invalid rebalance: {rebalance}')
+    dates = pd.DatetimeIndex(dates)
+    period = np.asarray(dates.year * 12 + dates.month - 1) // rebalances[rebalance]
+    return np.flatnonzero(np.diff(period) != 0) + 1
+
+
+def backtest(ret, weights, starts):
+    """
+    return batch x date array of portfolio values starting from 1, NaN before the start
+    ret: ticker x date array of returns of get_return_matrix
+    weights: batch x ticker array of target weights, or 1d array for a single portfolio
+    starts: start columns of periods of get_periods
+    """
+    weights = np.atleast_2d(np.asarray(weights, dtype=float))
+    n_batch, n_dates = len(weights), ret.shape[1]
+    equity = np.full((n_batch, n_dates), np.nan)
+    value = np.ones(n_batch)
+    started = np.zeros(n_batch, dtype=bool)
+    bounds = list(starts) + [n_dates]
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        # funds with returns at the start of the period are bought at the date before
+        w = weights * ~np.isnan(ret[:, a])
+        total = w.sum(axis=1)
+        held = total > 0
+        first = held & ~started
+        equity[first, a - 1] = 1
+        started |= held
+        w = np.divide(w, total[:, None], out=np.zeros_like(w), where=held[:, None])
+        # growth of each fund since the start of the period, flat after its last price
+        growth = np.cumprod(1 + np.nan_to_num(ret[:, a:b]), axis=1)
+        path = np.where(held[:, None], w @ growth, 1) * value[:, None]
+        equity[:, a:b] = np.where(started[:, None], path, np.nan)
+        value = np.where(started, path[:, -1], value)
+    return equity
+
+
+def get_drawdown(equity):
+    """
+    return drawdown (%) from the peak of each row of equity
+    """
+    with np.errstate(invalid='ignore'):
+        return (equity / np.fmax.accumulate(equity, axis=1) - 1) * 100
+
+
+def get_cagr(equity, dates):
+    """
+    return CAGR (%) from the start to the end of each row of equity,
+     NaN if shorter than a month
+    """
+    valid = ~np.isnan(equity)
+    first = valid.argmax(axis=1)
+    last = equity.shape[1] - 1 - valid[:, ::-1].argmax(axis=1)
+    dates = pd.DatetimeIndex(dates)
+    months = np.asarray(dates.year * 12 + dates.month)
+    months = months[last] - months[first]
+    rows = np.arange(len(equity))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cagr = (equity[rows, last] / equity[rows, first]) ** (12 / months) - 1
+    return np.where(valid.any(axis=1) & (months > 0), cagr * 100, np.nan)
+
+
+def get_random_weights(n_tickers, samples, seed=0):
+    """
+    return samples x n_tickers array of weights drawn uniformly from the simplex
+    """
+    rng = np.random.default_rng(seed)
+    return rng.dirichlet(np.ones(n_tickers), samples) if n_tickers > 0 else np.empty((samples, 0))
+
+
+def run(mat, dates, weights=None, rebalance='quarterly'):
+    """
+    return dict of the backtest of weights on prices mat
+     equity: batch x date array of portfolio values starting from base_prc
+     drawdown: batch x date array of drawdown (%)
+     cagr, mdd: CAGR (%) and max drawdown (%) of each portfolio
+    mat: ticker x date array of prices
+    weights: batch x ticker array or 1d array of weights, equal weights if None
+    """
+    if weights is None:
+        weights = np.ones(len(mat))
+    ret = get_return_matrix(mat)
+    equity = backtest(ret, weights, get_periods(dates, rebalance))
+    drawdown = get_drawdown(equity)
+    mdd = np.where(np.isnan(equity).all(axis=1), np.nan, np.nan_to_num(drawdown).min(axis=1))
+    return {
+        'equity': equity * base_prc,
+        'drawdown': drawdown,
+        'cagr': get_cagr(equity, dates),
+        'mdd': mdd
+    }
+
+
+if __name__ == '__main__':
+    file_prc, tickers = sys.argv[1], sys.argv[2].split(',')
+    rebalance = sys.argv[3] if len(sys.argv) > 3 else 'quarterly'
+    samples = int(sys.argv[4]) if len(sys.argv) > 4 else 0
+    df_prc = pd.read_csv(file_prc, parse_dates=['date'], dtype={'ticker': str},
+                         index_col=['ticker', 'date'])
+    for col in df_prc.columns:
+        df = df_prc[col].unstack('ticker').sort_index().dropna(how='all')
+        df = df.reindex(columns=[x for x in tickers if x in df.columns])
+        mat = df.to_numpy().T
+        res = run(mat, df.index, rebalance=rebalance)
+        print(f"{col}: equal weights of {mat.shape[0]} funds rebalanced {rebalance}, "
+              f"CAGR {res['cagr'][0]:.2f}%, MDD {res['mdd'][0]:.2f}%")
+        if samples > 0:
+            res = run(mat, df.index, get_random_weights(len(mat), samples), rebalance)
+            ratio = res['cagr'] / -np.where(res['mdd'] < 0, res['mdd'], np.nan)
+            i = int(np.nanargmax(ratio)) if np.isfinite(ratio).any() else 0
+            print(f"  best CAGR/MDD of {samples} random weights: CAGR {res['cagr'][i]:.2f}%, "
+                  f"MDD {res['mdd'][i]:.2f}%")
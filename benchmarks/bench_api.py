@@ -0,0 +1,58 @@
+"""
+request every example in the docstring of api_utils on the real snapshot and
+ time the response rendered, cached in LRU and revalidated by ETag and Last-Modified.
+ fails if any example does not return 200 or is not revalidated with 304
+
+usage: python benchmarks/bench_api.py
+"""
+import os
+import sys
+import time
+
+from flask import Flask
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, path)
+from data_utils import load_data, preprocess_data
+import api_utils
+
+dt = '250331'
+
+
+def get_examples():
+    """
+    return urls of the examples in the docstring of api_utils
+    """
+    return [x.strip() for x in api_utils.__doc__.splitlines() if x.strip().startswith('/api/')]
+
+
+def main():
+    sys.argv = sys.argv[:1] # no args for app
+    from app import cols_prc
+    files = [f'{path}/{x}' for x in (f'funds_monthly_{dt}.csv', 'funds_categories.csv',
+                                     f'funds_bayesian_ret3y_{dt}.csv')]
+    data = preprocess_data(*load_data(*files, cols_prc=cols_prc))
+    server = Flask(__name__)
+    server.register_blueprint(api_utils.create_api(data, snapshot=dt))
+    client = server.test_client()
+
+    failed = []
+    print(f"{'status':>6} {'render':>8} {'cached':>8} {'bytes':>8}  url (msec)")
+    for url in get_examples():
+        times = []
+        for _ in range(2):
+            t0 = time.perf_counter()
+            response = client.get(url)
+            times.append((time.perf_counter() - t0) * 1000)
+        revalidated = [client.get(url, headers={k: response.headers.get(v, '')}).status_code
+                       for k, v in (('If-None-Match', 'ETag'), ('If-Modified-Since', 'Last-Modified'))]
+        if response.status_code != 200 or revalidated != [304, 304]:
+            failed.append((url, response.status_code, revalidated, response.get_data(as_text=True)[:100]))
+        print(f'{response.status_code:>6} {times[0]:>8.1f} {times[1]:>8.1f} {len(response.data):>8}  {url}')
+    for x in failed:
+        print('FAILED', *x)
+    assert not failed, f'{len(failed)} of {len(get_examples())} examples failed'
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
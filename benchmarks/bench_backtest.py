@@ -0,0 +1,174 @@
+"""
+check the batched backtest of backtest_utils against a reference loop over the dates
+ of each portfolio on random portfolios of the real snapshot and time both, and
+ generate a page which checks backtestPrice of assets/utils.js against the backtest
+ handler of the API on random selections
+
+usage: python benchmarks/bench_backtest.py [n_portfolios] [n_cases]
+ and open benchmarks/bench_backtest.html in a browser
+"""
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from werkzeug.datastructures import MultiDict
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, path)
+from data_utils import load_data, preprocess_data
+from api_utils import create_api
+import backtest_utils
+
+dt = '250331'
+batch = 5 # portfolios of the same tickers run at once
+file_html = os.path.join(os.path.dirname(__file__), 'bench_backtest.html')
+
+template = """<!DOCTYPE html>
+<html>
+<head><meta charset="UTF-8"><title>parity of backtestPrice and the API</title></head>
+<body>
+<pre id="result">running...</pre>
+<script>
+var dataTitle = {};
+var renderServer = false;
+var dataPrice = %(price)s;
+</script>
+<script>%(utils)s</script>
+<script>
+const cases = %(cases)s;
+const tol = 0.01; // results of the API are rounded to 2 decimals
+
+function run() {
+    let lines = [['case', 'rebalance', 'tickers', 'dates', 'max diff'].join('\\t')];
+    let bad = 0;
+    cases.forEach(([tickers, rebalance, expected], k) => {
+        const res = backtestPrice(slicePrice(tickers), rebalance);
+        let diff = res.dates.length === expected.dates.length
+            && res.dates.every((x, j) => x === expected.dates[j]) ? 0 : Infinity;
+        const near = (a, b) => {
+            // difference of values with NaN of the client and null of the API
+            const na = a === null || Number.isNaN(a);
+            if (na || b === null) return na && b === null ? 0 : Infinity;
+            return Math.abs(a - b);
+        };
+        for (const fee in expected.equity) {
+            for (const key of ['cagr', 'mdd']) {
+                diff = Math.max(diff, near(res[key][fee], expected[key][fee]));
+            }
+            for (const [a, b] of [[res.values[fee], expected.equity[fee]],
+                                  [res.drawdown[fee], expected.drawdown[fee]]]) {
+                if (!a || a.length !== b.length) {
+                    diff = Infinity;
+                    continue;
+                }
+                a.forEach((x, j) => { diff = Math.max(diff, near(x, b[j])); });
+            }
+        }
+        if (!(diff <= tol)) bad++;
+        lines.push([k, rebalance, tickers.length, res.dates.length, diff.toFixed(4)].join('\\t'));
+    });
+    lines.push(`${bad} mismatches of ${cases.length} cases`);
+    document.getElementById('result').textContent = lines.join('\\n');
+    console.log(lines.slice(-1)[0]);
+}
+run();
+</script>
+</body>
+</html>
+"""
+
+
+def reference(mat, dates, weights, rebalance):
+    """
+    return portfolio values of weights on prices mat by holdings of each fund
+     updated date by date, the definition which backtest_utils.backtest batches
+    """
+    ret = backtest_utils.get_return_matrix(mat)
+    n, n_dates = mat.shape
+    period = [(x.year * 12 + x.month - 1) // backtest_utils.rebalances[rebalance] for x in dates]
+    equity = np.full(n_dates, np.nan)
+    value, holdings, cash = None, dict(), 0
+    for j in range(1, n_dates):
+        if period[j] != period[j - 1]:
+            held = [i for i in range(n) if not np.isnan(ret[i, j]) and weights[i] > 0]
+            if value is None and held:
+                value = 1.0
+                equity[j - 1] = 1
+            if value is not None:
+                total = sum(weights[i] for i in held)
+                holdings = {i: value * weights[i] / total for i in held}
+                cash = 0 if held else value
+        if value is None:
+            continue
+        for i in holdings:
+            holdings[i] *= 1 + (0 if np.isnan(ret[i, j]) else ret[i, j])
+        value = sum(holdings.values()) + cash
+        equity[j] = value
+    return equity
+
+
+def check_batched(df_prc, n=150, seed=0):
+    """
+    return max relative difference of the batched backtest from the reference loop
+     on n random portfolios and seconds of both
+    """
+    df = df_prc.iloc[:, 0].unstack('ticker').sort_index().dropna(how='all')
+    dates = df.index
+    rng = np.random.default_rng(seed)
+    diff, t_batch, t_ref = 0, 0, 0
+    for k in range(0, n, batch):
+        tickers = rng.choice(df.columns, rng.integers(1, 9), replace=False)
+        mat = df[tickers].to_numpy().T
+        rebalance = rng.choice(list(backtest_utils.rebalances))
+        weights = backtest_utils.get_random_weights(len(tickers), batch, k)
+        weights[0, 0] = 0 # a fund out of the portfolio
+        t0 = time.perf_counter()
+        equity = backtest_utils.backtest(backtest_utils.get_return_matrix(mat), weights,
+                                         backtest_utils.get_periods(dates, rebalance))
+        t1 = time.perf_counter()
+        for w, e in zip(weights, equity):
+            r = reference(mat, dates, w, rebalance)
+            assert np.array_equal(np.isnan(r), np.isnan(e))
+            diff = max(diff, np.nanmax(np.abs(e / r - 1), initial=0))
+        t_batch, t_ref = t_batch + t1 - t0, t_ref + time.perf_counter() - t1
+    return diff, t_batch, t_ref
+
+
+def main(n=150, n_cases=40):
+    sys.argv = sys.argv[:1] # no args for app
+    from app import cols_prc
+    files = [f'{path}/{x}' for x in (f'funds_monthly_{dt}.csv', 'funds_categories.csv',
+                                     f'funds_bayesian_ret3y_{dt}.csv')]
+    dfs = load_data(*files, cols_prc=cols_prc)
+    diff, t_batch, t_ref = check_batched(dfs[0], int(n))
+    print(f'{n} portfolios: max relative difference {diff:.1e} from the reference loop, '
+          f'batched {t_batch * 1000:.1f} msec, reference {t_ref * 1000:.1f} msec')
+    assert diff < 1e-10
+
+    data = preprocess_data(*dfs)
+    handler = create_api(data).handlers['backtest']
+    rng = np.random.default_rng(0)
+    tickers = np.array(data['price']['tickers'])
+    cases = []
+    for k in range(int(n_cases)):
+        tkrs = rng.choice(tickers, rng.integers(1, 11), replace=False).tolist()
+        rebalance = str(rng.choice(list(backtest_utils.rebalances)))
+        args = {'tickers': ','.join(tkrs), 'rebalance': rebalance}
+        cases.append([tkrs, rebalance, handler(MultiDict(args))])
+
+    with open(f'{path}/assets/utils.js', encoding='utf-8') as f:
+        utils = f.read()
+    html = template % dict(
+        price=json.dumps(data['price'], ensure_ascii=False),
+        utils=utils,
+        cases=json.dumps(cases, ensure_ascii=False)
+    )
+    with open(file_html, 'w', encoding='utf-8') as f:
+        f.write(html)
+    print(f'{file_html} saved')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
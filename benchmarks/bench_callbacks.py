@@ -0,0 +1,180 @@
+"""
+generate an in-browser benchmark page which times the clientside callbacks 
+ of app.py with 'All' selected at the current size and at n times the size.
+ the price plot is timed for 10, 30 and all tickers selected and a zoom with the
+ points of the figure, and drawn by plotly.js if loaded from the CDN
+
+usage: python benchmarks/bench_callbacks.py [n] 
+ and open benchmarks/bench_callbacks.html in a browser
+"""
+import json
+import os
+import sys
+
+import pandas as pd
+from plotly.offline import get_plotlyjs_version
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, path)
+from data_utils import load_data, preprocess_data
+
+file_html = os.path.join(os.path.dirname(__file__), 'bench_callbacks.html')
+
+# callbacks to time: output of callback and arguments in javascript
+cases = [
+    ('ticker-data.data', '#Top10', "[['All', '#Top10'], 'mean', 'asset', [], []]"),
+    ('ticker-data.data', '#Bottom10', "[['All', '#Bottom10'], 'mean', 'asset', [], []]"),
+    ('ticker-data.data', '#Random10@7', "[['All', '#Random10@7'], 'mean', 'asset', [], []]"),
+    ('ticker-data.data', '#Top10 sortino', "[['All', '#Top10'], 'sortino', 'asset', [], []]"),
+    ('ticker-data.data', '#Bottom10 mdd', "[['All', '#Bottom10'], 'mdd', 'asset', [], []]"),
+    ('ticker-data.data', 'nPrevious', "[['All', 'nPrevious'], 'mean', 'asset', tickers.filter((_, i) => i % 2), []]"),
+    ('ticker-textarea.value', 'All', '[tickers]'),
+    ('price-data.data', '10', '[tickers.slice(0, 10)]'),
+    ('price-plot.figure', '10', '[outputs["price-data.data"], false, false]'),
+    ('price-data.data', '30', '[tickers.slice(0, 30)]'),
+    ('price-plot.figure', '30', '[outputs["price-data.data"], false, false]'),
+    ('price-data.data', 'All', '[tickers]'),
+    ('price-plot.figure', 'All', '[outputs["price-data.data"], false, false]'),
+    ('price-plot.figure', 'All compare', '[outputs["price-data.data"], false, true]'),
+    ('price-plot.figure', 'All zoom', '[outputs["price-data.data"], false, false, zoom(i)]', 'price-plot.relayoutData'),
+    ('price-plot.figure', 'All same zoom', '[outputs["price-data.data"], false, false, zoom(0)]', 'price-plot.relayoutData'),
+    ('cagr-plot.figure', 'All', '[outputs["price-data.data"], false]'),
+    ('cagr-plot.figure', 'All compare', '[outputs["price-data.data"], true]'),
+    ('backtest-data.data', 'All', '[outputs["price-data.data"], "quarterly", "tab_backtest"]'),
+    ('backtest-plot.figure', 'All', '[outputs["backtest-data.data"], false, "quarterly"]'),
+    ('scatter-data.data', 'All', "[tickers, 'tab_scatter']"),
+    ('scatter-plot.figure', 'All', "[outputs['scatter-data.data'], 'asset']"),
+]
+
+template = """<!DOCTYPE html>
+<html>
+<head><meta charset="UTF-8"><title>benchmark of clientside callbacks</title></head>
+<body>
+<pre id="result">running...</pre>
+<div id="plot"></div>
+<script src="https://cdn.plot.ly/plotly-%(plotly)s.min.js"></script>
+<script>
+var dataTitle = {};
+var renderServer = false;
+window.dash_clientside = {no_update: {}};
+</script>
+<script>%(utils)s</script>
+<script>%(callbacks)s</script>
+<script>
+const sizes = %(sizes)s;
+const funcs = %(funcs)s;
+const cases = %(cases)s;
+const repeat = 5;
+// relayoutData of the i-th zoom, a different range for each repetition
+const zoom = i => ({'xaxis.range[0]': `2020-01-0${i + 1}`, 'xaxis.range[1]': '2024-12-31'});
+
+function countPoints(figure) {
+    // Return number of points of the traces of figure, empty if not a figure
+    if (!figure || !figure.data) return '';
+    return figure.data.reduce((n, trace) => n + (trace.x ? trace.x.length : 0), 0);
+}
+
+async function draw(figure) {
+    // Return msec of plotly.js drawing figure, empty if not loaded or not a figure
+    if (!window.Plotly || !figure || !figure.data || !document.getElementById('plot')) return '';
+    let times = [];
+    for (let i = 0; i < repeat; i++) {
+        await Plotly.purge('plot');
+        const t0 = performance.now();
+        await Plotly.react('plot', figure.data, figure.layout);
+        times.push(performance.now() - t0);
+    }
+    return Math.min(...times).toFixed(2);
+}
+
+function setData(data) {
+    // replace the data loaded by loadData
+    window._loadData = {};
+    window._dataPrice = undefined;
+    window._dataIndex = undefined;
+    window._dataSearch = undefined;
+    window._dataRanking = undefined;
+    for (const [name, value] of Object.entries(data)) {
+        window[name] = value;
+        window._loadData[name] = Promise.resolve(value);
+    }
+}
+
+async function run() {
+    const ns = window.dash_clientside._dashprivate_clientside_funcs;
+    let lines = [['size', 'callback', 'case', 'msec', 'points', 'draw msec'].join('\\t')];
+    for (const [size, data] of Object.entries(sizes)) {
+        setData(data);
+        const tickers = Object.keys(dataName);
+        let outputs = {};
+        for (const [output, label, args, trigger] of cases) {
+            const func = ns[funcs[output]];
+            // input triggering the callback, the first call otherwise
+            window.dash_clientside.callback_context = {triggered: trigger ? [{prop_id: trigger}] : []};
+            let times = [];
+            let result;
+            for (let i = 0; i < repeat; i++) {
+                const argv = eval(args);
+                const t0 = performance.now();
+                result = await func(...argv);
+                times.push(performance.now() - t0);
+            }
+            if (result !== window.dash_clientside.no_update) outputs[output] = result;
+            const t = Math.min(...times).toFixed(2);
+            const points = result === window.dash_clientside.no_update ? 'no update' : countPoints(result);
+            lines.push([`${size} (${tickers.length})`, output, label, t, points, await draw(result)].join('\\t'));
+            document.getElementById('result').textContent = lines.join('\\n');
+        }
+    }
+    console.log(lines.join('\\n'));
+}
+run();
+</script>
+</body>
+</html>
+"""
+
+
+def scale_data(dfs, n):
+    """
+    return copies of price, category and estimation data with tickers repeated n times
+    """
+    df_prc, df_cat, df_est = dfs
+    suffix = lambda k: (lambda x: x if k == 0 else f'{x}_{k}')
+    df_prc = pd.concat([df_prc.rename(index=suffix(k), level='ticker') for k in range(n)])
+    df_cat = pd.concat([df_cat.rename(index=suffix(k)).assign(name=df_cat['name'].map(suffix(k)).values) 
+                        for k in range(n)])
+    df_est = pd.concat([df_est.rename(index=suffix(k)) for k in range(n)])
+    return df_prc, df_cat, df_est
+
+
+def main(n=10, dt='250331'):
+    sys.argv = sys.argv[:1] # no args for app
+    from app import app, cols_prc
+    files = [f'{path}/{x}' for x in (f'funds_monthly_{dt}.csv', 'funds_categories.csv', 
+                                     f'funds_bayesian_ret3y_{dt}.csv')]
+    dfs = load_data(*files, cols_prc=cols_prc)
+    sizes = dict()
+    for k in (1, int(n)):
+        data = preprocess_data(*scale_data(dfs, k))
+        sizes[f'x{k}'] = {f'data{x.capitalize()}': v for x, v in data.items()}
+
+    with open(f'{path}/assets/utils.js', encoding='utf-8') as f:
+        utils = f.read()
+    funcs = {cb['output']: cb['clientside_function']['function_name'] for cb in app._callback_list
+             if cb.get('clientside_function')}
+    html = template % dict(
+        plotly=get_plotlyjs_version(),
+        utils=utils,
+        callbacks='\n'.join(app._inline_scripts),
+        sizes=json.dumps(sizes, ensure_ascii=False),
+        funcs=json.dumps(funcs),
+        cases=json.dumps(cases)
+    )
+    with open(file_html, 'w', encoding='utf-8') as f:
+        f.write(html)
+    print(f'{file_html} saved')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,76 @@
+"""
+measure fee-adjusted monthly prices from synthetic daily prices:
+ vectorized in one pass or in chunks of tickers vs a loop over tickers
+
+usage: python benchmarks/bench_fee.py [n_tickers] [chunksize]
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, path)
+from fee_utils import get_monthly_prices, resample_monthly
+
+
+def make_daily(n_tickers, n_years=10, seed=0):
+    """
+    return synthetic daily prices of n_tickers with random inception dates and their annual fees
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end='2025-03-31', periods=n_years * 261, name='date')
+    tickers = [f'KR{i:010d}' for i in range(n_tickers)]
+    prc = 1000 * np.exp(np.cumsum(rng.normal(0.0002, 0.01, (len(dates), n_tickers)), axis=0))
+    start = rng.integers(0, len(dates) - 30, n_tickers)
+    prc[np.arange(len(dates))[:, None] < start] = np.nan
+    df_prices = pd.DataFrame(prc, index=dates, columns=tickers)
+    fee = pd.Series(rng.uniform(0.1, 1.5, n_tickers), index=tickers)
+    return df_prices, fee
+
+
+def get_monthly_prices_loop(df_prices, fee):
+    """
+    reference: compound the daily fee of each ticker separately
+    """
+    df_fees = dict()
+    for tkr in df_prices.columns:
+        s = df_prices[tkr].dropna()
+        days = (s.index - s.index[0]).days
+        df_fees[tkr] = s * (1 - fee[tkr] / 100) ** (days / 365)
+    df_fees = pd.DataFrame(df_fees).reindex(df_prices.index)
+    return resample_monthly(df_prices, df_fees)
+
+
+def get_peak(func):
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main(n_tickers=2000, chunksize=250):
+    df_prices, fee = make_daily(int(n_tickers))
+    funcs = {
+        'loop': lambda: get_monthly_prices_loop(df_prices, fee),
+        'vectorized': lambda: get_monthly_prices(df_prices, fee),
+        f'chunk {chunksize}': lambda: get_monthly_prices(df_prices, fee, int(chunksize)),
+    }
+    results = {k: f() for k, f in funcs.items()}
+    base = results['loop']
+    for k, v in results.items():
+        assert v.index.equals(base.index) and np.allclose(v, base, atol=0.1), k
+
+    print(f'{df_prices.shape[1]} tickers x {df_prices.shape[0]} days')
+    print(f"{'method':15} {'sec':>8} {'peak MB':>8}")
+    for k, f in funcs.items():
+        t = min(timeit.repeat(f, number=1, repeat=3))
+        print(f'{k:15} {t:8.2f} {get_peak(f) / 2**20:8.1f}')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,82 @@
+"""
+measure resident memory and time of a process getting the ticker x date prices
+ of every fee from a synthetic universe: the CSV read into the (ticker, date)
+ dataframe and unstacked vs the memory-mapped store of mmap_utils.
+ +RSS is the memory added after importing numpy and pandas
+
+usage: python benchmarks/bench_mmap.py [n_tickers]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, path)
+sys.path.insert(0, os.path.dirname(__file__))
+from bench_preprocess import make_universe
+from mmap_utils import write_matrix
+
+script = """
+import json, sys, time
+sys.path.insert(0, {path!r})
+import numpy as np
+import pandas as pd
+from mmap_utils import open_matrix, get_frame
+
+def rss():
+    with open('/proc/self/status') as f:
+        return next(int(x.split()[1]) for x in f if x.startswith('VmRSS')) / 1024
+
+res = {{'base': rss()}}
+t0 = time.perf_counter()
+if {kind!r} == 'dataframe':
+    df_prc = pd.read_csv({file!r}, parse_dates=['date'], dtype={{'ticker': str}},
+                         index_col=['ticker', 'date'])
+    res['open'] = time.perf_counter() - t0
+    mats = [df_prc[x].unstack('ticker').sort_index() for x in df_prc.columns]
+    tickers = mats[0].columns[::100]
+    t1 = time.perf_counter()
+    sel = [df_prc.loc[tickers, x].unstack('ticker') for x in df_prc.columns]
+else:
+    store = open_matrix({file!r})
+    res['open'] = time.perf_counter() - t0
+    mats = [get_frame(store, x, dropna=False) for x in store['columns']]
+    tickers = store['tickers'][::100]
+    t1 = time.perf_counter()
+    sel = [get_frame(store, x, tickers) for x in store['columns']]
+res['select'] = time.perf_counter() - t1
+res['mean'] = float(sum(np.nanmean(x.to_numpy()) for x in mats)) # touch every price
+res['total'] = time.perf_counter() - t0
+res['rss'] = rss()
+print(json.dumps(res))
+"""
+
+
+def run(kind, file):
+    code = script.format(path=path, kind=kind, file=file)
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(n_tickers=10000):
+    df_prc, _, _ = make_universe(int(n_tickers))
+    with tempfile.TemporaryDirectory() as tmp:
+        file = os.path.join(tmp, 'prc.csv')
+        df_prc.to_csv(file)
+        path_store = os.path.join(tmp, 'matrix')
+        write_matrix(df_prc, path_store)
+        size = sum(os.path.getsize(os.path.join(path_store, x)) for x in os.listdir(path_store))
+        res = {'dataframe': run('dataframe', file), 'mmap': run('mmap', path_store)}
+
+    print(f'{n_tickers} tickers, {len(df_prc)} rows, store {size / 2**20:.1f} MB')
+    print(f"{'':10} {'open ms':>8} {'select ms':>9} {'total ms':>8} {'RSS MB':>7} {'+RSS MB':>7}")
+    for k, v in res.items():
+        assert abs(v['mean'] - res['dataframe']['mean']) < 1e-2 * abs(v['mean'])
+        print(f"{k:10} {v['open']*1000:8.1f} {v['select']*1000:9.1f} {v['total']*1000:8.1f} "
+              f"{v['rss']:7.1f} {v['rss'] - v['base']:7.1f}")
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
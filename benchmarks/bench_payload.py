@@ -0,0 +1,93 @@
+"""
+compare size and parse time of the price payload of app.py:
+ dict: {fee: {ticker: {date: price}}} inlined before the columnar payload
+ columnar: shared date axis and float32 array for each fee (data_utils.get_price_payload)
+
+usage: python benchmarks/bench_payload.py [dt]
+"""
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from data_utils import get_price_payload, decode_array
+
+date_format = '%Y-%m-%d'
+path = os.path.join(os.path.dirname(__file__), '..')
+
+
+def get_price_dict(df_prc):
+    """
+    price data in the dict format before the columnar payload
+    """
+    data_prc = {}
+    for col in df_prc.columns:
+        df = df_prc[col].unstack('ticker').sort_index().dropna(how='all')
+        df = df.reindex(df.index.strftime(date_format))
+        data_prc[col] = {x: df[x].dropna().to_dict() for x in df.columns}
+    return data_prc
+
+
+def decode_payload(payload):
+    return {k: decode_array(v) for k, v in payload['values'].items()}
+
+
+def time_node(text, decode, repeat=20):
+    """
+    return msec to parse (and decode) the payload in node as in the browser
+    """
+    if shutil.which('node') is None:
+        return None
+    utils = os.path.abspath(os.path.join(path, 'assets', 'utils.js'))
+    script = f"""
+        global.window = global;
+        require({json.dumps(utils)});
+        const text = require('fs').readFileSync(process.argv[1], 'utf8');
+        const t0 = performance.now();
+        for (let i = 0; i < {repeat}; i++) {{
+            const data = JSON.parse(text);
+            if ({json.dumps(decode)}) decodePrice(data);
+        }}
+        console.log((performance.now() - t0) / {repeat});
+    """
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        f.write(text)
+    try:
+        out = subprocess.run(['node', '-e', script, f.name], capture_output=True, text=True, check=True)
+        return float(out.stdout)
+    finally:
+        os.remove(f.name)
+
+
+def main(dt='250331', repeat=20):
+    df_prc = pd.read_csv(
+        f'{path}/funds_monthly_{dt}.csv',
+        parse_dates=['date'],
+        dtype={'ticker': str},
+        index_col=['ticker', 'date']
+    )
+    payloads = {
+        'dict': (json.dumps(get_price_dict(df_prc)), False),
+        'columnar': (json.dumps(get_price_payload(df_prc, date_format)), True)
+    }
+
+    print(f'{"payload":10} {"bytes":>10} {"gzip":>10} {"py parse(ms)":>13} {"node parse(ms)":>15}')
+    for name, (text, decode) in payloads.items():
+        size = len(text.encode())
+        size_gz = len(gzip.compress(text.encode()))
+        func = (lambda: decode_payload(json.loads(text))) if decode else (lambda: json.loads(text))
+        t_py = timeit.timeit(func, number=repeat) / repeat * 1000
+        t_node = time_node(text, decode, repeat)
+        t_node = 'n/a' if t_node is None else f'{t_node:.2f}'
+        print(f'{name:10} {size:10,d} {size_gz:10,d} {t_py:13.2f} {t_node:>15}')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,140 @@
+"""
+time each preprocessing stage of data_utils on the real snapshot and 
+ on synthetic universes to see regressions as the fund universe grows.
+the per-ticker/per-row implementations before vectorizing are timed 
+ as 'legacy' and checked to give identical output.
+
+usage: python benchmarks/bench_preprocess.py [n_tickers ...]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, path)
+from data_utils import (load_data, get_category_data, get_price_payload, 
+                        get_rolling_payload, get_similar_data, get_ranking_data,
+                        get_scatter_data, get_rank_data)
+from check_utils import validate
+
+dt = '250331'
+date_format = '%Y-%m-%d'
+
+
+def legacy_category(df_cat):
+    data_cat = dict()
+    for col in df_cat.columns:
+        data_cat[col] = df_cat[col].reset_index().groupby(col)['ticker'].apply(list).to_dict()
+    return data_cat
+
+
+def legacy_sharpe(df_est, xlabel='mean', ylabel='sd'):
+    return df_est.apply(lambda x: x[xlabel]/ x[ylabel], axis=1).rank().rename('sharpe')
+
+
+def legacy_price(df_prc):
+    data_prc = {}
+    for col in df_prc.columns:
+        df = df_prc[col].unstack('ticker').sort_index().dropna(how='all')
+        df = df.reindex(df.index.strftime(date_format))
+        data_prc[col] = {x: df[x].dropna().to_dict() for x in df.columns}
+    return data_prc
+
+
+def make_universe(n_tickers, n_months=240, seed=0):
+    """
+    return synthetic price, category and estimation data of n_tickers 
+     with random inception dates and categories sampled from the real ones
+    """
+    rng = np.random.default_rng(seed)
+    tickers = np.array([f'KR{i:010d}' for i in range(n_tickers)])
+    dates = pd.date_range(end=f'20{dt[:2]}-{dt[2:4]}-{dt[4:]}', periods=n_months, freq=pd.offsets.MonthEnd())
+
+    # monthly prices from inception to the last month
+    start = rng.integers(0, n_months - 2, n_tickers)
+    ret = rng.normal(0.005, 0.04, (n_tickers, n_months))
+    prc = 1000 * np.exp(np.cumsum(ret, axis=1))
+    col = np.arange(n_months)
+    mask = col >= start[:, None]
+    idx = pd.MultiIndex.from_arrays([np.repeat(tickers, mask.sum(axis=1)), 
+                                     np.tile(dates, n_tickers).reshape(n_tickers, -1)[mask]],
+                                    names=['ticker', 'date'])
+    fee = np.exp(-0.01 / 12 * (col - start[:, None]).clip(0))
+    df_prc = pd.DataFrame({'price': prc[mask].round(1), 
+                           'price_after_fees': (prc * fee)[mask].round(1)}, index=idx)
+
+    df_cat = pd.read_csv(f'{path}/funds_categories.csv', index_col=['ticker'])
+    df_cat = pd.DataFrame({x: rng.choice(df_cat[x].unique(), n_tickers) for x in df_cat.columns}, 
+                          index=pd.Index(tickers, name='ticker'))
+    df_cat['name'] = [f'{x}{i}' for i, x in enumerate(df_cat['name'])]
+
+    mean = rng.normal(0.05, 0.05, n_tickers)
+    sd = rng.uniform(0.02, 0.3, n_tickers)
+    df_est = pd.DataFrame({'mean': mean, 'sd': sd, 'hdi_3%': mean - 1.88 * sd, 
+                           'hdi_97%': mean + 1.88 * sd}, index=pd.Index(tickers, name='ticker'))
+    return df_prc, df_cat, df_est
+
+
+def timer(func, *args, **kwargs):
+    t0 = time.perf_counter()
+    res = func(*args, **kwargs)
+    return res, time.perf_counter() - t0
+
+
+def run(df_prc, df_cat, df_est, files=None, legacy=True):
+    """
+    return dict of stage to seconds
+    """
+    res = dict()
+    if files is not None:
+        _, res['load'] = timer(load_data, *files)
+
+    _, res['validation'] = timer(validate, df_prc, df_cat, df_est)
+    data_cat, res['category'] = timer(get_category_data, df_cat)
+    data_prc, res['price'] = timer(get_price_payload, df_prc, date_format)
+    _, res['rolling'] = timer(get_rolling_payload, df_prc, data_prc, date_format=date_format)
+    _, res['similar'] = timer(get_similar_data, df_prc, df_cat.index.to_list())
+    _, res['ranking'] = timer(get_ranking_data, df_prc, df_est, df_cat.index.to_list())
+    data_est, res['scatter'] = timer(get_scatter_data, df_est, df_cat)
+    _, res['rank'] = timer(get_rank_data, df_est)
+    data = dict(category=data_cat, scatter=data_est)
+    _, res['json'] = timer(json.dumps, data)
+
+    if legacy:
+        data_cat_legacy, res['legacy category'] = timer(legacy_category, df_cat)
+        assert json.dumps(data_cat_legacy) == json.dumps(data_cat)
+        s_legacy, res['legacy sharpe'] = timer(legacy_sharpe, df_est)
+        assert s_legacy.equals(df_est['mean'].div(df_est['sd']).rank().rename('sharpe'))
+        _, res['legacy price'] = timer(legacy_price, df_prc)
+    return res
+
+
+def main(*n_tickers):
+    n_tickers = [int(x) for x in n_tickers] or [10000, 50000]
+    results = dict()
+
+    files = [f'{path}/{x}' for x in (f'funds_monthly_{dt}.csv', 'funds_categories.csv', 
+                                     f'funds_bayesian_ret3y_{dt}.csv')]
+    dfs = load_data(*files)
+    results[f'real ({dfs[1].shape[0]})'] = run(*dfs, files=files)
+
+    for n in n_tickers:
+        dfs = make_universe(n)
+        with tempfile.TemporaryDirectory() as tmp:
+            files = [os.path.join(tmp, x) for x in ('prc.csv', 'cat.csv', 'est.csv')]
+            for df, file in zip(dfs, files):
+                df.to_csv(file)
+            results[f'synthetic ({n})'] = run(*dfs, files=files)
+
+    df = pd.DataFrame(results).mul(1000).round(1)
+    print('time in msec')
+    print(df.to_string())
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,65 @@
+"""
+measure startup time of app.py with cold (no cache) and warm preprocessing cache
+
+usage: python benchmarks/bench_startup.py [repeat]
+"""
+import os
+import subprocess
+import sys
+import timeit
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, path)
+from data_utils import get_data, load_cache
+
+dt = '250331'
+files = [f'{path}/{x}' for x in (f'funds_monthly_{dt}.csv', 'funds_categories.csv', 
+                                 f'funds_bayesian_ret3y_{dt}.csv')]
+path_cache = f'{path}/.cache'
+
+script = """
+import time
+t0 = time.perf_counter()
+import app
+print(time.perf_counter() - t0)
+"""
+
+
+def time_import():
+    out = subprocess.run([sys.executable, '-c', script], cwd=path, 
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def main(repeat=5):
+    repeat = int(repeat)
+    name = 'bench_startup'
+    res = dict()
+    
+    file = os.path.join(path_cache, f'{name}.pkl')
+    def cold():
+        if os.path.exists(file):
+            os.remove(file)
+        return load_cache(get_data, files, path=path_cache, name=name)
+    warm = lambda: load_cache(get_data, files, path=path_cache, name=name)
+
+    res['preprocess cold'] = min(timeit.repeat(cold, number=1, repeat=repeat))
+    res['preprocess warm'] = min(timeit.repeat(warm, number=1, repeat=repeat))
+    os.remove(file)
+
+    # import app in a new process
+    file_cache = os.path.join(path_cache, f'data_{dt}.pkl')
+    times = []
+    for _ in range(repeat):
+        if os.path.exists(file_cache):
+            os.remove(file_cache)
+        times.append(time_import())
+    res['import app cold'] = min(times)
+    res['import app warm'] = min(time_import() for _ in range(repeat))
+
+    for k, v in res.items():
+        print(f'{k:20} {v*1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
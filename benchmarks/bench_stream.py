@@ -0,0 +1,88 @@
+"""
+measure time and peak resident memory of building the price payload, the price assets
+ of the base and deltas and the memory-mapped store from the CSV of synthetic universes
+ of each number of tickers, grouped by ticker in random order: read at once by data_utils
+ as get_data does by default vs streamed by chunks by stream_utils.
+ +peak MB is the peak memory added after importing numpy and pandas including pages
+ of the store and temporary files mapped in memory, which the kernel can write back, and
+ +anon MB is the peak of anonymous memory added, sampled every 2 msec.
+ fails if the files of the price assets are not the same
+
+usage: python benchmarks/bench_stream.py [n_tickers,...] [chunksize]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, path)
+sys.path.insert(0, os.path.dirname(__file__))
+from bench_preprocess import make_universe
+
+script = """
+import json, sys, threading, time
+sys.path.insert(0, {path!r})
+import numpy as np
+import pandas as pd
+
+def status(key):
+    with open('/proc/self/status') as f:
+        return next(int(x.split()[1]) for x in f if x.startswith(key)) / 1024
+
+res = {{'base': status('VmRSS'), 'base_anon': status('RssAnon'), 'anon': 0}}
+done = threading.Event()
+def sample():
+    while not done.wait(0.002):
+        res['anon'] = max(res['anon'], status('RssAnon'))
+thread = threading.Thread(target=sample)
+thread.start()
+t0 = time.perf_counter()
+if {kind!r} == 'memory':
+    from data_utils import get_price_payload, get_price_deltas, write_price_assets
+    from mmap_utils import write_matrix
+    df_prc = pd.read_csv({file!r}, parse_dates=['date'], dtype={{'ticker': str}},
+                         index_col=['ticker', 'date'])
+    payload = get_price_payload(df_prc)
+    assets = write_price_assets(get_price_deltas(df_prc), {out!r})
+    write_matrix(df_prc, {out!r} + '/matrix')
+else:
+    from stream_utils import convert
+    assets = convert({file!r}, path={out!r}, path_store={out!r} + '/matrix',
+                     chunksize={chunksize})['assets']
+res['total'] = time.perf_counter() - t0
+done.set()
+thread.join()
+res['peak'] = status('VmHWM')
+res['files'] = [x['file'] for x in [assets['base'], *assets['deltas']]]
+print(json.dumps(res))
+"""
+
+
+def run(kind, file, out, chunksize):
+    code = script.format(path=path, kind=kind, file=file, out=out, chunksize=chunksize)
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(n_tickers='2000,10000,30000', chunksize=100000):
+    print(f'chunks of {chunksize} rows')
+    print(f"{'tickers':>8} {'rows':>9} {'CSV MB':>8} {'':8} {'total ms':>9} {'peak MB':>8} {'+peak MB':>8} {'+anon MB':>8}")
+    for n in map(int, str(n_tickers).split(',')):
+        df_prc, _, _ = make_universe(n)
+        df_prc = df_prc.loc[np.random.default_rng(0).permutation(df_prc.index.levels[0])]
+        with tempfile.TemporaryDirectory() as tmp:
+            file = os.path.join(tmp, 'prc.csv')
+            df_prc.to_csv(file)
+            size = os.path.getsize(file)
+            res = {x: run(x, file, os.path.join(tmp, x), int(chunksize)) for x in ['memory', 'stream']}
+        assert res['memory']['files'] == res['stream']['files'], f'different assets of {n} tickers'
+        for k, v in res.items():
+            print(f"{n:8} {len(df_prc):9} {size / 2**20:8.1f} {k:8} {v['total']*1000:9.1f} "
+                  f"{v['peak']:8.1f} {v['peak'] - v['base']:8.1f} {v['anon'] - v['base_anon']:8.1f}")
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
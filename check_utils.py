@@ -0,0 +1,235 @@
+"""
+validation of the input snapshots by vectorized checks over the ticker x month matrix
+ of prices before the payload is built, reported as JSON
+ missing: months of the calendar from the first to the last month without price of
+          all funds, reported once with ticker null, and months of prices of other funds
+          but without price within the span of a ticker
+ stale: tickers of which last price is before the last month of the snapshot
+ outlier: monthly log returns of robust z-score beyond z_max by the median and MAD
+          of each ticker, ex) a price jump of a fund split
+ invalid: duplicated (ticker, date) rows and prices of zero or less
+ fee: price after fees above the price before fees
+ ticker: tickers in any of prices, categories and estimations but not in the others,
+         and tickers of no name
+
+usage: python check_utils.py funds_monthly_<dt>.csv funds_categories.csv funds_bayesian_ret3y_<dt>.csv [file_out]
+"""
+import json
+import sys
+import numpy as np
+import pandas as pd
+
+params_default = {
+    'z_max': 10,
+    'min_returns': 12, # returns of a ticker to estimate its scale of returns
+    'min_scale': 0.01 # floor of the scale for funds of little volatility, ex) MMF
+}
+mad_scale = 1.4826 # MAD to standard deviation of normal distribution
+
+
+def get_codes(index, name):
+    """
+    return codes and sorted unique values of the level name of index.
+     the codes of MultiIndex are used if its level is sorted to save factorizing rows
+    """
+    index = index.remove_unused_levels()
+    i = index.names.index(name)
+    if index.levels[i].is_monotonic_increasing:
+        return index.codes[i], index.levels[i]
+    return pd.factorize(index.get_level_values(i), sort=True)
+
+
+def get_price_matrix(df_prc):
+    """
+    return dict of column to ticker x month array of prices with NaN for months
+     without price, tickers and month ends of the columns from the first to the last month
+    df_prc: prices with index (ticker, date) and a column for each fee
+    """
+    df = df_prc.dropna(how='all')
+    idx_tkr, tickers = get_codes(df.index, 'ticker')
+    idx_dt, dates = get_codes(df.index, 'date')
+    months = np.asarray(dates.year * 12 + dates.month - 1)[idx_dt]
+    m0 = months.min() if len(months) else 0
+    n_months = months.max() - m0 + 1 if len(months) else 0
+    mats = dict()
+    for col in df.columns:
+        mats[col] = np.full((len(tickers), n_months), np.nan)
+        mats[col][idx_tkr, months - m0] = df[col].to_numpy(dtype=float)
+    dates = pd.date_range(f'{m0 // 12}-{m0 % 12 + 1}', periods=n_months, freq=pd.offsets.MonthEnd())
+    return mats, tickers, dates
+
+
+def get_span(valid):
+    """
+    return index of the first and the last valid column of each row, -1 if none
+    """
+    n = valid.shape[1]
+    has = valid.any(axis=1)
+    first = np.where(has, valid.argmax(axis=1), -1)
+    last = np.where(has, n - 1 - valid[:, ::-1].argmax(axis=1), -1)
+    return first, last
+
+
+def check_missing(valid, tickers, dates, date_format='%Y-%m'):
+    """
+    return records of months of the calendar without price of all tickers, of tickers
+     without price in months of prices of other tickers within their spans and
+     of tickers of which last price is before the last month
+    valid: ticker x month array of prices present for every month of the calendar
+    """
+    first, last = get_span(valid)
+    col = np.arange(valid.shape[1])
+    months = np.asarray(dates.strftime(date_format))
+    # months without price of all funds are a gap of the snapshot, not of each ticker
+    empty = ~valid.any(axis=0)
+    missing = [{'ticker': None, 'count': int(empty.sum()), 'months': months[empty].tolist()}
+               ] if empty.any() else []
+    gap = ~valid & ~empty & (col >= first[:, None]) & (col <= last[:, None])
+    rows = np.flatnonzero(gap.any(axis=1))
+    missing += [{'ticker': tickers[i], 'count': int(gap[i].sum()), 'months': months[gap[i]].tolist()}
+                for i in rows]
+    rows = np.flatnonzero((last >= 0) & (last < valid.shape[1] - 1))
+    stale = [{'ticker': tickers[i], 'last': months[last[i]],
+              'months': int(valid.shape[1] - 1 - last[i])} for i in rows]
+    return missing, stale
+
+
+def get_returns(mat):
+    """
+    return ticker x month array of log returns per month from the previous price,
+     at the month of the later price, with NaN if no previous price
+    """
+    valid = ~np.isnan(mat)
+    col = np.arange(mat.shape[1])
+    prev = np.maximum.accumulate(np.where(valid, col, -1), axis=1)
+    prev = np.concatenate([np.full((len(mat), 1), -1), prev[:, :-1]], axis=1)
+    rows = np.arange(len(mat))[:, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ret = np.log(mat / mat[rows, prev.clip(0)]) / (col - prev)
+    return np.where(valid & (prev >= 0), ret, np.nan)
+
+
+def get_row_median(x):
+    """
+    return median of each row of x ignoring NaN, NaN if none.
+     sorting the rows once is faster than np.nanmedian of masked arrays
+    """
+    x = np.sort(x, axis=1) # NaN last
+    n = (~np.isnan(x)).sum(axis=1)
+    rows = np.arange(len(x))
+    lo, hi = x[rows, ((n - 1) // 2).clip(0)], x[rows, (n // 2).clip(0, x.shape[1] - 1)]
+    return np.where(n > 0, (lo + hi) / 2, np.nan)
+
+
+def get_robust_z(ret, min_returns=12, min_scale=0.01):
+    """
+    return robust z-score of ret centered by the median and scaled by the MAD
+     of each ticker, NaN for tickers of fewer returns than min_returns.
+     the median of all funds in a month is not removed as funds of little volatility
+     would be outliers in a crash
+    min_scale: floor of the scale
+    """
+    center = get_row_median(ret)[:, None]
+    scale = mad_scale * get_row_median(np.abs(ret - center))[:, None]
+    enough = (~np.isnan(ret)).sum(axis=1, keepdims=True) >= min_returns
+    with np.errstate(invalid='ignore'):
+        return np.where(enough, (ret - center) / np.fmax(scale, min_scale), np.nan)
+
+
+def check_outliers(mat, tickers, dates, z_max=10, min_returns=12, min_scale=0.01,
+                   date_format='%Y-%m'):
+    """
+    return records of monthly returns of robust z-score beyond z_max
+    """
+    ret = get_returns(mat)
+    z = get_robust_z(ret, min_returns, min_scale)
+    rows, cols = np.nonzero(np.abs(np.nan_to_num(z)) > z_max)
+    months = dates.strftime(date_format)
+    return [{'ticker': tickers[i], 'month': months[j], 'return': round(float(np.expm1(ret[i, j])), 4),
+             'z': round(float(z[i, j]), 1)} for i, j in zip(rows, cols)]
+
+
+def check_invalid(df_prc, date_format='%Y-%m-%d'):
+    """
+    return records of duplicated rows and of prices of zero or less
+    """
+    dup = df_prc.index[df_prc.index.duplicated()]
+    bad = df_prc.index[(df_prc <= 0).any(axis=1).to_numpy()]
+    fmt = lambda x, reason: [{'ticker': t, 'date': d.strftime(date_format), 'reason': reason}
+                             for t, d in x.unique()]
+    return fmt(dup, 'duplicated') + fmt(bad, 'not positive')
+
+
+def check_fees(mats, tickers, dates, cols=None, date_format='%Y-%m'):
+    """
+    return records of months of price after fees above price before fees
+    cols: columns of price before and after fees, the first two columns if None
+    """
+    before, after = cols or list(mats)[:2]
+    with np.errstate(invalid='ignore'):
+        rows, idx = np.nonzero(mats[after] > mats[before])
+    months = dates.strftime(date_format)
+    return [{'ticker': tickers[i], 'month': months[j], 'price': float(mats[before][i, j]),
+             'price_after_fees': float(mats[after][i, j])} for i, j in zip(rows, idx)]
+
+
+def check_tickers(tickers, df_cat, df_est):
+    """
+    return records of tickers missing in any of prices, categories and estimations
+     and of tickers without name
+    tickers: tickers with prices
+    """
+    sets = {'price': pd.Index(tickers), 'category': df_cat.index, 'estimation': df_est.index}
+    union = sets['price'].union(sets['category']).union(sets['estimation'])
+    res = []
+    for k, v in sets.items():
+        for x in union.difference(v):
+            res.append({'ticker': x, 'reason': f'no {k}',
+                        'in': [y for y, u in sets.items() if y != k and x in u]})
+    if 'name' in df_cat.columns:
+        res += [{'ticker': x, 'reason': 'no name', 'in': ['category']}
+                for x in df_cat.index[df_cat['name'].isna()]]
+    return res
+
+
+def validate(df_prc, df_cat, df_est, z_max=10, min_returns=12, min_scale=0.01):
+    """
+    return report of the checks of the input data
+     snapshot: last month of prices
+     summary: number of records of each check
+     checks: dict of check to records
+    """
+    mats, tickers, dates = get_price_matrix(df_prc)
+    tickers = tickers.to_list()
+    # any price column has a price if the row is valid
+    valid = np.logical_or.reduce([~np.isnan(x) for x in mats.values()])
+    missing, stale = check_missing(valid, tickers, dates)
+    outlier = [dict(x, column=col) for col, mat in mats.items()
+               for x in check_outliers(mat, tickers, dates, z_max, min_returns, min_scale)]
+    checks = {
+        'missing': missing,
+        'stale': stale,
+        'outlier': outlier,
+        'invalid': check_invalid(df_prc),
+        'fee': check_fees(mats, tickers, dates) if len(mats) > 1 else [],
+        'ticker': check_tickers(tickers, df_cat, df_est)
+    }
+    return {
+        'snapshot': dates[-1].strftime('%Y-%m') if len(dates) else None,
+        'params': {'z_max': z_max, 'min_returns': min_returns, 'min_scale': min_scale},
+        'summary': {k: len(v) for k, v in checks.items()},
+        'checks': checks
+    }
+
+
+if __name__ == '__main__':
+    file_prc, file_cat, file_est = sys.argv[1:4]
+    file_out = sys.argv[4] if len(sys.argv) > 4 else 'funds_validation.json'
+    df_prc = pd.read_csv(file_prc, parse_dates=['date'], dtype={'ticker': str},
+                         index_col=['ticker', 'date'])
+    df_cat = pd.read_csv(file_cat, index_col=['ticker'])
+    df_est = pd.read_csv(file_est, index_col=['ticker'])
+    report = validate(df_prc, df_cat, df_est, **params_default)
+    with open(file_out, 'w') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"{file_out} saved: {report['summary']}")
@@ -0,0 +1,185 @@
+"""
+correlation of monthly returns across all funds and hierarchical clustering of them
+ to find near-duplicate funds, ex) vintages of TDF or the same fund sold through
+ different sellers or accounts
+ correlation: pairwise-complete over the months with returns of both funds,
+              computed by blocks of funds with matrix products
+ clustering: average linkage on 1 - correlation by the nearest-neighbor chain,
+             cut at the distance of 1 - min_corr
+
+usage: python corr_utils.py funds_monthly_<dt>.csv [file_out] [min_corr]
+"""
+import sys
+import numpy as np
+import pandas as pd
+
+params_default = {
+    'min_periods': 24,
+    'block': 512,
+    'k': 5,
+    'min_corr': 0.98
+}
+
+
+def get_return_matrix(df_prc, col='price'):
+    """
+    return ticker x date array of log returns between consecutive dates of the
+     prices of any ticker with NaN if either price is missing, and tickers
+    df_prc: prices with index (ticker, date)
+    """
+    s = df_prc[col].dropna()
+    idx_tkr, tickers = pd.factorize(s.index.get_level_values('ticker'), sort=True)
+    idx_dt, dates = pd.factorize(s.index.get_level_values('date'), sort=True)
+    mat = np.full((len(tickers), len(dates)), np.nan)
+    mat[idx_tkr, idx_dt] = np.log(s.to_numpy(dtype=float))
+    return np.diff(mat, axis=1), tickers
+
+
+def get_correlation(ret, min_periods=24, block=512):
+    """
+    return ticker x ticker float32 array of pairwise-complete correlation of ret
+     with NaN for pairs of fewer common returns than min_periods
+    block: number of rows computed at once to limit the memory of intermediates.
+     only the blocks of the upper triangle are computed
+    """
+    valid = ~np.isnan(ret)
+    # centered by the mean of each ticker, which keeps correlation, so that
+    # the sums are precise enough in float32
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nansum(ret, axis=1, keepdims=True) / valid.sum(axis=1, keepdims=True)
+    m = valid.astype(np.float32)
+    x = np.where(valid, ret - mean, 0).astype(np.float32)
+    xx = x ** 2
+    n = len(ret)
+    corr = np.empty((n, n), dtype=np.float32)
+    # blocks of the upper triangle mirrored to the lower one
+    for i in range(0, n, block):
+        mi, xi, xxi = m[i:i+block], x[i:i+block], xx[i:i+block]
+        mj, xj, xxj = m[i:].T, x[i:].T, xx[i:].T
+        # sums over the common months of each pair
+        cnt = mi @ mj
+        s_i, s_j = xi @ mj, mi @ xj
+        ss_i, ss_j = xxi @ mj, mi @ xxj
+        s_ij = xi @ xj
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = cnt * s_ij - s_i * s_j
+            var = (cnt * ss_i - s_i ** 2) * (cnt * ss_j - s_j ** 2)
+            c = cov / np.sqrt(var)
+        c = np.where((cnt >= min_periods) & (var > 0), np.clip(c, -1, 1), np.nan)
+        corr[i:i+block, i:] = c
+        corr[i:, i:i+block] = c.T
+    return corr
+
+
+def get_neighbors(corr, k=5, block=512):
+    """
+    return ticker x k arrays of index and correlation of the k most correlated
+     tickers in descending order, -1 and NaN if fewer
+    """
+    n = len(corr)
+    k = min(k, n - 1)
+    idx = np.full((n, max(k, 0)), -1)
+    val = np.full((n, max(k, 0)), np.nan, dtype=np.float32)
+    if k <= 0:
+        return idx, val
+    for i in range(0, n, block):
+        c = np.nan_to_num(corr[i:i+block], nan=-np.inf)
+        rows = np.arange(len(c))
+        c[rows, rows + i] = -np.inf # except itself
+        top = np.argpartition(-c, k - 1, axis=1)[:, :k]
+        top = np.take_along_axis(top, np.argsort(-np.take_along_axis(c, top, axis=1), axis=1), axis=1)
+        v = np.take_along_axis(c, top, axis=1)
+        idx[i:i+block] = np.where(np.isfinite(v), top, -1)
+        val[i:i+block] = np.where(np.isfinite(v), v, np.nan)
+    return idx, val
+
+
+def get_linkage(dist):
+    """
+    return list of merges (a, b, distance) of average linkage clustering where
+     the cluster merged is named after a, by the nearest-neighbor chain
+    dist: symmetric distance matrix which is overwritten
+    """
+    n = len(dist)
+    dist[np.arange(n), np.arange(n)] = np.inf
+    size = np.ones(n)
+    active = np.ones(n, dtype=bool)
+    merges, chain = [], []
+    for _ in range(n - 1):
+        while True:
+            if not chain:
+                chain.append(int(np.argmax(active)))
+            a = chain[-1]
+            b = int(np.argmin(dist[a]))
+            # prefer the previous one of the chain on ties to stop the chain
+            if len(chain) > 1 and dist[a, chain[-2]] <= dist[a, b]:
+                b = chain[-2]
+            if len(chain) > 1 and b == chain[-2]:
+                break
+            chain.append(b)
+        chain = chain[:-2]
+        merges.append((a, b, float(dist[a, b])))
+        # Lance-Williams update of average linkage
+        d = (size[a] * dist[a] + size[b] * dist[b]) / (size[a] + size[b])
+        dist[a], dist[:, a] = d, d
+        dist[a, a] = np.inf
+        dist[b], dist[:, b] = np.inf, np.inf
+        size[a] += size[b]
+        active[b] = False
+    return merges
+
+
+def get_clusters(merges, n, threshold):
+    """
+    return cluster labels of n items merged within the distance of threshold,
+     numbered in the order of their first items
+    """
+    parent = np.arange(n)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # average linkage has no inversions so that merges below threshold form the clusters
+    for a, b, d in merges:
+        if d <= threshold:
+            parent[find(b)] = find(a)
+    roots = np.array([find(i) for i in range(n)])
+    return pd.factorize(roots)[0]
+
+
+def get_similar(df_prc, col='price', min_periods=24, block=512, k=5, min_corr=0.98):
+    """
+    return cluster label, neighbors and their correlations of each ticker
+     cluster: label of the cluster of funds correlated by min_corr or more on average
+     neighbors: tickers of the k most correlated funds in descending order
+     corr: correlations of the neighbors
+    """
+    ret, tickers = get_return_matrix(df_prc, col)
+    corr = get_correlation(ret, min_periods, block)
+    idx, val = get_neighbors(corr, k, block)
+    # uncorrelated if too few common returns
+    dist = np.subtract(1, np.nan_to_num(corr, nan=0, copy=False), out=corr)
+    del corr
+    cluster = get_clusters(get_linkage(dist), len(tickers), 1 - min_corr)
+    tickers = tickers.to_numpy()
+    return pd.DataFrame({
+        'cluster': cluster,
+        'neighbors': [list(tickers[x[x >= 0]]) for x in idx],
+        'corr': [list(np.round(v[x >= 0].astype(float), 4)) for x, v in zip(idx, val)]
+    }, index=pd.Index(tickers, name='ticker'))
+
+
+if __name__ == '__main__':
+    file_prc = sys.argv[1]
+    file_out = sys.argv[2] if len(sys.argv) > 2 else 'funds_similar.csv'
+    min_corr = float(sys.argv[3]) if len(sys.argv) > 3 else params_default['min_corr']
+    df_prc = pd.read_csv(file_prc, parse_dates=['date'], dtype={'ticker': str},
+                         index_col=['ticker', 'date'])
+    df = get_similar(df_prc, **{**params_default, 'min_corr': min_corr})
+    df.to_csv(file_out)
+    sizes = df['cluster'].value_counts()
+    print(f'{file_out} saved: {len(df)} funds in {len(sizes)} clusters, '
+          f'{(sizes > 1).sum()} clusters of {sizes[sizes > 1].sum()} near-duplicates')
@@ -0,0 +1,510 @@
+import base64
+import glob
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import shutil
+import unicodedata
+import numpy as np
+import pandas as pd
+import store_utils
+from store_utils import load_store, file_manifest
+import roll_utils
+import corr_utils
+import check_utils
+import rank_utils
+import stream_utils
+
+
+def encode_array(arr, dtype='<f4'):
+    """
+    return base64 string of little-endian binary array which is
+     decoded to a typed array (ex: Float32Array) in the browser
+    """
+    arr = np.ascontiguousarray(arr, dtype=dtype)
+    return base64.b64encode(arr.tobytes()).decode('ascii')
+
+
+def decode_array(text, dtype='<f4'):
+    """
+    reverse of encode_array
+    """
+    return np.frombuffer(base64.b64decode(text), dtype=dtype)
+
+
+def get_cagr(mat, dates):
+    """
+    return CAGR (%) from the first to the last valid price in each row of mat
+     or NaN if the period is shorter than a month
+    mat: ticker x date array of prices
+    dates: DatetimeIndex of the columns of mat
+    """
+    valid = ~np.isnan(mat)
+    first = valid.argmax(axis=1)
+    last = mat.shape[1] - 1 - valid[:, ::-1].argmax(axis=1)
+    rows = np.arange(len(mat))
+    months = np.asarray(dates.year * 12 + dates.month)
+    months = months[last] - months[first]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cagr = (mat[rows, last].astype(float) / mat[rows, first]) ** (12 / months) - 1
+    return np.where(months > 0, cagr * 100, np.nan)
+
+
+def get_price_payload(df_prc, date_format='%Y-%m-%d', encode=True):
+    """
+    convert price history into a columnar payload for the client
+    df_prc: dataframe of prices with index (ticker, date) and a column for each fee
+    return dict of
+     dates: shared sorted date axis
+     tickers: ticker index
+     start: index of dates where the series of each ticker starts
+     offset: position of each series in values. the series of i-th ticker is
+             values[fee][offset[i]:offset[i+1]], dated from dates[start[i]]
+     values: dict of fee to float32 array with NaN for missing months
+     cagr: dict of fee to float32 array of CAGR (%) of each ticker since inception
+    """
+    fees = df_prc.columns.to_list()
+    df = df_prc.dropna(how='all')
+    # scatter prices into ticker x date matrix of each fee
+    idx_tkr, tickers = pd.factorize(df.index.get_level_values('ticker'), sort=True)
+    idx_dt, dates = pd.factorize(df.index.get_level_values('date'), sort=True)
+    mat = dict()
+    for fee in fees:
+        mat[fee] = np.full((len(tickers), len(dates)), np.nan, dtype=np.float32)
+        mat[fee][idx_tkr, idx_dt] = df[fee].to_numpy(dtype=np.float32)
+    cagr = {x: get_cagr(mat[x], dates) for x in fees}
+    tickers = tickers.to_list()
+    dates = dates.strftime(date_format).to_list()
+
+    # span of each ticker from first to last month with price of any fee
+    valid = np.logical_or.reduce([~np.isnan(x) for x in mat.values()])
+    start = valid.argmax(axis=1)
+    end = len(dates) - valid[:, ::-1].argmax(axis=1)
+    offset = np.concatenate([[0], np.cumsum(end - start)])
+    col = np.arange(len(dates))
+    span = (col >= start[:, None]) & (col < end[:, None])
+
+    values = dict()
+    for fee in fees:
+        arr = mat[fee][span]
+        values[fee] = encode_array(arr) if encode else arr
+        cagr[fee] = encode_array(cagr[fee]) if encode else cagr[fee].astype(np.float32)
+
+    return {
+        'dates': dates,
+        'tickers': tickers,
+        'start': start.tolist(),
+        'offset': offset.tolist(),
+        'values': values,
+        'cagr': cagr
+    }
+
+
+def get_rolling_payload(df_prc, data_prc, windows=roll_utils.windows, date_format='%Y-%m-%d'):
+    """
+    return rolling analytics of roll_utils in the columnar layout of data_prc,
+     the payload of get_price_payload, to be decoded with its dates, start and offset
+    return dict of
+     windows: months of rolling windows
+     values: dict of fee to dict of metric to float32 array with NaN for missing months
+     summary: dict of fee to dict of max_drawdown and max_duration to float32 array
+              of each ticker in the ticker index
+    """
+    dates = pd.to_datetime(data_prc['dates'], format=date_format)
+    start = np.asarray(data_prc['start'])
+    offset = np.asarray(data_prc['offset'])
+    # positions of the price payload in the ticker x month matrix
+    lengths = np.diff(offset)
+    rows = np.repeat(np.arange(len(start)), lengths)
+    cols = np.arange(offset[-1]) - np.repeat(offset[:-1] - start, lengths)
+    months = np.asarray(dates.year * 12 + dates.month)
+    values, summary = dict(), dict()
+    for fee in df_prc.columns:
+        mat, tickers, dates_m = roll_utils.get_month_matrix(df_prc, fee)
+        rolling = roll_utils.get_rolling(mat, windows)
+        idx_tkr = pd.Index(tickers).get_indexer(data_prc['tickers'])
+        idx_m = months - (dates_m[0].year * 12 + dates_m[0].month)
+        # tickers or months without prices of the fee are out of the matrix
+        valid = (idx_tkr[rows] >= 0) & (idx_m[cols] >= 0) & (idx_m[cols] < len(dates_m))
+        r, c = idx_tkr[rows][valid], idx_m[cols][valid]
+        values[fee] = dict()
+        for k, v in rolling.items():
+            arr = np.full(len(rows), np.nan, dtype=np.float32)
+            arr[valid] = v[r, c]
+            values[fee][k] = encode_array(arr)
+        summary[fee] = dict()
+        for k, v in roll_utils.get_summary(rolling).items():
+            arr = np.where(idx_tkr >= 0, v[idx_tkr], np.nan)
+            summary[fee][k] = encode_array(arr)
+    return {'windows': list(windows), 'values': values, 'summary': summary}
+
+
+def get_payload_id(payload):
+    """
+    return hash of payload to identify the price data cached in the browser
+    """
+    text = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode()).hexdigest()[:10]
+
+
+def get_price_deltas(df_prc, n=12, date_format='%Y-%m-%d'):
+    """
+    split price history into a base payload and deltas of the last n dates so that
+     returning visitors fetch only the deltas after the date they have
+    return dict of
+     base: payload of get_price_payload for the dates before the deltas
+     deltas: list of dict of
+      date: new date
+      tickers: tickers listed at the date, appended to the ticker index
+      values: dict of fee to float32 array of prices at the date in the ticker index
+      cagr: dict of fee to float32 array of CAGR of every ticker in the ticker index
+      id: id of the payload up to the date
+    """
+    df_prc = df_prc.dropna(how='all')
+    dates = df_prc.index.get_level_values('date')
+    dates_uniq = dates.unique().sort_values()
+    n = min(n, len(dates_uniq) - 1)
+    fees = df_prc.columns.to_list()
+
+    base = get_price_payload(df_prc[dates <= dates_uniq[-n-1]], date_format)
+    base['id'] = get_payload_id(base)
+    tickers = base['tickers'].copy() # ticker index extended by deltas
+    deltas = []
+    for date in dates_uniq[-n:]:
+        payload = get_price_payload(df_prc[dates <= date], date_format)
+        new = sorted(set(payload['tickers']) - set(tickers))
+        tickers += new
+        df = df_prc.xs(date, level='date').reindex(tickers)
+        cagr = pd.DataFrame({k: decode_array(v) for k, v in payload['cagr'].items()}, 
+                            index=payload['tickers']).reindex(tickers)
+        deltas.append({
+            'date': date.strftime(date_format),
+            'tickers': new,
+            'values': {x: encode_array(df[x].to_numpy()) for x in fees},
+            'cagr': {x: encode_array(cagr[x].to_numpy()) for x in fees},
+            'id': get_payload_id(payload)
+        })
+    return {'base': base, 'deltas': deltas}
+
+
+def write_asset(data, name, path='assets/data'):
+    """
+    save data to the static file 'name.<hash>.json' of which the hash 
+     changes only with the content so that the browser can cache it
+    return filename of the data
+    """
+    text = json.dumps(data, ensure_ascii=False, separators=(',', ':'), allow_nan=False)
+    text = text.encode('utf-8')
+    file = f'{name}.{hashlib.sha256(text).hexdigest()[:10]}.json'
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, file), 'wb') as f:
+        f.write(text)
+    return file
+
+
+def write_price_assets(data_delta, path='assets/data'):
+    """
+    save the base and deltas of get_price_deltas by write_asset, or copy the files
+     of them saved by stream_utils.convert, to path
+    return dict of base of file and id, and deltas of file, id and date
+    """
+    if 'path' in data_delta:
+        os.makedirs(path, exist_ok=True)
+        for x in [data_delta['base'], *data_delta['deltas']]:
+            shutil.copyfile(os.path.join(data_delta['path'], x['file']), os.path.join(path, x['file']))
+        return {'base': data_delta['base'], 'deltas': data_delta['deltas']}
+    base = data_delta['base']
+    return {
+        'base': {'file': write_asset(base, 'price', path), 'id': base['id']},
+        'deltas': [{'file': write_asset(x, f"price-{x['date']}", path), 'id': x['id'], 'date': x['date']}
+                   for x in data_delta['deltas']]
+    }
+
+
+def clean_assets(files, path='assets/data'):
+    """
+    remove data files in path other than files written by write_asset
+    """
+    for f in glob.glob(os.path.join(path, '*.json')):
+        if os.path.basename(f) not in files:
+            os.remove(f)
+
+
+def get_snapshot(path='.', prefix='funds_bayesian_ret3y_'):
+    """
+    return date (yymmdd) of the latest file of prefix in path, ex) 250331 of
+     funds_bayesian_ret3y_250331.csv, so that a new snapshot is used without editing app.py
+    """
+    dts = [os.path.basename(x)[len(prefix):-len('.csv')]
+           for x in glob.glob(os.path.join(path, f'{prefix}*.csv'))]
+    dts = [x for x in dts if len(x) == 6 and x.isdigit()]
+    if not dts:
+        raise FileNotFoundError(f'No file of {prefix}<yymmdd>.csv in {path}')
+    return max(dts)
+
+
+def load_data(file_prc, file_cat, file_est, cols_prc=None):
+    """
+    load price, category and bayesian estimation files
+    file_prc: price file or path to the monthly store of store_utils
+    cols_prc: dict to rename price columns
+    """
+    ## price
+    if os.path.isdir(file_prc):
+        df_prc = load_store(file_prc)
+    else:
+        df_prc = pd.read_csv(
+            file_prc,
+            parse_dates=['date'],
+            dtype={'ticker': str},
+            index_col=['ticker', 'date']
+        )
+    if cols_prc is not None:
+        df_prc.columns = [cols_prc[x] for x in df_prc.columns]
+
+    ## cateory
+    df_cat = pd.read_csv(file_cat, index_col=['ticker'])
+
+    ## beysian stats
+    df_est = pd.read_csv(file_est, index_col=['ticker'])
+    return df_prc, df_cat, df_est
+
+
+def get_category_data(df_cat):
+    """
+    return dict of category to dict of group to tickers in the group
+    """
+    tickers = df_cat.index.to_numpy()
+    data_cat = dict()
+    for col in df_cat.columns:
+        # stable sort of group codes keeps the order of tickers in each group
+        codes, groups = pd.factorize(df_cat[col], sort=True)
+        order = np.argsort(codes, kind='stable')
+        order = order[codes[order] >= 0] # drop NaN groups
+        split = np.cumsum(np.bincount(codes[order], minlength=len(groups)))[:-1]
+        data_cat[col] = dict(zip(groups.to_list(), 
+                                 [x.tolist() for x in np.split(tickers[order], split)]))
+    return data_cat
+
+
+def get_scatter_data(df_est, df_cat, xlabel='mean', ylabel='sd'):
+    """
+    return dict of ranks of mean/sd/sharpe, hdi and categories for scatter plot
+    """
+    df_s = df_est[xlabel].div(df_est[ylabel]).rank().rename('sharpe')
+    data_est = df_est.join(df_s).join(df_cat)
+    # convert mean/sd into respective ranks
+    data_est[xlabel] = data_est[xlabel].rank(ascending=False, pct=True).mul(100)
+    data_est[ylabel] = data_est[ylabel].rank(pct=True).mul(100)
+    cols = [xlabel, ylabel, 'hdi_3%', 'hdi_97%', 'sharpe'] + df_cat.columns.to_list()
+    data_est = data_est[cols].astype(object)
+    return data_est.where(data_est.notna(), None).to_dict() # NaN is invalid in JSON file
+
+
+def get_ticker_index(df_cat, df_est, col='mean'):
+    """
+    return dict of ticker index for the client
+     tickers: tickers of df_cat of which id is the position, in descending order 
+              of col of df_est followed by tickers not estimated
+     ranked: number of tickers estimated, ids of which are their ranks
+     groups: dict of category to dict of group to bitset of tickers in the group,
+             base64 of little-endian uint32 array where bit i of word i // 32 is set for id i
+    """
+    rank = df_est[col].reindex(df_cat.index).rank(ascending=False)
+    order = np.argsort(rank.fillna(np.inf).to_numpy(), kind='stable')
+    tickers = df_cat.index[order]
+    ids = np.empty(len(order), dtype=np.int64)
+    ids[order] = np.arange(len(order))
+    n_words = (len(tickers) + 31) // 32
+
+    groups = dict()
+    for cat in df_cat.columns:
+        codes, values = pd.factorize(df_cat[cat], sort=True)
+        bits = np.zeros((len(values), n_words), dtype=np.uint32)
+        valid = codes >= 0 # drop NaN groups
+        np.bitwise_or.at(bits, (codes[valid], ids[valid] // 32), 
+                         np.left_shift(1, ids[valid] % 32).astype(np.uint32))
+        groups[cat] = {k: encode_array(v, '<u4') for k, v in zip(values.to_list(), bits)}
+    return {'tickers': tickers.to_list(), 'ranked': int(rank.notna().sum()), 'groups': groups}
+
+
+# compatibility jamo typed alone to conjoining jamo of the decomposed syllables
+jamo_compat = dict(zip('ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ', map(chr, range(0x1100, 0x1113))))
+jamo_compat.update(zip(map(chr, range(0x314F, 0x3164)), map(chr, range(0x1161, 0x1176))))
+
+
+def normalize_name(text):
+    """
+    return lowercase text with hangul syllables decomposed into jamo so that
+     a syllable being typed matches the syllables starting with it
+    """
+    text = unicodedata.normalize('NFD', text.lower())
+    return ''.join(jamo_compat.get(x, x) for x in text)
+
+
+def get_name_index(names, n=3):
+    """
+    return dict of names and n-gram inverted index of the normalized names
+     names: sorted unique names
+     grams: dict of n-gram to sorted ids of names containing it
+    """
+    names = sorted(set(names))
+    grams = dict()
+    for i, name in enumerate(names):
+        text = normalize_name(name)
+        for gram in dict.fromkeys(text[k:k+n] for k in range(len(text) - n + 1)):
+            grams.setdefault(gram, []).append(i)
+    return {'n': n, 'names': names, 'grams': grams}
+
+
+def get_similar_data(df_prc, tickers, **kwargs):
+    """
+    return dict of clusters of near-duplicate funds and the most correlated funds
+     of corr_utils by the prices before fees, the first column of df_prc,
+     for tickers of the ticker index
+     k: number of neighbors of each ticker
+     cluster: base64 of int32 array of cluster label of each ticker, -1 without prices
+     neighbors: base64 of int32 array of ticker x k ids of the neighbors in descending order
+                of correlation, -1 if fewer
+     corr: base64 of float32 array of ticker x k correlations of the neighbors
+    kwargs: params of corr_utils.get_similar
+    """
+    params = {**corr_utils.params_default, **kwargs}
+    df = corr_utils.get_similar(df_prc, df_prc.columns[0], **params).reindex(tickers)
+    ids = {x: i for i, x in enumerate(tickers)}
+    k = params['k']
+    neighbors = np.full((len(tickers), k), -1, dtype=np.int32)
+    corr = np.full((len(tickers), k), np.nan, dtype=np.float32)
+    for i, (nbrs, vals) in enumerate(zip(df['neighbors'], df['corr'])):
+        if not isinstance(nbrs, list):
+            continue
+        # neighbors out of the ticker index are skipped
+        nv = [(ids[x], v) for x, v in zip(nbrs, vals) if x in ids]
+        neighbors[i, :len(nv)] = [x for x, _ in nv]
+        corr[i, :len(nv)] = [v for _, v in nv]
+    cluster = pd.factorize(df['cluster'])[0]
+    return {
+        'k': k,
+        'cluster': encode_array(cluster, '<i4'),
+        'neighbors': encode_array(neighbors, '<i4'),
+        'corr': encode_array(corr)
+    }
+
+
+def get_ranking_data(df_prc, df_est, tickers, **kwargs):
+    """
+    return dict of rankings of the metrics of rank_utils for tickers of the ticker index
+     so that the client switches the metric of #Top<n> without computing
+     metrics: metrics in rank_utils
+     dtype: type of the typed arrays, uint16 if ids fit
+     order: dict of metric to base64 of array of ids of the ranked tickers
+            from the best, the rank of which is the position
+    kwargs: params of rank_utils.get_metrics
+    """
+    params = {**rank_utils.params_default, **kwargs}
+    df = rank_utils.get_metrics(df_prc, df_est, tickers, **params)
+    dtype = 'uint16' if len(tickers) <= 2**16 else 'uint32'
+    code = '<u2' if dtype == 'uint16' else '<u4'
+    order = {x: encode_array(rank_utils.get_order(df[x].to_numpy()), code) for x in df.columns}
+    return {'metrics': df.columns.to_list(), 'dtype': dtype, 'order': order}
+
+
+def get_rank_data(df_est, col='mean'):
+    """
+    return dict of ticker to rank of col in descending order
+    """
+    return df_est[col].rank(ascending=False).to_dict()
+
+
+def preprocess_data(df_prc, df_cat, df_est, date_format='%Y-%m-%d', price=None):
+    """
+    convert data to JSON-serializable for the client
+    price: dict of payload and assets of stream_utils.convert used instead of
+     the payload and deltas built from df_prc
+    return dict of validation report, category, ticker index, name, name search index, 
+     price (with base and delta), rolling analytics, similar funds, rankings of metrics,
+     scatter and rank data
+    """
+    # checked before the payload is built
+    report = check_utils.validate(df_prc, df_cat, df_est, **check_utils.params_default)
+    if price is None:
+        data_prc = get_price_payload(df_prc, date_format)
+        data_delta = get_price_deltas(df_prc, date_format=date_format)
+    else:
+        data_prc, data_delta = price['payload'], price['assets']
+    data_index = get_ticker_index(df_cat, df_est)
+    return {
+        'validation': report,
+        'category': get_category_data(df_cat),
+        'index': data_index,
+        'name': df_cat['name'].to_dict(), # name for plots
+        'search': get_name_index(df_cat['name'].dropna()),
+        'price': data_prc,
+        'price_delta': data_delta,
+        'rolling': get_rolling_payload(df_prc, data_prc, date_format=date_format),
+        'similar': get_similar_data(df_prc, data_index['tickers']),
+        'ranking': get_ranking_data(df_prc, df_est, data_index['tickers']),
+        'scatter': get_scatter_data(df_est, df_cat),
+        'rank': get_rank_data(df_est)
+    }
+
+
+def get_data(file_prc, file_cat, file_est, cols_prc=None, date_format='%Y-%m-%d',
+             path_stream=None):
+    """
+    load and preprocess data files
+    path_stream: path to save the price assets and the store (path_stream/matrix) streamed
+     from the price file by stream_utils instead of building the price payload in memory.
+     the payload has no values then, which the API reads from the store
+    """
+    price = None
+    if path_stream is not None:
+        price = stream_utils.convert(file_prc, path_stream, path_store=os.path.join(path_stream, 'matrix'),
+                                     cols_prc=cols_prc, date_format=date_format)
+    dfs = load_data(file_prc, file_cat, file_est, cols_prc)
+    return preprocess_data(*dfs, date_format=date_format, price=price)
+
+
+def get_cache_key(files, **kwargs):
+    """
+    return hash of the contents of files, kwargs and the source of this module,
+     store_utils, roll_utils, corr_utils, check_utils, rank_utils and stream_utils so that the cache
+     is rebuilt if any of inputs, loading or preprocessing changes.
+     the manifest is hashed for the monthly store instead of all the partitions
+    """
+    h = hashlib.sha256()
+    for file in files:
+        if os.path.isdir(file):
+            file = os.path.join(file, file_manifest)
+        with open(file, 'rb') as f:
+            h.update(f.read())
+    h.update(json.dumps(kwargs, sort_keys=True, default=str).encode())
+    for module in (inspect.getmodule(get_cache_key), store_utils, roll_utils, corr_utils,
+                   check_utils, rank_utils, stream_utils):
+        h.update(inspect.getsource(module).encode())
+    return h.hexdigest()
+
+
+def load_cache(func, files, path='.cache', name='data', **kwargs):
+    """
+    return func(*files, **kwargs) saved in path/name.pkl which is reused 
+     until any of files or kwargs changes
+    """
+    file = os.path.join(path, f'{name}.pkl')
+    key = get_cache_key(files, **kwargs)
+    if os.path.exists(file):
+        try:
+            with open(file, 'rb') as f:
+                cache = pickle.load(f)
+            if cache['key'] == key:
+                return cache['data']
+        except Exception as e:
+            print(f'WARNING: Failed to load cache {file}: {e}')
+
+    data = func(*files, **kwargs)
+    os.makedirs(path, exist_ok=True)
+    with open(file, 'wb') as f:
+        pickle.dump({'key': key, 'data': data}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return data
@@ -3,11 +3,13 @@ import pandas as pd
 import plotly.express as px
 import dash_bootstrap_components as dbc
 import dash_daq as daq
+from mmap_utils import write_matrix, open_matrix, get_frame, get_source_key, is_current
 
 
 # Load data
 file = 'fund_241229.csv'
 path = 'pages'
+path_matrix = '.cache/matrix_241229' # out of the data directory
 df_prc = pd.read_csv(
     f'{path}/{file}',
     parse_dates=['date'],
@@ -15,6 +17,15 @@ df_prc = pd.read_csv(
     index_col=['group', 'ticker', 'date']
 )
 
+# ticker x date matrices to slice the tickers of a group without unstacking,
+# rebuilt only if the price file changes
+source = get_source_key(f'{path}/{file}')
+if not is_current(path_matrix, source):
+    write_matrix(df_prc.droplevel('group'), path_matrix, source=source)
+store = open_matrix(path_matrix)
+group_tickers = df_prc.index.droplevel('date').unique().to_frame(index=False)
+group_tickers = group_tickers.sort_values('ticker').groupby('group')['ticker'].apply(list).to_dict()
+
 groups = df_prc.index.get_level_values('group').unique()
 default_group = 2030
 groups = [{'label': f'TDF{x}', 'value': x} for x in groups]
@@ -70,7 +81,7 @@ app.layout = dbc.Container([
 
 
 def get_group_data(group, col, start=None, base=1000):
-    df = df_prc.loc[group, col].unstack('ticker').sort_index()
+    df = get_frame(store, col, group_tickers[group])
     default = {
         'price': df.to_dict('records'),
         'index': df.index.tolist(),
@@ -0,0 +1,326 @@
+"""
+bayesian estimation of the 3-year return of funds from the monthly prices
+ of funds_monthly_<dt>.csv, summarized in the format of funds_bayesian_ret3y_<dt>.csv
+
+model of log return r over m months between prices of the last 5 years:
+ r ~ normal(mu * m, sigma^2 * m), mu ~ normal(0, prior_mu^2), sigma^2 ~ inv-gamma(prior_a, prior_b)
+ with the annualized return exp(12 * mu) - 1 expected for the next 3 years summarized
+method
+ mcmc: gibbs sampling of each fund in a process pool
+ normal: conjugate normal with sigma fixed to the sample estimate, vectorized for all funds
+ bootstrap: bayesian bootstrap of returns, vectorized for all funds
+
+usage: python est_utils.py funds_monthly_<dt>.csv funds_bayesian_ret3y_<dt>.csv [method] [workers]
+"""
+import hashlib
+import json
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+
+params_default = {
+    'chains': 4,
+    'draws': 2000,
+    'tune': 1000,
+    'prior_mu': 0.01,
+    'prior_a': 2,
+    'prior_b': 0.002,
+    'hdi_prob': 0.94
+}
+
+
+def get_returns(df_prc, col='price_after_fees', n_years=5, min_years=3):
+    """
+    return dict of ticker to log returns and months between consecutive prices
+     in the last n_years for the tickers with prices of min_years or more
+    df_prc: prices with index (ticker, date)
+    """
+    s = df_prc[col].dropna().sort_index()
+    dates = s.index.get_level_values('date')
+    s = s[dates >= dates.max() - pd.DateOffset(years=n_years)]
+    tickers = s.index.get_level_values('ticker').to_numpy()
+    dates = s.index.get_level_values('date')
+    months = np.asarray(dates.year * 12 + dates.month)
+    same = tickers[1:] == tickers[:-1]
+    ret = np.diff(np.log(s.to_numpy()))[same]
+    months = np.diff(months)[same]
+
+    tickers, idx = np.unique(tickers[1:][same], return_index=True)
+    result = dict()
+    for tkr, r, m in zip(tickers, np.split(ret, idx[1:]), np.split(months, idx[1:])):
+        if m.sum() >= min_years * 12:
+            result[tkr] = (r, m)
+    return result
+
+
+def get_key(r, m, method, params):
+    """
+    return hash of the returns of a ticker and the settings of estimation
+    """
+    h = hashlib.sha256()
+    h.update(np.ascontiguousarray(r, dtype=float).tobytes())
+    h.update(np.ascontiguousarray(m, dtype=float).tobytes())
+    h.update(json.dumps([method, params], sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def pad_returns(returns):
+    """
+    return ticker x return arrays of returns and months padded with 0
+    """
+    n = max(len(r) for r, _ in returns)
+    ret = np.zeros((len(returns), n))
+    months = np.zeros((len(returns), n))
+    for i, (r, m) in enumerate(returns):
+        ret[i, :len(r)] = r
+        months[i, :len(m)] = m
+    return ret, months
+
+
+def sample_gibbs(r, m, chains=4, draws=2000, tune=1000, prior_mu=0.01,
+                 prior_a=2, prior_b=0.002, seed=0, **kwargs):
+    """
+    return chain x draw array of mu sampled from the posterior by gibbs sampling
+    """
+    rng = np.random.default_rng(seed)
+    # sufficient statistics: sum of (r - mu * m)^2 / m = sum_r2 - 2 * mu * sum_r + mu^2 * sum_m
+    n, sum_r, sum_m, sum_r2 = len(r), r.sum(), m.sum(), (r ** 2 / m).sum()
+    gamma = rng.gamma(prior_a + n / 2, size=(tune + draws, chains))
+    normal = rng.standard_normal((tune + draws, chains))
+    mu = rng.normal(0, prior_mu, chains)
+    samples = np.empty((tune + draws, chains))
+    for i in range(tune + draws):
+        ss = sum_r2 - 2 * mu * sum_r + mu ** 2 * sum_m
+        sigma2 = (prior_b + ss / 2) / gamma[i]
+        prec = sum_m / sigma2 + 1 / prior_mu ** 2
+        mu = samples[i] = sum_r / sigma2 / prec + normal[i] / np.sqrt(prec)
+    return samples[tune:].T
+
+
+def sample_normal(ret, months, seeds, chains=4, draws=2000, prior_mu=0.01, **kwargs):
+    """
+    return ticker x chain x draw array of mu from the conjugate normal posterior
+     with sigma fixed to the sample estimate
+    ret, months: padded arrays of pad_returns
+    seeds: seed of each ticker so that its draws do not depend on the tickers estimated with it
+    """
+    valid = months > 0
+    n, sum_r, sum_m = valid.sum(axis=1), ret.sum(axis=1), months.sum(axis=1)
+    mu = sum_r / sum_m
+    dev = np.where(valid, (ret - mu[:, None] * months) ** 2 / np.where(valid, months, 1), 0)
+    sigma2 = dev.sum(axis=1) / (n - 1)
+    prec = sum_m / sigma2 + 1 / prior_mu ** 2
+    loc, scale = sum_r / sigma2 / prec, 1 / np.sqrt(prec)
+    z = np.stack([np.random.default_rng(s).standard_normal((chains, draws)) for s in seeds])
+    return loc[:, None, None] + scale[:, None, None] * z
+
+
+def sample_bootstrap(ret, months, seeds, chains=4, draws=2000, **kwargs):
+    """
+    return ticker x chain x draw array of mu from the bayesian bootstrap of returns
+     with dirichlet weights on the months of each ticker. the weights are drawn
+     ticker by ticker to bound the memory by chain x draw x months of a ticker
+    ret, months: padded arrays of pad_returns
+    seeds: seed of each ticker so that its draws do not depend on the tickers estimated with it
+    """
+    samples = np.empty((len(ret), chains, draws))
+    for i, (r, m, seed) in enumerate(zip(ret, months, seeds)):
+        k = np.count_nonzero(m > 0) # padded at the end
+        w = np.random.default_rng(seed).exponential(size=(chains, draws, k))
+        samples[i] = (w @ r[:k]) / (w @ m[:k])
+    return samples
+
+
+def split_chains(x):
+    """
+    split each chain of ... x chain x draw array into halves
+    """
+    d = x.shape[-1] // 2
+    return np.concatenate([x[..., :d], x[..., -d:]], axis=-2)
+
+
+def rank_normalize(x):
+    """
+    return normal scores of ranks of all draws of each ticker in ticker x chain x draw array
+    """
+    n, c, d = x.shape
+    size = c * d
+    rank = x.reshape(n, -1).argsort(axis=1).argsort(axis=1)
+    dist = NormalDist()
+    z = np.array([dist.inv_cdf((k + 1 - 3 / 8) / (size + 1 / 4)) for k in range(size)])
+    return z[rank].reshape(x.shape)
+
+
+def get_rhat(x):
+    """
+    return potential scale reduction of each ticker in ticker x chain x draw array
+    """
+    d = x.shape[-1]
+    w = x.var(axis=2, ddof=1).mean(axis=1)
+    b = d * x.mean(axis=2).var(axis=1, ddof=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.sqrt(((d - 1) / d * w + b / d) / w)
+
+
+def get_ess(x):
+    """
+    return effective sample size of each ticker in ticker x chain x draw array
+     by the autocorrelations truncated with geyer's initial monotone sequence
+    """
+    n, c, d = x.shape
+    mean = x.mean(axis=2, keepdims=True)
+    f = np.fft.rfft(x - mean, n=2 * d, axis=2)
+    acov = np.fft.irfft(f * np.conj(f), axis=2)[..., :d] / d
+    mean_var = acov[..., 0].mean(axis=1) * d / (d - 1)
+    var_plus = mean_var * (d - 1) / d
+    if c > 1:
+        var_plus += mean[..., 0].var(axis=1, ddof=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rho = 1 - (mean_var[:, None] - acov.mean(axis=1)) / var_plus[:, None]
+    rho[:, 0] = 1
+    # sums of pairs of autocorrelations up to the first negative pair, made monotone
+    pairs = rho[:, :d // 2 * 2].reshape(n, -1, 2).sum(axis=2)
+    positive = np.cumprod(pairs > 0, axis=1).astype(bool)
+    pairs = np.minimum.accumulate(np.where(positive, pairs, np.inf), axis=1)
+    tau = -1 + 2 * np.where(positive, pairs, 0).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return c * d / np.maximum(tau, 1 / np.log10(c * d))
+
+
+def get_hdi(x, prob=0.94):
+    """
+    return lower and upper bounds of the narrowest interval of prob for each row of x
+    """
+    x = np.sort(x, axis=1)
+    k = int(np.floor(prob * x.shape[1]))
+    width = x[:, k:] - x[:, :x.shape[1] - k]
+    i = width.argmin(axis=1)
+    rows = np.arange(len(x))
+    return x[rows, i], x[rows, i + k]
+
+
+def summarize(samples, hdi_prob=0.94, **kwargs):
+    """
+    return dataframe of the summary of ticker x chain x draw array of annualized return
+     with the diagnostics in the same way as arviz.summary. hdi columns are named
+     after the default hdi_prob of 0.94
+    """
+    n = len(samples)
+    flat = samples.reshape(n, -1)
+    x = split_chains(samples)
+    q05, q95 = np.quantile(flat, [0.05, 0.95], axis=1)
+    ess_mean = get_ess(x)
+    ess_sd = np.minimum(ess_mean, get_ess((x - flat.mean(axis=1)[:, None, None]) ** 2))
+    z = rank_normalize(x)
+    fold = rank_normalize(np.abs(x - np.median(flat, axis=1)[:, None, None]))
+    sd = flat.std(axis=1, ddof=1)
+    lower, upper = get_hdi(flat, hdi_prob)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mcse_sd = sd * np.sqrt(np.e * (1 - 1 / ess_sd) ** (ess_sd - 1) - 1)
+    df = pd.DataFrame({
+        'mean': flat.mean(axis=1),
+        'sd': sd,
+        'hdi_3%': lower,
+        'hdi_97%': upper,
+        'mcse_mean': sd / np.sqrt(ess_mean),
+        'mcse_sd': mcse_sd,
+        'ess_bulk': get_ess(z),
+        'ess_tail': np.minimum(get_ess((x <= q05[:, None, None]).astype(float)),
+                               get_ess((x <= q95[:, None, None]).astype(float))),
+        'r_hat': np.maximum(get_rhat(z), get_rhat(fold))
+    })
+    return df.round(3).assign(ess_bulk=df['ess_bulk'].round(), ess_tail=df['ess_tail'].round(),
+                              r_hat=df['r_hat'].round(2))
+
+
+def to_return(mu):
+    """
+    return annualized return from monthly mean log return
+    """
+    return np.exp(12 * mu) - 1
+
+
+def fit_ticker(r, m, seed, params):
+    """
+    return summary of a ticker by gibbs sampling and the time taken in sec
+    """
+    t0 = time.perf_counter()
+    samples = to_return(sample_gibbs(r, m, seed=seed, **params))
+    summary = summarize(samples[None], **params).iloc[0].to_dict()
+    return summary, time.perf_counter() - t0
+
+
+def load_results(file):
+    if os.path.exists(file):
+        try:
+            with open(file, 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            print(f'WARNING: Failed to load cache {file}: {e}')
+    return dict()
+
+
+def estimate(df_prc, method='mcmc', workers=None, path='.cache', name='est_ret3y', **kwargs):
+    """
+    return dataframe of summary of each ticker and series of time taken in sec.
+     the summary is cached by the hash of returns of each ticker so that only
+     the tickers of which price history changed since the last run are estimated.
+     time of the tickers estimated together by vectorized methods is the average
+    method: mcmc, normal or bootstrap
+    workers: number of processes for mcmc. default to the number of cpus
+    kwargs: params_default to update
+    """
+    params = {**params_default, **kwargs}
+    returns = get_returns(df_prc)
+    keys = {k: get_key(r, m, method, params) for k, (r, m) in returns.items()}
+
+    file = os.path.join(path, f'{name}.pkl')
+    cache = load_results(file)
+    todo = [k for k, v in keys.items() if cache.get(k, {}).get('key') != v]
+    seeds = {k: int(keys[k][:8], 16) for k in todo}
+
+    times = dict()
+    if len(todo) > 0 and method == 'mcmc':
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {k: executor.submit(fit_ticker, *returns[k], seeds[k], params) for k in todo}
+            for k, future in futures.items():
+                summary, times[k] = future.result()
+                cache[k] = {'key': keys[k], 'summary': summary}
+    elif len(todo) > 0:
+        t0 = time.perf_counter()
+        func = {'normal': sample_normal, 'bootstrap': sample_bootstrap}[method]
+        ret, months = pad_returns([returns[k] for k in todo])
+        samples = to_return(func(ret, months, [seeds[k] for k in todo], **params))
+        df = summarize(samples, **params)
+        t = (time.perf_counter() - t0) / len(todo)
+        for k, summary in zip(todo, df.to_dict('records')):
+            cache[k] = {'key': keys[k], 'summary': summary}
+            times[k] = t
+
+    if len(todo) > 0:
+        os.makedirs(path, exist_ok=True)
+        with open(file, 'wb') as f:
+            pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    df_est = pd.DataFrame.from_dict({k: cache[k]['summary'] for k in keys}, orient='index')
+    return df_est.rename_axis('ticker'), pd.Series(times, name='time', dtype=float)
+
+
+if __name__ == '__main__':
+    file_prc, file_est = sys.argv[1:3]
+    method = sys.argv[3] if len(sys.argv) > 3 else 'mcmc'
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+    df_prc = pd.read_csv(file_prc, parse_dates=['date'], dtype={'ticker': str},
+                         index_col=['ticker', 'date'])
+    t0 = time.perf_counter()
+    df_est, times = estimate(df_prc, method, workers, name=f'est_ret3y_{method}')
+    t = time.perf_counter() - t0
+    df_est.to_csv(file_est)
+    if len(times) > 0:
+        print(times.sort_values().describe().to_string())
+    print(f'{len(times)} of {len(df_est)} funds estimated by {method} in {t:.2f} sec')
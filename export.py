@@ -0,0 +1,100 @@
+"""
+export the Dash app in app.py to static files for GitHub Pages
+ without running the server: the index page, layout, dependencies,
+ component bundles (including async chunks) and the assets folder
+
+usage: python export.py [path] [prefix]
+"""
+import hashlib
+import os
+import re
+import shutil
+import sys
+
+# renderer requests for layout and dependencies, served as json files
+routes_json = ['_dash-layout', '_dash-dependencies']
+
+
+def get_hash(content, n=10):
+    return hashlib.sha256(content).hexdigest()[:n]
+
+
+def write_file(path, url, content):
+    file = os.path.join(path, *url.split('/'))
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    with open(file, 'wb') as f:
+        f.write(content)
+    return file
+
+
+def patch_routes(content):
+    """
+    replace the routes requested by the renderer with json files
+    """
+    for route in routes_json:
+        for q in (b'"', b"'"):
+            content = content.replace(q + route.encode() + q, q + f'{route}.json'.encode() + q)
+    return content
+
+
+def export(path='pages_files', prefix='/fund/'):
+    """
+    write the static site of app to path with the url prefix applied
+    return list of files written
+    """
+    os.environ['DASH_REQUESTS_PATHNAME_PREFIX'] = prefix
+    from app import app
+    if app.config.requests_pathname_prefix != prefix:
+        raise ValueError(f'app is imported with prefix {app.config.requests_pathname_prefix} before export')
+
+    client = app.server.test_client()
+    def get(url):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise ValueError(f'Failed to get {url}: {response.status_code}')
+        return response.data
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    files = dict()
+
+    # assets of the app including data files
+    assets_url = app.get_asset_url('')
+    for root, _, names in os.walk(app.config.assets_folder):
+        for name in names:
+            file = os.path.join(root, name)
+            with open(file, 'rb') as f:
+                content = f.read()
+            rel = os.path.relpath(file, app.config.assets_folder).replace(os.sep, '/')
+            files[f'assets/{rel}'] = content
+
+    # index page: replace mtime of assets for cache-busting with content hash
+    index = get('/').decode('utf-8')
+    def replace_mtime(match):
+        rel = match.group(1)
+        return f'{assets_url}{rel}?m={get_hash(files[f"assets/{rel}"])}'
+    index = re.sub(rf'{re.escape(assets_url)}([^"?]+)\?m=[0-9.]+', replace_mtime, index)
+    files['index.html'] = index.encode('utf-8')
+
+    # layout and dependencies
+    for route in routes_json:
+        files[f'{route}.json'] = get(f'/{route}')
+
+    # component bundles in the index and chunks loaded on demand
+    urls = re.findall(rf'src="{re.escape(prefix)}(_dash-component-suites/[^"?]+)', index)
+    for ns, paths in app.registered_paths.items():
+        # skip source maps and chunks listed but not shipped with the package
+        root = os.path.dirname(sys.modules[ns].__file__)
+        paths = [x for x in paths if not x.endswith('.map') and os.path.exists(os.path.join(root, x))]
+        urls += [f'_dash-component-suites/{ns}/{x}' for x in paths]
+    for url in urls:
+        files[url] = patch_routes(get(f'/{url}'))
+
+    for url in sorted(files):
+        write_file(path, url, files[url])
+    return sorted(files)
+
+
+if __name__ == '__main__':
+    files = export(*sys.argv[1:])
+    print(f'{len(files)} files exported')
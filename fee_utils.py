@@ -0,0 +1,107 @@
+"""
+fee-adjusted prices of funds from daily prices and annual fees,
+ resampled to month ends in the format of funds_monthly_<dt>.csv
+
+usage: python fee_utils.py prices_daily.csv fees.csv funds_monthly_<dt>.csv [chunksize]
+ prices_daily.csv: daily prices with column date and a column for each ticker
+ fees.csv: annual fee (%) with columns ticker and fee
+"""
+import sys
+import numpy as np
+import pandas as pd
+
+cols_prc = ['price', 'price_after_fees']
+days_in_year = 365
+
+
+def read_fees(file):
+    """
+    return series of annual fee (%) of each ticker
+    """
+    return pd.read_csv(file, dtype={'ticker': str}, index_col='ticker')['fee']
+
+
+def read_prices_daily(file, tickers=None):
+    """
+    return daily prices with index date and a column for each ticker
+    tickers: list of columns to read only a part of the universe
+    """
+    usecols = None if tickers is None else ['date'] + list(tickers)
+    return pd.read_csv(file, parse_dates=['date'], index_col='date', usecols=usecols)
+
+
+def get_fee_factor(dates, fee):
+    """
+    return date x ticker array of the cumulative product of daily fee decay
+     with 1 at the first date, charged for the calendar days between dates
+    dates: DatetimeIndex of daily prices
+    fee: array of annual fee (%) of each ticker
+    """
+    days = np.diff(np.asarray(dates, dtype='datetime64[D]')).astype(float)
+    decay = (1 - np.asarray(fee, dtype=float) / 100) ** (1 / days_in_year)
+    factor = np.ones((len(dates), len(decay)))
+    factor[1:] = decay[None, :] ** days[:, None]
+    return np.cumprod(factor, axis=0)
+
+
+def get_prices_after_fee(df_prices, fee):
+    """
+    return daily prices after fees accrued from the first valid price of each ticker
+    df_prices: daily prices with index date and a column for each ticker
+    fee: series of annual fee (%) of each ticker. no fee for tickers not in fee
+    """
+    df_prices = df_prices.sort_index()
+    fee = pd.Series(fee, dtype=float).reindex(df_prices.columns).fillna(0)
+    prc = df_prices.to_numpy(dtype=float)
+    factor = get_fee_factor(df_prices.index, fee)
+    # restart the decay at inception of each ticker
+    valid = ~np.isnan(prc)
+    first = valid.argmax(axis=0)
+    cols = np.arange(prc.shape[1])
+    factor /= factor[first, cols]
+    return pd.DataFrame(prc * factor, index=df_prices.index, columns=df_prices.columns)
+
+
+def resample_monthly(df_prices, df_prices_fees, last_day=False, decimals=1):
+    """
+    return prices before and after fees at month ends with index (ticker, date)
+    last_day: sample the last date with prices in each month instead of calendar month ends
+    """
+    if last_day:
+        dates = df_prices.index.to_series().groupby(df_prices.index.to_period('M')).max()
+        idx = df_prices.index.isin(dates)
+    else:
+        # not is_month_end which gives business month ends for the index of freq 'B'
+        idx = df_prices.index.day == df_prices.index.days_in_month
+    df_prc = df_prices[idx].stack().rename(cols_prc[0])
+    df = df_prices_fees[idx].stack().rename(cols_prc[1])
+    df_all = pd.concat([df_prc, df], axis=1).swaplevel().sort_index()
+    return df_all.rename_axis(['ticker', 'date']).dropna().round(decimals)
+
+
+def get_monthly_prices(df_prices, fee, chunksize=None, last_day=False):
+    """
+    return monthly prices before and after fees from daily prices.
+     tickers are processed in chunks of chunksize to limit memory
+    df_prices: daily prices or file of them which is read by the chunk
+    """
+    if isinstance(df_prices, str):
+        tickers = pd.read_csv(df_prices, nrows=0).columns.drop('date')
+        get_chunk = lambda x: read_prices_daily(df_prices, x)
+    else:
+        tickers = df_prices.columns
+        get_chunk = lambda x: df_prices[x]
+    chunksize = chunksize or max(len(tickers), 1)
+    dfs = []
+    for i in range(0, len(tickers), chunksize):
+        df = get_chunk(tickers[i:i+chunksize])
+        dfs.append(resample_monthly(df, get_prices_after_fee(df, fee), last_day))
+    return pd.concat(dfs).sort_index()
+
+
+if __name__ == '__main__':
+    file_prc, file_fee, file_out = sys.argv[1:4]
+    chunksize = int(sys.argv[4]) if len(sys.argv) > 4 else None
+    df_all = get_monthly_prices(file_prc, read_fees(file_fee), chunksize)
+    df_all.to_csv(file_out)
+    print(f'{file_out} saved: {len(df_all)} rows')
@@ -0,0 +1,261 @@
+"""
+server-side rendering of the price and CAGR plots of app.py for low-powered clients
+ and embedding, ex) /figure/price?category=asset&group=All&group=%23Top10&cost=1
+ /figure/backtest?category=asset&group=%23Top10&rebalance=annual
+figures of a selection of (category, groups, cost, compare, rebalance) are built from the handlers
+ of the API, serialized once and memoized in LRU of which entries are dropped
+ when the version of the data changes.
+ selections only in the browser such as nPrevious are given by the tickers selected,
+ ex) /figure/price?tickers=K55234DF2657,KR5235AK9808
+"""
+import functools
+import hashlib
+import json
+import warnings
+import numpy as np
+from flask import Blueprint, Response, request
+from werkzeug.datastructures import MultiDict
+from api_utils import to_list, base_prc
+
+gl_traces = 10 # tickers drawn by WebGL above, with hover on the nearest line only
+legend_traces = 30 # tickers listed in the legend
+plots = ['price', 'cagr', 'backtest']
+rebalance_labels = {'monthly': '월간', 'quarterly': '분기', 'annual': '연간'}
+
+
+def get_band(mat):
+    """
+    return dict of min, median and max of each column of mat ignoring NaN
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning) # all-NaN columns
+        return {'min': np.nanmin(mat, axis=0), 'median': np.nanmedian(mat, axis=0),
+                'max': np.nanmax(mat, axis=0)}
+
+
+def get_price_figure(data, names, cost=False, compare=False, rest=None):
+    """
+    return figure of price history in the layout of the price plot of app.py
+     with every ticker drawn and a band of the tickers not selected
+    data: result of the prices handler of the API of all fees
+    names: dict of ticker to name
+    rest: result of the prices handler of the tickers not selected without normalize,
+     relative to the prices at the start of data if normalized
+    """
+    fees = list(data['values'])
+    fee = fees[1] if cost else fees[0]
+    dates, tickers = data['dates'], data['tickers']
+    mat = np.array(data['values'][fee], dtype=float).reshape(len(tickers), len(dates))
+    kind = 'scattergl' if len(tickers) > gl_traces else 'scatter'
+    traces = []
+    for i, (tkr, row) in enumerate(zip(tickers, mat)):
+        valid = np.flatnonzero(~np.isnan(row))
+        span = slice(valid[0], valid[-1] + 1) if len(valid) else slice(0, 0)
+        traces.append({'x': dates[span], 'y': to_list(row[span], 0), 'type': kind,
+                       'mode': 'lines', 'name': names.get(tkr, tkr), 'showlegend': i < legend_traces})
+
+    if rest is not None and rest['tickers']:
+        dates_rest = rest['dates']
+        mat_rest = np.array(rest['values'][fee], dtype=float).reshape(len(rest['tickers']), len(dates_rest))
+        if data['normalized']:
+            # prices of the tickers with a price at the common start of the selection
+            j = dates_rest.index(dates[0]) if dates[0] in dates_rest else len(dates_rest)
+            base = mat_rest[:, j] if j < len(dates_rest) else np.full(len(mat_rest), np.nan)
+            mat_rest = mat_rest[base > 0, j:] / base[base > 0, None] * base_prc
+            dates_rest = dates_rest[j:]
+    else:
+        mat_rest, dates_rest = np.empty((0, 0)), []
+    if len(mat_rest) > 0:
+        band = {k: to_list(v, 0) for k, v in get_band(mat_rest).items()}
+        name = f'그 외 {len(mat_rest)}개 펀드'
+        line = {'width': 0, 'color': 'rgba(128, 128, 128, 0.5)'}
+        common = {'x': dates_rest, 'type': kind, 'mode': 'lines', 'legendgroup': 'band'}
+        traces += [
+            {**common, 'y': band['max'], 'line': line, 'name': f'{name} (최대)',
+             'showlegend': False, 'hoverinfo': 'skip'},
+            {**common, 'y': band['min'], 'line': line, 'name': f'{name} (최소)',
+             'fill': 'tonexty', 'fillcolor': 'rgba(128, 128, 128, 0.2)',
+             'showlegend': False, 'hoverinfo': 'skip'},
+            {**common, 'y': band['median'], 'line': {'color': 'gray', 'dash': 'dot'},
+             'name': f'{name} (중앙값)'}
+        ]
+
+    title = '펀드 가격 추이 ({}'.format('상대 가격' if compare else '펀드별 최근 결산 기준가격')
+    title = f'{title}, 수수료 적용)' if cost else f'{title})'
+    layout = {
+        'title': {'text': title},
+        'hovermode': 'closest' if len(tickers) > gl_traces else 'x',
+        'yaxis': {'title': '가격'},
+        'xaxis': {
+            'rangeselector': {'buttons': [
+                {'count': 3, 'label': '3y', 'step': 'year', 'stepmode': 'backward'},
+                {'step': 'all', 'label': 'All'}
+            ]},
+            'type': 'date'
+        }
+    }
+    return {'data': traces, 'layout': layout}
+
+
+def get_cagr_figure(data, names, compare=False):
+    """
+    return figure of CAGR in the layout of the CAGR plot of app.py
+    data: result of the cagr handler of the API of all fees
+    names: dict of ticker to name
+    """
+    fees = list(data['cagr'])
+    if len(data['tickers']) == 0:
+        return {'data': [], 'layout': {}}
+    # sort descending by CAGR after fees
+    cagr = {x: np.nan_to_num(np.array(v, dtype=float), nan=0) for x, v in data['cagr'].items()}
+    order = np.argsort(-cagr[fees[-1]], kind='stable')
+    x = [names.get(data['tickers'][i], data['tickers'][i]) for i in order]
+    traces = [{'x': x, 'y': to_list(cagr[fee][order], 1), 'type': 'bar', 'name': fee}
+              for fee in fees]
+    if compare and data['start']:
+        title = f"펀드 연평균 수익률 ({data['start']} ~ {data['end']})"
+    else:
+        title = '펀드 연평균 수익률 (펀드별 설정일 이후)'
+    layout = {
+        'title': {'text': title},
+        'barmode': 'group',
+        'hovermode': 'x',
+        'yaxis': {'title': '연평균 수익률 (%)'}
+    }
+    return {'data': traces, 'layout': layout}
+
+
+def get_backtest_figure(data, cost=False):
+    """
+    return figure of equity curve and drawdown of the equal-weight portfolio
+     in the layout of the backtest plot of app.py
+    data: result of the backtest handler of the API of all fees
+    """
+    fees = list(data['equity'])
+    if len(fees) == 0:
+        return {'data': [], 'layout': {}}
+    fee = fees[1] if cost and len(fees) > 1 else fees[0]
+    cagr, mdd = data['cagr'][fee], data['mdd'][fee]
+    traces = [
+        {'x': data['dates'], 'y': to_list(np.array(data['equity'][fee], dtype=float), 0),
+         'type': 'scatter', 'mode': 'lines',
+         'name': '포트폴리오' if cagr is None else f'포트폴리오 (연평균 {cagr:.1f}%)'},
+        {'x': data['dates'], 'y': to_list(np.array(data['drawdown'][fee], dtype=float), 1),
+         'type': 'scatter', 'mode': 'lines', 'fill': 'tozeroy', 'yaxis': 'y2',
+         'line': {'color': 'rgba(239, 85, 59, 0.8)', 'width': 1},
+         'name': '낙폭' if mdd is None else f'낙폭 (최대 {mdd:.1f}%)'}
+    ]
+    title = f"포트폴리오 백테스트 (동일 비중, {rebalance_labels[data['rebalance']]} 리밸런싱"
+    title = f'{title}, 수수료 적용)' if cost else f'{title})'
+    layout = {
+        'title': {'text': title},
+        'hovermode': 'x',
+        'yaxis': {'title': '가격', 'domain': [0.35, 1]},
+        'yaxis2': {'title': '낙폭 (%)', 'domain': [0, 0.25]},
+        'xaxis': {'type': 'date'}
+    }
+    return {'data': traces, 'layout': layout}
+
+
+def create_figures(api, names, name='figure', maxsize=64):
+    """
+    return blueprint serving figures of selections with functions to get and warm them
+     get_figure(plot, category, groups, cost, compare, rebalance, tickers): serialized
+      figure JSON of the groups, or of the tickers instead if given
+     warm(category, groups): render figures of every plot, cost and compare
+      with the default rebalancing
+     update(api): replace the data by api of another snapshot
+    api: blueprint of api_utils.create_api, of which tickers are in the order of the client
+     so that the traces are drawn in the rank order of the selected metric
+    maxsize: number of serialized figures cached
+    """
+    state = {'api': api}
+
+    @functools.lru_cache(maxsize=maxsize)
+    def render(plot, category, groups, cost, compare, rebalance, snapshot, tickers):
+        handlers = state['api'].handlers
+        if tickers is None:
+            args = MultiDict([('category', category)] + [('group', x) for x in groups])
+        else:
+            args = MultiDict([('tickers', ','.join(tickers))])
+        if plot == 'price':
+            args.add('normalize', '1' if compare else '0')
+            data = handlers['prices'](args)
+            selected = set(data['tickers'])
+            others = [x for x in state['api'].tickers if x not in selected]
+            rest = handlers['prices'](MultiDict([('tickers', ','.join(others))])) if others else None
+            fig = get_price_figure(data, names, cost, compare, rest)
+        elif plot == 'backtest':
+            args.add('rebalance', rebalance)
+            fig = get_backtest_figure(handlers['backtest'](args), cost)
+        else:
+            args.add('compare', '1' if compare else '0')
+            fig = get_cagr_figure(handlers['cagr'](args), names, compare)
+        return json.dumps(fig, ensure_ascii=False, separators=(',', ':'))
+
+    def get_figure(plot, category, groups, cost=False, compare=False, rebalance='quarterly',
+                   tickers=None):
+        if plot not in plots:
+            raise ValueError(f'Invalid plot: {plot}')
+        if rebalance not in rebalance_labels:
+            raise ValueError(f'Invalid rebalance: {rebalance}')
+        if tickers is not None:
+            # no tickers selects all by the API
+            if len(tickers) == 0:
+                raise ValueError('No tickers')
+            category, groups, tickers = None, (), tuple(tickers)
+        else:
+            groups = tuple(sorted(set(groups or ['All'])))
+        # options not used by the plot share the figure
+        if plot == 'backtest':
+            compare = False
+        else:
+            rebalance = 'quarterly'
+        return render(plot, category, groups, bool(cost), bool(compare), rebalance,
+                      state['api'].snapshot, tickers)
+
+    def warm(category, groups):
+        for plot in plots:
+            for cost in (False, True):
+                for compare in (False, True):
+                    get_figure(plot, category, groups, cost, compare)
+
+    def update(api):
+        # figures of the previous snapshot are never used again
+        if api.snapshot != state['api'].snapshot:
+            render.cache_clear()
+        state['api'] = api
+
+    bp = Blueprint(name, __name__, url_prefix='/figure')
+
+    @bp.route('/<plot>')
+    def get(plot):
+        if plot not in plots:
+            return Response(json.dumps({'error': f'Unknown plot: {plot}'}), 404,
+                            mimetype='application/json')
+        args = request.args
+        tickers = args['tickers'].split(',') if args.get('tickers') else None
+        key = (args.get('category'), tuple(sorted(set(args.getlist('group')))), tickers,
+               args.get('cost', '0'), args.get('compare', '0'), args.get('rebalance', 'quarterly'))
+        etag = hashlib.sha256(f"{state['api'].snapshot}{plot}{key}".encode()).hexdigest()[:16]
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            try:
+                text = get_figure(plot, args.get('category'), args.getlist('group'),
+                                  args.get('cost', '0').lower() in ('1', 'true'),
+                                  args.get('compare', '0').lower() in ('1', 'true'),
+                                  args.get('rebalance', 'quarterly'), tickers)
+            except ValueError as e:
+                return Response(json.dumps({'error': str(e)}), 400, mimetype='application/json')
+            response = Response(text, mimetype='application/json')
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.no_cache = True # revalidate with etag
+        return response
+
+    bp.get_figure = get_figure
+    bp.warm = warm
+    bp.update = update
+    bp.cache_info = render.cache_info
+    return bp
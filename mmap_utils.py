@@ -0,0 +1,168 @@
+"""
+memory-mapped store of monthly prices as a dense ticker x date float32 matrix
+ of each price column which any process opens instantly without parsing or copying
+ path/index.json: columns, tickers and dates of the matrices, the file of each column
+                  and the key of the source to rebuild the store only if the source changes
+ path/<i>.npy: matrix of i-th column with NaN for missing months
+
+usage: python mmap_utils.py funds_monthly_<dt>.csv [path]
+"""
+import hashlib
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+from store_utils import file_manifest
+
+file_index = 'index.json'
+
+
+def get_source_key(file, **kwargs):
+    """
+    return hash of the content of the price file, or of the manifest for the monthly
+     store of store_utils, and kwargs of reading the file such as renaming columns
+    """
+    if os.path.isdir(file):
+        file = os.path.join(file, file_manifest)
+    h = hashlib.sha256()
+    with open(file, 'rb') as f:
+        for block in iter(lambda: f.read(2**20), b''):
+            h.update(block)
+    h.update(json.dumps(kwargs, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def is_current(path, source):
+    """
+    return True if the store in path exists and was built from the source of the key
+    """
+    try:
+        with open(os.path.join(path, file_index)) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return (index.get('source') == source
+            and all(os.path.exists(os.path.join(path, x)) for x in index['files']))
+
+
+def create_matrix(path, columns, tickers, dates, dtype='<f4', date_format='%Y-%m-%d',
+                  source=None):
+    """
+    return index of the store and dict of column to writable matrix of NaN in
+     temporary files, to be filled by rows and saved by save_matrix
+    source: key of the source of get_source_key
+    """
+    os.makedirs(path, exist_ok=True)
+    index = {
+        'columns': list(columns),
+        'tickers': list(tickers),
+        'dates': pd.DatetimeIndex(dates).strftime(date_format).to_list(),
+        'files': [f'{i}.npy' for i in range(len(columns))],
+        'source': source
+    }
+    mats = dict()
+    for col, file in zip(index['columns'], index['files']):
+        mats[col] = np.lib.format.open_memmap(os.path.join(path, f'{file}.tmp'), mode='w+',
+                                              dtype=dtype, shape=(len(tickers), len(dates)))
+        mats[col][:] = np.nan
+    return index, mats
+
+
+def save_matrix(path, index, mats):
+    """
+    replace the files of the store with the matrices of create_matrix and its index
+     so that processes reading the store never see partial files
+    """
+    for col, file in zip(index['columns'], index['files']):
+        mats[col].flush()
+        os.replace(os.path.join(path, f'{file}.tmp'), os.path.join(path, file))
+    tmp = os.path.join(path, f'{file_index}.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(tmp, os.path.join(path, file_index))
+
+
+def write_matrix(df_prc, path='data/matrix', dtype='<f4', date_format='%Y-%m-%d', source=None):
+    """
+    save prices to the store in path
+    df_prc: prices with index (ticker, date) and a column for each fee
+    source: key of the source of get_source_key
+    return index of the store
+    """
+    df = df_prc.dropna(how='all')
+    idx_tkr, tickers = pd.factorize(df.index.get_level_values('ticker'), sort=True)
+    idx_dt, dates = pd.factorize(df.index.get_level_values('date'), sort=True)
+    index, mats = create_matrix(path, df.columns, tickers, dates, dtype, date_format, source)
+    for col in index['columns']:
+        mats[col][idx_tkr, idx_dt] = df[col].to_numpy(dtype=dtype)
+    save_matrix(path, index, mats)
+    return index
+
+
+def open_matrix(path='data/matrix'):
+    """
+    return dict of the store in path
+     columns: price columns
+     tickers: index of tickers of which position is the row of the matrices
+     dates: DatetimeIndex of the columns of the matrices
+     values: dict of column to read-only memory-mapped matrix
+    """
+    with open(os.path.join(path, file_index)) as f:
+        index = json.load(f)
+    return {
+        'columns': index['columns'],
+        'tickers': pd.Index(index['tickers'], name='ticker'),
+        'dates': pd.DatetimeIndex(index['dates'], name='date'),
+        'values': {x: np.load(os.path.join(path, f), mmap_mode='r')
+                   for x, f in zip(index['columns'], index['files'])}
+    }
+
+
+def get_ids(store, tickers):
+    """
+    return row ids of tickers in the store, skipping tickers not in the store
+    """
+    ids = store['tickers'].get_indexer(tickers)
+    return ids[ids >= 0]
+
+
+def get_rows(store, col, ids=None):
+    """
+    return matrix of col with rows of ids. slices and a contiguous range of ids
+     are views of the memory map and the others are copied
+    """
+    mat = store['values'][col]
+    if ids is None or isinstance(ids, slice):
+        return mat if ids is None else mat[ids]
+    ids = np.asarray(ids)
+    if len(ids) > 0 and np.array_equal(ids, np.arange(ids[0], ids[0] + len(ids))):
+        return mat[ids[0]:ids[0] + len(ids)]
+    return mat[ids]
+
+
+def get_frame(store, col, tickers=None, dropna=True):
+    """
+    return prices of col with index date and a column for each ticker,
+     in the same format of df_prc[col].unstack('ticker'). the values are a view
+     of the memory map if rows are not copied by get_rows and dropna is False
+    dropna: drop dates without prices of any ticker
+    """
+    if tickers is None:
+        ids = slice(None)
+        columns = store['tickers']
+    else:
+        ids = get_ids(store, tickers)
+        columns = store['tickers'][ids]
+    df = pd.DataFrame(get_rows(store, col, ids).T, index=store['dates'], columns=columns,
+                      copy=False)
+    return df.dropna(how='all') if dropna else df
+
+
+if __name__ == '__main__':
+    file, path = (sys.argv[1:] + ['data/matrix'])[:2]
+    df_prc = pd.read_csv(file, parse_dates=['date'], dtype={'ticker': str},
+                         index_col=['ticker', 'date'])
+    index = write_matrix(df_prc, path, source=get_source_key(file))
+    print(f"{path} saved: {len(index['tickers'])} tickers x {len(index['dates'])} dates "
+          f"of {index['columns']}")
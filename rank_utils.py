@@ -0,0 +1,116 @@
+"""
+ranking metrics of funds computed at once from the bayesian estimation and
+ the ticker x month matrix of prices after fees, to be precomputed at build time
+ mean: posterior mean of 3-year return
+ prob: probability of return above benchmark by the normal of which 94% interval is the HDI
+ cagr: realized CAGR (%) since inception
+ sortino: annualized log return over annualized downside deviation of monthly log returns
+          floored at min_downside so that funds without loss are ranked by their return
+ mdd: max drawdown (%) since inception, closer to 0 for better funds
+every metric is larger for better funds so that rankings are in descending order.
+ realized metrics are NaN for funds of fewer returns than min_returns, which are not ranked
+
+usage: python rank_utils.py funds_monthly_<dt>.csv funds_bayesian_ret3y_<dt>.csv [metric] [n]
+"""
+import sys
+import numpy as np
+import pandas as pd
+from roll_utils import get_month_matrix, get_returns, get_drawdown
+
+metrics = ['mean', 'prob', 'cagr', 'sortino', 'mdd']
+params_default = {
+    'benchmark': 0, # annual return to beat
+    'min_returns': 12, # returns of a ticker for realized metrics
+    'min_downside': 0.01 # floor of annualized downside deviation, ex) MMF
+}
+z_hdi = 1.8807936081512509 # 97% quantile of standard normal, the upper bound of 94% HDI
+# coefficients of the approximation of erf of Abramowitz and Stegun 7.1.26
+erf_p = 0.3275911
+erf_a = [0.254829592, -0.284496736, 1.421413741, -1.453152027, 1.061405429]
+
+
+def erf(x):
+    """
+    return erf of array x by the approximation of Abramowitz and Stegun 7.1.26,
+     of which absolute error is less than 1.5e-7
+    """
+    x = np.asarray(x, dtype=float)
+    t = 1 / (1 + erf_p * np.abs(x))
+    poly = t * (erf_a[0] + t * (erf_a[1] + t * (erf_a[2] + t * (erf_a[3] + t * erf_a[4]))))
+    return np.sign(x) * (1 - poly * np.exp(-x ** 2))
+
+
+def get_prob(df_est, benchmark=0, hdi=('hdi_3%', 'hdi_97%')):
+    """
+    return probability of return above benchmark of the normal fitted to the HDI
+    """
+    lo, hi = (df_est[x].to_numpy(dtype=float) for x in hdi)
+    center, scale = (lo + hi) / 2, (hi - lo) / (2 * z_hdi)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (center - benchmark) / scale
+    return 0.5 * (1 + erf(z / np.sqrt(2)))
+
+
+def get_realized(mat, min_returns=12, min_downside=0.01):
+    """
+    return dict of cagr, sortino and mdd of each row of mat of which returns
+     are weighted by the months between consecutive prices
+    mat: ticker x month array of prices with NaN for months without price
+    min_downside: floor of annualized downside deviation
+    """
+    ret, months = get_returns(mat)
+    valid = ~np.isnan(ret)
+    k = valid.sum(axis=1)
+    s_r = np.where(valid, ret, 0).sum(axis=1)
+    s_m = np.where(valid, months, 0).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        down = np.where(valid, np.minimum(ret, 0) ** 2 / months, 0).sum(axis=1)
+        annual = s_r / s_m * 12
+        sortino = annual / np.fmax(np.sqrt(down / k * 12), min_downside)
+    enough = k >= max(min_returns, 1)
+    return {
+        'cagr': np.where(enough, np.expm1(annual) * 100, np.nan),
+        'sortino': np.where(enough, sortino, np.nan),
+        'mdd': np.where(enough, np.fmin.reduce(get_drawdown(mat)[0], axis=1), np.nan)
+    }
+
+
+def get_metrics(df_prc, df_est, tickers, col=None, benchmark=0, min_returns=12,
+                min_downside=0.01):
+    """
+    return dataframe of metrics of tickers with NaN for tickers not estimated or
+     without enough prices
+    col: price column of realized metrics, the last column (after fees) if None
+    """
+    col = df_prc.columns[-1] if col is None else col
+    df_est = df_est.reindex(tickers)
+    mat, tkrs, _ = get_month_matrix(df_prc, col)
+    realized = get_realized(mat, min_returns, min_downside)
+    idx = pd.Index(tkrs).get_indexer(tickers)
+    df = pd.DataFrame({
+        'mean': df_est['mean'].to_numpy(dtype=float),
+        'prob': get_prob(df_est, benchmark),
+        **{k: np.where(idx >= 0, v[idx], np.nan) for k, v in realized.items()}
+    }, index=pd.Index(tickers, name='ticker'))
+    return df[metrics]
+
+
+def get_order(values):
+    """
+    return positions of values in descending order without NaN,
+     ties in the order of positions
+    """
+    pos = np.flatnonzero(~np.isnan(values))
+    return pos[np.argsort(-values[pos], kind='stable')]
+
+
+if __name__ == '__main__':
+    file_prc, file_est = sys.argv[1:3]
+    metric = sys.argv[3] if len(sys.argv) > 3 else 'sortino'
+    n = int(sys.argv[4]) if len(sys.argv) > 4 else 10
+    df_prc = pd.read_csv(file_prc, parse_dates=['date'], dtype={'ticker': str},
+                         index_col=['ticker', 'date'])
+    df_est = pd.read_csv(file_est, index_col=['ticker'])
+    tickers = df_prc.index.get_level_values('ticker').unique().union(df_est.index)
+    df = get_metrics(df_prc, df_est, tickers, **params_default)
+    print(df.iloc[get_order(df[metric].to_numpy())[:n]].round(3).to_string())
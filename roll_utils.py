@@ -0,0 +1,255 @@
+"""
+rolling-window analytics of monthly prices computed at once over the ticker x month
+ matrix of all funds, to be precomputed at build time
+ return_<w>: annualized return (%) over the last w months
+ volatility_<w>: annualized volatility (%) of log returns over the last w months
+ drawdown_<w>: max drawdown (%) within the last w months
+ drawdown: drawdown (%) from the peak since inception
+ duration: months since the peak, i.e. duration of the drawdown
+prices are sampled irregularly (months may be skipped), so the metrics are computed
+ on a calendar month axis with returns between consecutive prices weighted by their months
+
+usage: python roll_utils.py funds_monthly_<dt>.csv [file_out] [col]
+"""
+import sys
+import numpy as np
+import pandas as pd
+
+windows = [12, 36, 60]
+
+
+def get_month_matrix(df_prc, col='price_after_fees'):
+    """
+    return ticker x month array of prices with NaN for months without price,
+     tickers and month ends of the columns from the first to the last month
+    df_prc: prices with index (ticker, date)
+    """
+    s = df_prc[col].dropna()
+    dates = s.index.get_level_values('date')
+    months = np.asarray(dates.year * 12 + dates.month - 1)
+    idx_tkr, tickers = pd.factorize(s.index.get_level_values('ticker'), sort=True)
+    m0 = months.min() if len(months) else 0
+    n_months = months.max() - m0 + 1 if len(months) else 0
+    mat = np.full((len(tickers), n_months), np.nan)
+    mat[idx_tkr, months - m0] = s.to_numpy(dtype=float)
+    dates = pd.date_range(f'{m0 // 12}-{m0 % 12 + 1}', periods=n_months, freq=pd.offsets.MonthEnd())
+    return mat, tickers, dates
+
+
+def get_last_valid(valid):
+    """
+    return index of the last valid column at or before each column, -1 if none
+    """
+    col = np.arange(valid.shape[1])
+    return np.maximum.accumulate(np.where(valid, col, -1), axis=1)
+
+
+def get_next_valid(valid):
+    """
+    return index of the next valid column at or after each column, n_cols if none
+    """
+    n = valid.shape[1]
+    return n - 1 - get_last_valid(valid[:, ::-1])[:, ::-1]
+
+
+def interpolate(mat):
+    """
+    return log of mat with missing prices between valid ones interpolated geometrically
+    """
+    valid = ~np.isnan(mat)
+    col = np.arange(mat.shape[1])
+    last = get_last_valid(valid)
+    nxt = get_next_valid(valid)
+    inside = (last >= 0) & (nxt < mat.shape[1])
+    rows = np.arange(len(mat))[:, None]
+    last, nxt = np.where(inside, last, col), np.where(inside, nxt, col)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w = np.where(nxt > last, (col - last) / (nxt - last), 0)
+        log_prc = np.log(mat[rows, last]) * (1 - w) + np.log(mat[rows, nxt]) * w
+    return np.where(inside, log_prc, np.nan)
+
+
+def shift(mat, n):
+    """
+    return mat shifted by n columns to the right with NaN filled
+    """
+    result = np.full_like(mat, np.nan)
+    if n < mat.shape[1]:
+        result[:, n:] = mat[:, :mat.shape[1] - n]
+    return result
+
+
+def get_returns(mat):
+    """
+    return log returns and months between consecutive prices at the column
+     of the latter price, NaN elsewhere
+    """
+    valid = ~np.isnan(mat)
+    col = np.arange(mat.shape[1])
+    prev = shift(get_last_valid(valid).astype(float), 1)
+    prev = np.where(valid & (prev >= 0), prev, np.nan)
+    rows = np.arange(len(mat))[:, None]
+    prc_prev = mat[rows, np.nan_to_num(prev, nan=0).astype(int)]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ret = np.where(np.isnan(prev), np.nan, np.log(mat / prc_prev))
+    return ret, col - prev
+
+
+def get_return_sums(mat):
+    """
+    return cumulative sums of log returns, squared log returns divided by months,
+     months and number of returns between consecutive prices along the columns
+    """
+    ret, months = get_returns(mat)
+    valid = ~np.isnan(ret)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x = [ret, ret ** 2 / months, months, valid]
+    return [np.cumsum(np.where(valid, v, 0), axis=1, dtype=float) for v in x]
+
+
+def window_sum(cs, window):
+    """
+    return sum over the last window columns from the cumulative sum cs
+    """
+    result = cs.copy()
+    result[:, window:] -= cs[:, :-window]
+    return result
+
+
+def get_rolling_return(mat, window, start=None):
+    """
+    return annualized return (%) over window months at the columns with prices
+    start: result of interpolate, where the price window months before is taken
+    """
+    start = interpolate(mat) if start is None else start
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ret = np.expm1((np.log(mat) - shift(start, window)) * (12 / window))
+    return ret * 100
+
+
+def get_rolling_volatility(mat, window, sums=None):
+    """
+    return annualized volatility (%) of log returns of which variance is
+     proportional to the months between prices, over window months at the columns
+     with prices of the tickers listed window months before
+    sums: result of get_return_sums
+    """
+    sums = get_return_sums(mat) if sums is None else sums
+    s_r, s_rr, s_m, k = (window_sum(x, window) for x in sums)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        var = (s_rr - s_r ** 2 / s_m) / (k - 1)
+    listed = shift(np.fmax.accumulate(mat, axis=1), window)
+    var = np.where(~np.isnan(mat) & ~np.isnan(listed) & (k > 1), np.maximum(var, 0), np.nan)
+    return np.sqrt(var * 12) * 100
+
+
+def get_drawdown(mat):
+    """
+    return drawdown (%) from the peak since inception and months since the peak
+     at the columns with prices
+    """
+    valid = ~np.isnan(mat)
+    peak = np.fmax.accumulate(mat, axis=1)
+    with np.errstate(invalid='ignore'):
+        dd = (mat / peak - 1) * 100
+        last_peak = get_last_valid(mat >= peak)
+    col = np.arange(mat.shape[1])
+    return dd, np.where(valid, col - last_peak, np.nan)
+
+
+def merge_blocks(a, b):
+    """
+    return max, min and max drawdown of blocks of months followed by blocks b
+    a, b: tuple of arrays of max, min and max drawdown (ratio) of the blocks
+    """
+    with np.errstate(invalid='ignore'):
+        dd = np.fmin(np.fmin(a[2], b[2]), b[1] / a[0] - 1)
+    return np.fmax(a[0], b[0]), np.fmin(a[1], b[1]), dd
+
+
+def get_blocks(mat, size):
+    """
+    return list of max, min and max drawdown (ratio) of the blocks of 2^j months
+     starting at each column for 2^j <= size
+    """
+    blocks = [(mat, mat, np.where(np.isnan(mat), np.nan, 0))]
+    while 2 ** len(blocks) <= size:
+        n = 2 ** (len(blocks) - 1)
+        blocks.append(merge_blocks([x[:, :-n] for x in blocks[-1]], [x[:, n:] for x in blocks[-1]]))
+    return blocks
+
+
+def get_rolling_drawdown(mat, window, blocks=None):
+    """
+    return max drawdown (%) within window months at the columns with prices
+     of the tickers listed window months before
+    blocks: result of get_blocks for window + 1 months or more
+    """
+    n, m = mat.shape
+    result = np.full((n, m), np.nan)
+    if m <= window:
+        return result
+    blocks = get_blocks(mat, window + 1) if blocks is None else blocks
+    # windows of window + 1 months as blocks of the binary digits in order
+    size, pos, cur = m - window, 0, None
+    for j in range(window.bit_length(), -1, -1):
+        if (window + 1) >> j & 1:
+            block = [x[:, pos:pos + size] for x in blocks[j]]
+            cur = block if cur is None else merge_blocks(cur, block)
+            pos += 2 ** j
+    listed = ~np.isnan(np.fmax.accumulate(mat, axis=1)[:, :size])
+    result[:, window:] = np.where(listed, cur[2] * 100, np.nan)
+    return np.where(np.isnan(mat), np.nan, result)
+
+
+def get_rolling(mat, windows=windows):
+    """
+    return dict of metric to ticker x month array of rolling analytics
+    """
+    start = interpolate(mat)
+    sums = get_return_sums(mat)
+    blocks = get_blocks(mat, max(windows) + 1)
+    result = dict()
+    for w in windows:
+        result[f'return_{w}'] = get_rolling_return(mat, w, start)
+        result[f'volatility_{w}'] = get_rolling_volatility(mat, w, sums)
+        result[f'drawdown_{w}'] = get_rolling_drawdown(mat, w, blocks)
+    result['drawdown'], result['duration'] = get_drawdown(mat)
+    return result
+
+
+def get_summary(rolling):
+    """
+    return dict of max drawdown (%) and the longest duration (months)
+     of drawdowns since inception of each ticker
+    """
+    return {
+        'max_drawdown': np.fmin.reduce(rolling['drawdown'], axis=1),
+        'max_duration': np.fmax.reduce(rolling['duration'], axis=1)
+    }
+
+
+def get_rolling_table(df_prc, col='price_after_fees', windows=windows, decimals=2):
+    """
+    return rolling analytics with index (ticker, date) at the dates of df_prc
+     and summary with index ticker
+    """
+    mat, tickers, dates = get_month_matrix(df_prc, col)
+    rolling = get_rolling(mat, windows)
+    idx = pd.MultiIndex.from_product([tickers, dates], names=['ticker', 'date'])
+    df = pd.DataFrame({k: v.ravel() for k, v in rolling.items()}, index=idx)
+    df = df[~np.isnan(mat.ravel())].round(decimals)
+    df_sum = pd.DataFrame(get_summary(rolling), index=tickers.rename('ticker'))
+    return df, df_sum.round(decimals)
+
+
+if __name__ == '__main__':
+    file_prc = sys.argv[1]
+    file_out = sys.argv[2] if len(sys.argv) > 2 else 'funds_rolling.csv'
+    col = sys.argv[3] if len(sys.argv) > 3 else 'price_after_fees'
+    df_prc = pd.read_csv(file_prc, parse_dates=['date'], dtype={'ticker': str},
+                         index_col=['ticker', 'date'])
+    df, df_sum = get_rolling_table(df_prc, col)
+    df.to_csv(file_out)
+    print(f'{file_out} saved: {len(df)} rows')
+    print(df_sum.describe().to_string())
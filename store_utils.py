@@ -0,0 +1,122 @@
+"""
+append-only store of monthly fund prices partitioned by month
+ path/YYYY-MM.csv: prices of every ticker at the month end
+ path/manifest.json: hash of each partition and of the price history of each ticker
+
+usage: python store_utils.py funds_monthly_<dt>.csv [path]
+"""
+import glob
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+cols_index = ['ticker', 'date']
+file_manifest = 'manifest.json'
+
+
+def read_prices(file):
+    return pd.read_csv(
+        file,
+        parse_dates=['date'],
+        dtype={'ticker': str},
+        index_col=cols_index
+    )
+
+
+def get_partition_file(path, month):
+    return os.path.join(path, f'{month}.csv')
+
+
+def get_partition_files(path):
+    """
+    return sorted list of partition files in the store
+    """
+    return sorted(glob.glob(os.path.join(path, '[0-9][0-9][0-9][0-9]-[0-9][0-9].csv')))
+
+
+def load_manifest(path):
+    file = os.path.join(path, file_manifest)
+    if os.path.exists(file):
+        with open(file) as f:
+            return json.load(f)
+    return {'partitions': dict(), 'tickers': dict()}
+
+
+def save_manifest(manifest, path):
+    with open(os.path.join(path, file_manifest), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def hash_tickers(df):
+    """
+    return series of hash of rows summed (mod 2^64) for each ticker which is
+     updated by adding/subtracting the hashes of changed rows
+    """
+    h = pd.util.hash_pandas_object(df, index=True).to_numpy(dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        return pd.Series(h, index=df.index.get_level_values('ticker')).groupby(level=0).sum()
+
+
+def ingest(df_prc, path='data/prices'):
+    """
+    upsert prices into the monthly partitions of the store. only the partitions
+     of the months in df_prc are read and rewritten if any row changes,
+     so ingesting the same data again changes nothing
+    df_prc: prices with index (ticker, date), ex) new month or full history
+    return list of tickers of which price history changed
+    """
+    os.makedirs(path, exist_ok=True)
+    manifest = load_manifest(path)
+    hashes = {k: int(v, 16) for k, v in manifest['tickers'].items()}
+    changed = set()
+
+    df_prc = df_prc.dropna(how='all')
+    months = df_prc.index.get_level_values('date').strftime('%Y-%m')
+    for month, df_new in df_prc.groupby(months):
+        file = get_partition_file(path, month)
+        df_old = read_prices(file) if os.path.exists(file) else df_new.iloc[:0]
+        # new rows replace old ones of the same ticker and date
+        df = pd.concat([df_old, df_new])
+        df = df[~df.index.duplicated(keep='last')].sort_index()
+        if df.equals(df_old):
+            continue
+
+        h_old = hash_tickers(df_old)
+        h_new = hash_tickers(df)
+        h_old, h_new = h_old.align(h_new, fill_value=0)
+        diff = h_new.index[h_new != h_old]
+        changed.update(diff)
+        # update hash of ticker history with the rows of the partition
+        for tkr in diff:
+            h = hashes.get(tkr, 0) - int(h_old[tkr]) + int(h_new[tkr])
+            hashes[tkr] = h % 2**64
+
+        df.to_csv(file)
+        manifest['partitions'][month] = f'{int(h_new.sum()) % 2**64:016x}'
+
+    if changed:
+        manifest['tickers'] = {k: f'{v:016x}' for k, v in hashes.items()}
+        save_manifest(manifest, path)
+    return sorted(changed)
+
+
+def load_store(path='data/prices', cols_prc=None):
+    """
+    return prices of all partitions in the same format as funds_monthly_*.csv
+    cols_prc: dict to rename price columns
+    """
+    files = get_partition_files(path)
+    if len(files) == 0:
+        raise ValueError(f'No partition in {path}')
+    df_prc = pd.concat([read_prices(x) for x in files]).sort_index()
+    if cols_prc is not None:
+        df_prc.columns = [cols_prc[x] for x in df_prc.columns]
+    return df_prc
+
+
+if __name__ == '__main__':
+    file, path = (sys.argv[1:] + ['data/prices'])[:2]
+    changed = ingest(read_prices(file), path)
+    print(f'{len(changed)} tickers changed')
@@ -0,0 +1,345 @@
+"""
+convert funds_monthly_<dt>.csv of which rows are grouped by ticker into the price assets
+ of data_utils and the memory-mapped store of mmap_utils with memory bounded by a chunk
+ of rows, the history of a ticker and a few values of each ticker, for price files
+ too large to load.
+ data_utils.get_data streams the price file by convert if given the path, which app.py
+ does for price files of FUND_STREAM_SIZE bytes or larger
+ 1st pass: dates and tickers with prices
+ 2nd pass: prices of each ticker appended to temporary files and filled in the store,
+           and the span, CAGR and price at each date of the deltas of each ticker
+ then the base and deltas of data_utils.get_price_deltas are written by parts from the
+ temporary files in the order of tickers sorted, the same files as written by write_asset
+ from the file loaded at once
+
+usage: python stream_utils.py funds_monthly_<dt>.csv [path] [path_store] [chunksize]
+"""
+import base64
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+import data_utils
+from mmap_utils import create_matrix, save_matrix, get_source_key
+
+chunksize_default = 100000
+block_values = 2**20 # float32 values gathered at once from the temporary files
+
+
+def read_chunks(file, chunksize=chunksize_default, cols_prc=None):
+    """
+    yield chunks of the price file without rows of no price
+    cols_prc: dict to rename price columns
+    """
+    for df in pd.read_csv(file, chunksize=chunksize, parse_dates=['date'], dtype={'ticker': str}):
+        if cols_prc is not None:
+            df = df.rename(columns=cols_prc)
+        cols = df.columns.drop(['ticker', 'date'])
+        yield df.dropna(how='all', subset=cols)
+
+
+def get_runs(tickers):
+    """
+    return start positions and tickers of runs of the same ticker
+    """
+    starts = np.flatnonzero(np.concatenate([[True], tickers[1:] != tickers[:-1]]))
+    return starts, tickers[starts].tolist()
+
+
+def check_grouped(tickers, seen):
+    """
+    raise ValueError if rows of any of tickers, the tickers of runs of rows, were given
+     before the rows of other tickers
+    """
+    if len(set(tickers)) < len(tickers) or not seen.isdisjoint(tickers):
+        dup = pd.Index(tickers)
+        dup = dup[dup.duplicated() | dup.isin(list(seen))][0]
+        raise ValueError(f'File not grouped by ticker: {dup}')
+    seen.update(tickers)
+
+
+def iter_batches(chunks):
+    """
+    yield rows of whole tickers from chunks of rows grouped by ticker.
+     rows of the last ticker in a chunk are carried over to the next chunk
+    """
+    rest, seen = None, set()
+    for df in chunks:
+        if rest is not None:
+            df = pd.concat([rest, df])
+        if len(df) == 0:
+            continue
+        tickers = df['ticker'].to_numpy()
+        last = np.flatnonzero(tickers != tickers[-1])
+        last = last[-1] + 1 if len(last) else 0
+        if last > 0:
+            df, rest = df.iloc[:last], df.iloc[last:]
+            check_grouped(get_runs(tickers[:last])[1], seen)
+            yield df
+        else:
+            rest = df
+    if rest is not None and len(rest) > 0:
+        check_grouped(get_runs(rest['ticker'].to_numpy())[1], seen)
+        yield rest
+
+
+def get_spans(idx_tkr, idx_dt, starts):
+    """
+    return first and end date index of the span of each ticker and the position
+     of each row in the series of the tickers appended
+    idx_tkr, idx_dt: ticker and date index of rows of which tickers start at starts
+    """
+    j0 = np.minimum.reduceat(idx_dt, starts)
+    j1 = np.maximum.reduceat(idx_dt, starts) + 1
+    offset = np.concatenate([[0], np.cumsum(j1 - j0)])
+    return j0, j1, offset[idx_tkr] + idx_dt - j0[idx_tkr]
+
+
+def get_span_cagr(values, idx_tkr, idx_dt, dates, n):
+    """
+    return CAGR (%) of each of n tickers by data_utils.get_cagr from rows of prices
+    """
+    valid = ~np.isnan(values)
+    t, d, v = idx_tkr[valid], idx_dt[valid], values[valid]
+    order = np.lexsort((d, t))
+    t, d, v = t[order], d[order], v[order]
+    first = np.flatnonzero(np.concatenate([[True], t[1:] != t[:-1]])) if len(t) else t
+    last = np.concatenate([first[1:] - 1, [len(t) - 1]]) if len(t) else t
+    months = np.asarray(dates.year * 12 + dates.month)
+    months = months[d[last]] - months[d[first]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cagr = (v[last].astype(float) / v[first]) ** (12 / months) - 1
+    res = np.full(n, np.nan)
+    res[t[first]] = np.where(months > 0, cagr * 100, np.nan)
+    return res
+
+
+def scan(file, chunksize=chunksize_default, cols_prc=None):
+    """
+    return price columns, sorted dates and tickers with prices in the order of the file
+    """
+    cols, dates, tickers, seen = None, set(), [], set()
+    for df in read_chunks(file, chunksize, cols_prc):
+        cols = df.columns.drop(['ticker', 'date']).to_list()
+        dates.update(df['date'].unique())
+        runs = get_runs(df['ticker'].to_numpy())[1]
+        if tickers and runs[0] == tickers[-1]:
+            runs = runs[1:]
+        check_grouped(runs, seen)
+        tickers += runs
+    return cols, pd.DatetimeIndex(sorted(dates)), tickers
+
+
+def iter_spans(values, pos, lengths, block=block_values):
+    """
+    yield bytes of values[pos[i]:pos[i]+lengths[i]] of each i appended, by blocks of
+     about block values or of a single series longer than block
+    """
+    ends = np.cumsum(lengths)
+    i = 0
+    while i < len(pos):
+        j = max(np.searchsorted(ends, ends[i] - lengths[i] + block, side='right'), i + 1)
+        n = lengths[i:j]
+        idx = np.repeat(pos[i:j] - np.concatenate([[0], np.cumsum(n)[:-1]]), n) + np.arange(n.sum())
+        yield values[idx].astype('<f4').tobytes()
+        i = j
+
+
+def iter_base64(blocks):
+    """
+    yield base64 of bytes of blocks appended, encoded by multiples of 3 bytes
+     for no padding between blocks
+    """
+    rest = b''
+    for block in blocks:
+        block = rest + block
+        k = len(block) - len(block) % 3
+        rest = block[k:]
+        if k > 0:
+            yield base64.b64encode(block[:k]).decode('ascii')
+    if rest:
+        yield base64.b64encode(rest).decode('ascii')
+
+
+def iter_json(data, dumps, sort_keys=False):
+    """
+    yield parts of JSON of data by dumps for each value of data, a dict of which
+     callable values returning iterables of bytes are written as base64 strings
+    """
+    if callable(data):
+        yield '"'
+        yield from iter_base64(data())
+        yield '"'
+    elif isinstance(data, dict):
+        keys = sorted(data) if sort_keys else list(data)
+        yield '{'
+        for i, k in enumerate(keys):
+            yield (',' if i else '') + dumps(k) + ':'
+            yield from iter_json(data[k], dumps, sort_keys)
+        yield '}'
+    else:
+        yield dumps(data)
+
+
+def get_payload_id(payload):
+    """
+    return data_utils.get_payload_id of payload of which values are callables of iter_json
+    """
+    h = hashlib.sha256()
+    dumps = lambda x: json.dumps(x, separators=(',', ':'))
+    for text in iter_json(payload, dumps, sort_keys=True):
+        h.update(text.encode())
+    return h.hexdigest()[:10]
+
+
+def write_asset(data, name, path):
+    """
+    save data to the static file of data_utils.write_asset by parts of iter_json
+    return filename of the data
+    """
+    h = hashlib.sha256()
+    dumps = lambda x: json.dumps(x, ensure_ascii=False, separators=(',', ':'), allow_nan=False)
+    os.makedirs(path, exist_ok=True)
+    file_tmp = os.path.join(path, f'{name}.json.tmp')
+    with open(file_tmp, 'wb') as f:
+        for text in iter_json(data, dumps):
+            text = text.encode('utf-8')
+            h.update(text)
+            f.write(text)
+    file = f'{name}.{h.hexdigest()[:10]}.json'
+    os.replace(file_tmp, os.path.join(path, file))
+    return file
+
+
+def convert(file, path='data/stream', n=12, path_store=None,
+            chunksize=chunksize_default, cols_prc=None, date_format='%Y-%m-%d'):
+    """
+    save the price assets of the file to path, the same files as written by write_asset
+     from data_utils.get_price_deltas(df_prc, n) of the file loaded, and the store
+     of mmap_utils to path_store if given
+    return dict of
+     payload: data_utils.get_price_payload(df_prc) without values
+     assets: dict of path, base of file and id, and deltas of file, id and date
+    """
+    cols, dates, tickers = scan(file, chunksize, cols_prc)
+    # tickers of the file in the order of the payload
+    order = np.array(sorted(range(len(tickers)), key=tickers.__getitem__), dtype=int)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    n = min(n, len(dates) - 1)
+    cuts = np.arange(len(dates) - n - 1, len(dates)) # date index of the base and deltas
+    if path_store is not None:
+        index, mats = create_matrix(path_store, cols, np.array(tickers)[order], dates,
+                                    date_format=date_format,
+                                    source=get_source_key(file, cols_prc=cols_prc))
+
+    # span of each ticker in the file order at the last date and at each of cuts,
+    # and CAGR of each fee, and prices at each of cuts for the deltas
+    start, end = np.zeros(len(tickers), dtype=int), np.zeros(len(tickers), dtype=int)
+    end_cut = np.zeros((len(cuts), len(tickers)), dtype=int)
+    cagr = {x: np.full(len(tickers), np.nan) for x in cols}
+    cagr_cut = {x: np.full((len(cuts), len(tickers)), np.nan) for x in cols}
+    prc_cut = {x: np.full((len(cuts), len(tickers)), np.nan, dtype=np.float32) for x in cols}
+    os.makedirs(path, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=path) as tmp:
+        # float32 values of each fee appended by ticker
+        files_tmp = {x: os.path.join(tmp, f'{i}.bin') for i, x in enumerate(cols)}
+        f_values = {x: open(files_tmp[x], 'wb') for x in cols}
+        i0 = 0
+        for df in iter_batches(read_chunks(file, chunksize, cols_prc)):
+            starts, tkrs = get_runs(df['ticker'].to_numpy())
+            if tkrs != tickers[i0:i0 + len(tkrs)]:
+                raise ValueError(f'Tickers changed during streaming: {tkrs[0]}')
+            i1 = i0 + len(tkrs)
+            idx_tkr = np.repeat(np.arange(len(tkrs)), np.diff(np.append(starts, len(df))))
+            idx_dt = dates.searchsorted(df['date'].to_numpy())
+            start[i0:i1], end[i0:i1], pos = get_spans(idx_tkr, idx_dt, starts)
+            for k, cut in enumerate(cuts):
+                end_cut[k, i0:i1] = np.maximum.reduceat(np.where(idx_dt <= cut, idx_dt, -1), starts) + 1
+            for col in cols:
+                values = df[col].to_numpy(dtype=np.float32)
+                arr = np.full((end[i0:i1] - start[i0:i1]).sum(), np.nan, dtype=np.float32)
+                arr[pos] = values
+                f_values[col].write(arr.astype('<f4').tobytes())
+                cagr[col][i0:i1] = get_span_cagr(values, idx_tkr, idx_dt, dates, len(tkrs))
+                for k, cut in enumerate(cuts):
+                    rows = idx_dt <= cut
+                    cagr_cut[col][k, i0:i1] = get_span_cagr(values[rows], idx_tkr[rows],
+                                                            idx_dt[rows], dates, len(tkrs))
+                    rows = idx_dt == cut
+                    prc_cut[col][k, i0 + idx_tkr[rows]] = values[rows]
+                if path_store is not None:
+                    mats[col][rank[i0 + idx_tkr], idx_dt] = values
+            i0 = i1
+        for f in f_values.values():
+            f.close()
+        values = {x: np.memmap(files_tmp[x], dtype='<f4', mode='r') for x in cols}
+
+        # the base and deltas in the order of the payload
+        pos = np.concatenate([[0], np.cumsum(end - start)[:-1]])[order]
+        start, end, end_cut = start[order], end[order], end_cut[:, order]
+        cagr = {x: v[order] for x, v in cagr.items()}
+        cagr_cut = {x: v[:, order] for x, v in cagr_cut.items()}
+        prc_cut = {x: v[:, order] for x, v in prc_cut.items()}
+        tickers = np.array(tickers, dtype=object)[order]
+        dates_str = dates.strftime(date_format).to_list()
+
+        def get_payload(k):
+            rows = start <= cuts[k]
+            lengths = end_cut[k][rows] - start[rows]
+            iter_values = lambda x: lambda: iter_spans(values[x], pos[rows], lengths)
+            return rows, {
+                'dates': dates_str[:cuts[k] + 1],
+                'tickers': tickers[rows].tolist(),
+                'start': start[rows].tolist(),
+                'offset': np.concatenate([[0], np.cumsum(lengths)]).tolist(),
+                'values': {x: iter_values(x) for x in cols},
+                'cagr': {x: data_utils.encode_array(cagr_cut[x][k][rows]) for x in cols}
+            }
+
+        _, base = get_payload(0)
+        base['id'] = get_payload_id(base)
+        assets = {'path': path, 'base': {'file': write_asset(base, 'price', path), 'id': base['id']},
+                  'deltas': []}
+        ids = list(np.flatnonzero(start <= cuts[0])) # ticker index extended by deltas
+        for k in range(1, len(cuts)):
+            rows, payload = get_payload(k)
+            new = np.flatnonzero(start == cuts[k])
+            ids += list(new)
+            delta = {
+                'date': dates_str[cuts[k]],
+                'tickers': tickers[new].tolist(),
+                'values': {x: data_utils.encode_array(prc_cut[x][k][ids]) for x in cols},
+                'cagr': {x: data_utils.encode_array(cagr_cut[x][k][ids]) for x in cols},
+                'id': get_payload_id(payload)
+            }
+            assets['deltas'].append({
+                'file': data_utils.write_asset(delta, f"price-{delta['date']}", path),
+                'id': delta['id'],
+                'date': delta['date']
+            })
+        del values
+
+    if path_store is not None:
+        save_matrix(path_store, index, mats)
+    payload = {
+        'dates': dates_str,
+        'tickers': tickers.tolist(),
+        'start': start.tolist(),
+        'offset': np.concatenate([[0], np.cumsum(end - start)]).tolist(),
+        'cagr': {x: data_utils.encode_array(cagr[x]) for x in cols}
+    }
+    return {'payload': payload, 'assets': assets}
+
+
+if __name__ == '__main__':
+    file = sys.argv[1]
+    path = sys.argv[2] if len(sys.argv) > 2 else 'data/stream'
+    path_store = sys.argv[3] if len(sys.argv) > 3 else None
+    chunksize = int(sys.argv[4]) if len(sys.argv) > 4 else chunksize_default
+    assets = convert(file, path=path, path_store=path_store, chunksize=chunksize)['assets']
+    for x in [assets['base'], *assets['deltas']]:
+        print(f"{os.path.join(path, x['file'])} saved")